@@ -6,6 +6,17 @@ from .config import Config
 from .routes.main_routes import main
 from .routes.upload_routes import upload
 from .routes.download_routes import download
+from .routes.job_routes import job
+from .routes.term_routes import terms
+from .routes.keyword_set_routes import keyword_set
+from .modules.template_cache import load_template
+from .modules import heading_styles
+from .modules.jobs import jobs
+from .modules.result_cache import result_cache
+from .modules.storage import storage
+from .modules.term_index import term_index
+from .modules.keyword_sets import keyword_sets
+from .modules.scheduler import scheduler
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -21,11 +32,40 @@ def create_app(config_class=Config):
     # Ensure the upload and results folders exist
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
     os.makedirs(app.config['RESULTS_FOLDER'], exist_ok=True)
+    if app.config['SECTION_MANIFEST_FOLDER']:
+        os.makedirs(app.config['SECTION_MANIFEST_FOLDER'], exist_ok=True)
+
+    # Parse the section document template once per process
+    load_template(app.config['DOCUMENT_TEMPLATE'])
+
+    # Style names recognized as headings, besides outline levels
+    heading_styles.configure(app.config['HEADING_STYLE_PATTERNS'])
+
+    # Finished batches are reused when the same uploads come back
+    result_cache.init_app(app)
+
+    # Worker threads shared by the document work of every batch
+    scheduler.init_app(app)
+
+    # Background workers and durable state for async uploads
+    jobs.init_app(app)
+
+    # Registered keyword sets and the compiled matchers of this process
+    keyword_sets.init_app(app)
+
+    # Word counts of summarised documents, queried through /api/terms
+    term_index.init_app(app)
+
+    # Batch retention, disk quota and admission control
+    storage.init_app(app, job_store=jobs.store, term_index=term_index)
 
     # Register blueprints
     app.register_blueprint(main)
     app.register_blueprint(upload)
     app.register_blueprint(download)
+    app.register_blueprint(job)
+    app.register_blueprint(terms)
+    app.register_blueprint(keyword_set)
 
     @app.route('/', defaults={'path': ''})
     @app.route('/<path:path>')
@@ -56,6 +96,8 @@ def create_app(config_class=Config):
     def log_request_info():
         logger.info(f"Request: {request.method} {request.url}")
         logger.debug(f"Headers: {request.headers}")
-        logger.debug(f"Body: {request.get_data()}")
+        # Only the size: reading the body here would buffer every upload in
+        # memory and leave nothing for handlers that stream it
+        logger.debug(f"Body: {request.content_length} bytes")
 
     return app
\ No newline at end of file
@@ -7,5 +7,36 @@ class Config:
     RESULTS_FOLDER = os.path.join(BASE_DIR, 'results')
     ALLOWED_EXTENSIONS = {'docx', 'csv', 'txt'}
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16 MB
+    UPLOAD_CHUNK_SIZE = int(os.environ.get('UPLOAD_CHUNK_SIZE', 8 * 1024 * 1024))  # per request of a chunked upload, below MAX_CONTENT_LENGTH
+    CHUNKED_UPLOAD_MAX_BYTES = int(os.environ.get('CHUNKED_UPLOAD_MAX_BYTES', 2 * 1024 * 1024 * 1024))  # total per chunked upload
     CORS_HEADERS = 'Content-Type'
+    STREAMING_PARSE = os.environ.get('STREAMING_PARSE', 'True') == 'True'
+    DOCUMENT_TEMPLATE = os.environ.get('DOCUMENT_TEMPLATE')  # optional .docx used as base for section documents
+    HEADING_STYLE_PATTERNS = [pattern for pattern in os.environ.get('HEADING_STYLE_PATTERNS', '').split(';') if pattern] or None  # regexes for heading style names with the level as first group, None for the built-in English and localized names
+    EXECUTOR_BACKEND = os.environ.get('EXECUTOR_BACKEND', 'thread')  # thread, process or inline
+    EXECUTOR_WORKERS = int(os.environ.get('EXECUTOR_WORKERS', 0)) or None  # documents in flight per stage of a batch and process pool size, None for no limit and one process per CPU
+    MAX_IN_FLIGHT_DOCUMENTS = int(os.environ.get('MAX_IN_FLIGHT_DOCUMENTS', 0)) or None  # scheduler threads shared by all batches, None picks min(32, cpus + 4)
+    MAX_QUEUED_DOCUMENTS = int(os.environ.get('MAX_QUEUED_DOCUMENTS', 1000))  # document tasks waiting before uploads get 429, 0 disables
+    QUEUE_RETRY_AFTER = int(os.environ.get('QUEUE_RETRY_AFTER', 10))  # seconds, sent with 429 responses
+    OUTPUT_SINK = os.environ.get('OUTPUT_SINK', 'zip')  # zip writes sections straight into the batch archive, directory keeps the tree
+    RESULT_CACHE_FOLDER = os.environ.get('RESULT_CACHE_FOLDER') or os.path.join(BASE_DIR, 'cache')
+    RESULT_CACHE_MAX_BYTES = int(os.environ.get('RESULT_CACHE_MAX_BYTES', 1024 * 1024 * 1024))  # 0 disables the cache
+    SECTION_MANIFEST_FOLDER = os.environ.get('SECTION_MANIFEST_FOLDER', os.path.join(BASE_DIR, 'manifests'))  # empty disables section reuse
+    BATCH_TTL_SECONDS = int(os.environ.get('BATCH_TTL_SECONDS', 24 * 3600))  # batches unused this long are removed, 0 keeps them
+    STORAGE_QUOTA_BYTES = int(os.environ.get('STORAGE_QUOTA_BYTES', 10 * 1024 * 1024 * 1024))  # results + uploads, least recently used batches go first; 0 disables
+    STORAGE_MIN_FREE_BYTES = int(os.environ.get('STORAGE_MIN_FREE_BYTES', 1000000000))  # below this uploads are refused with Retry-After
+    STORAGE_GRACE_SECONDS = float(os.environ.get('STORAGE_GRACE_SECONDS', 600))  # batches used this recently are never removed
+    STORAGE_SWEEP_INTERVAL = float(os.environ.get('STORAGE_SWEEP_INTERVAL', 60))  # seconds between sweeps, 0 disables the sweeper thread
+    STORAGE_RETRY_AFTER = int(os.environ.get('STORAGE_RETRY_AFTER', 30))  # seconds, sent with refused uploads
+    KEYWORD_SET_FOLDER = os.environ.get('KEYWORD_SET_FOLDER') or os.path.join(BASE_DIR, 'keyword_sets')
+    KEYWORD_CACHE_MAX_BYTES = int(os.environ.get('KEYWORD_CACHE_MAX_BYTES', 256 * 1024 * 1024))  # compiled matchers kept per process, 0 disables
+    TERM_INDEX = os.environ.get('TERM_INDEX', 'True') == 'True'  # keep per-document word counts for /api/terms
+    TERM_INDEX_DB = os.environ.get('TERM_INDEX_DB')  # defaults to terms.sqlite3 in RESULTS_FOLDER
+    PROFILE_REQUESTS = os.environ.get('PROFILE_REQUESTS', 'False') == 'True'  # profile every batch
+    PROFILE_SECRET = os.environ.get('SECRET_KEY')  # a request with X-Profile-Token equal to it is profiled; unset disables that
+    PROFILE_SAMPLE_INTERVAL = float(os.environ.get('PROFILE_SAMPLE_INTERVAL', 0.005))  # seconds between stack samples
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))  # background threads running async upload jobs
+    JOB_DB = os.environ.get('JOB_DB')  # defaults to jobs.sqlite3 in RESULTS_FOLDER
+    JOB_EVENTS_POLL_INTERVAL = float(os.environ.get('JOB_EVENTS_POLL_INTERVAL', 0.25))  # seconds between job store reads
+    JOB_EVENTS_MAX_SECONDS = float(os.environ.get('JOB_EVENTS_MAX_SECONDS', 25))  # clients reconnect after this, under gunicorn's timeout
     DEBUG = os.environ.get('FLASK_DEBUG', 'False') == 'True'
\ No newline at end of file
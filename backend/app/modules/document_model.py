@@ -0,0 +1,80 @@
+import logging
+import threading
+from docx import Document
+from docx.text.paragraph import Paragraph
+from .heading_styles import HeadingStyles
+from .template_cache import clone_document
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+
+# A .docx loaded once and shared read-only by parsing, word counting and
+# tagging. Derived views (paragraph text, heading structure) are computed on
+# first use. Consumers that need to modify the document work on clone().
+class DocumentModel:
+    def __init__(self, path):
+        self.path = path
+        with metrics.timed('document_load'):
+            self.doc = Document(path)
+        self._lock = threading.Lock()
+        self._blocks = None
+        self._paragraph_texts = None
+        self._text = None
+
+    @property
+    def blocks(self):
+        # (block, heading_level) for every top-level paragraph and table
+        with self._lock:
+            if self._blocks is None:
+                heading_styles = HeadingStyles.of(self.doc)
+                self._blocks = [
+                    (block, heading_styles.level(block._p) if isinstance(block, Paragraph) else None)
+                    for block in self.doc.iter_inner_content()
+                ]
+            return self._blocks
+
+    @property
+    def paragraph_texts(self):
+        with self._lock:
+            if self._paragraph_texts is None:
+                self._paragraph_texts = [para.text for para in self.doc.paragraphs]
+            return self._paragraph_texts
+
+    @property
+    def text(self):
+        # Lower-cased text as used for keyword matching
+        texts = self.paragraph_texts
+        with self._lock:
+            if self._text is None:
+                self._text = " ".join([text.lower() for text in texts])
+            return self._text
+
+    def clone(self):
+        return clone_document(self.doc)
+
+
+# Per-request cache so every uploaded file is unzipped and parsed only once,
+# however many operations run on it and from however many threads.
+class DocumentCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._models = {}
+        self._loading = {}
+
+    def get(self, path):
+        with self._lock:
+            model = self._models.get(path)
+            if model is not None:
+                return model
+            load_lock = self._loading.setdefault(path, threading.Lock())
+
+        with load_lock:
+            with self._lock:
+                model = self._models.get(path)
+            if model is None:
+                logger.info(f"Loading shared document model: {path}")
+                model = DocumentModel(path)
+                with self._lock:
+                    self._models[path] = model
+            return model
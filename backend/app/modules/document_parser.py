@@ -1,139 +1,352 @@
 import os
 import re
+import time
 from docx import Document
+from docx.text.paragraph import Paragraph
 from collections import OrderedDict
+from contextlib import contextmanager
 import logging
-from .keyword_tagger import tag_document
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from .keyword_tagger import add_tags
+from .docx_stream import DocxStream
+from .heading_styles import HeadingStyles
+from .section_writer import SectionWriter
+from .template_cache import heading_style_id, new_document
+from .executor import map_files
+from .output_sink import DirectorySink
+from .section_manifest import SectionManifest
+from .section_export import EXPORT_FILE, OUTPUT_FORMATS, SectionExporter
+from . import metrics
 
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
-def parse_multiple_docx(file_paths, output_folder, parse_level, keywords):
+def parse_multiple_docx(file_paths, output_folder, parse_level, keywords, streaming=False, cache=None,
+                        backend='thread', max_workers=None, on_result=None, sink=None, manifest_folder=None,
+                        output_format='docx'):
     results = []
-    with ThreadPoolExecutor() as executor:
-        future_to_file = {executor.submit(parse_docx, file_path, output_folder, parse_level, keywords): file_path for file_path in file_paths}
-        for future in as_completed(future_to_file):
-            file_path = future_to_file[future]
-            try:
-                doc_folder = future.result()
-                results.append({"file": os.path.basename(file_path), "output_folder": doc_folder})
-            except Exception as exc:
-                logger.error(f'{file_path} generated an exception: {exc}')
-                results.append({"file": os.path.basename(file_path), "error": str(exc)})
+    shared = {'output_folder': output_folder, 'parse_level': parse_level, 'keywords': keywords, 'streaming': streaming,
+              'manifest_folder': manifest_folder, 'output_format': output_format}
+    if backend != 'process':
+        # A document cache and a shared sink only help threads that live in
+        # this process; process workers write section files to output_folder
+        shared['cache'] = cache
+        shared['sink'] = sink
+    for file_path, future in map_files(parse_docx, file_paths, shared, backend, max_workers):
+        try:
+            doc_folder, sections = future.result()
+            results.append({"file": os.path.basename(file_path), "output_folder": doc_folder,
+                            "sections_reused": sections['reused'], "sections_rebuilt": sections['rebuilt'],
+                            "seconds": round(future.seconds, 3)})
+            if sink is not None and not isinstance(sink, DirectorySink):
+                results[-1]["outputs"] = sink.paths(os.path.basename(doc_folder) + '/')
+        except Exception as exc:
+            logger.error(f'{file_path} generated an exception: {exc}')
+            results.append({"file": os.path.basename(file_path), "error": str(exc), "seconds": round(future.seconds, 3)})
+        if on_result:
+            on_result(results[-1])
     return results
 
-def parse_docx(file_path, output_folder, parse_level, keywords):
+def parse_docx(file_path, output_folder, parse_level, keywords, streaming=False, cache=None, sink=None,
+               manifest_folder=None, output_format='docx'):
+    # Splits the document at parse_level, or at several levels from a single
+    # pass (see write_levels). Section files go to sink, by default a directory
+    # tree under output_folder. With output_format 'ndjson' the sections are
+    # exported as records of one file instead (see SectionExporter).
+    # With a manifest_folder, sections unchanged since an earlier upload of the
+    # document are copied from that upload's output instead of being rendered.
+    # Returns the document's folder, relative to which the sink stores them,
+    # and how many sections were reused and rebuilt.
     logger.info(f"Parsing document: {file_path}")
-    try:
-        doc = Document(file_path)
-    except Exception as e:
-        logger.error(f"Error opening document {file_path}: {str(e)}")
-        raise
-
-    content = OrderedDict()
-    current_headings = [None, None, None]
-    current_content = []
-
-    def save_current_content():
-        if current_headings[0]:
-            if current_headings[0] not in content:
-                content[current_headings[0]] = OrderedDict()
-            if current_headings[1]:
-                if current_headings[1] not in content[current_headings[0]]:
-                    content[current_headings[0]][current_headings[1]] = OrderedDict()
-                if current_headings[2]:
-                    content[current_headings[0]][current_headings[1]][current_headings[2]] = current_content.copy()
-                else:
-                    content[current_headings[0]][current_headings[1]][""] = current_content.copy()
+    sink = sink or DirectorySink(output_folder)
+    if cache is not None:
+        # Another operation on this upload needs the loaded document anyway
+        model = cache.get(file_path)
+        detect_start = time.perf_counter()
+        blocks = model.blocks
+    else:
+        if streaming:
+            # Only a document the stream cannot open falls back to the full
+            # load; once sections are written, starting over would write them
+            # a second time
+            try:
+                with metrics.timed('document_load'):
+                    stream = DocxStream(file_path)
+            except Exception as e:
+                logger.warning(f"Streaming parse failed for {file_path}, falling back to full document load: {str(e)}")
             else:
-                content[current_headings[0]][""] = {"": current_content.copy()}
-        current_content.clear()
+                return parse_docx_streaming(stream, file_path, output_folder, parse_level, keywords, sink,
+                                            manifest_folder, output_format)
+
+        try:
+            with metrics.timed('document_load'):
+                doc = Document(file_path)
+        except Exception as e:
+            logger.error(f"Error opening document {file_path}: {str(e)}")
+            raise
+        detect_start = time.perf_counter()
+        heading_styles = HeadingStyles.of(doc)
+        blocks = ((block, heading_styles.level(block._p) if isinstance(block, Paragraph) else None)
+                  for block in doc.iter_inner_content())
+
+    sections = SectionTree()
+    for block, heading_level in blocks:
+        sections.add(block, heading_level)
+    sections.close()
+    metrics.record('heading_detection', time.perf_counter() - detect_start)
+    metrics.count('paragraphs', sections.blocks)
+
+    doc_folder, doc_path = create_doc_folder(file_path, output_folder, sink)
+    with open_exporter(sink, file_path, doc_path, keywords, output_format) as exporter:
+        manifest = None if exporter else open_manifest(manifest_folder, doc_path, parse_level, keywords)
+        written = write_levels(sections.content, sink, doc_path, parse_level, keywords, manifest, exporter, set())
+
+    logger.info(f"Parsing complete. Output folder: {doc_folder}")
+    return doc_folder, close_manifest(manifest, written)
+
+def parse_docx_streaming(stream, file_path, output_folder, parse_level, keywords, sink, manifest_folder=None,
+                         output_format='docx'):
+    # Sections are written as soon as the next heading at or above the highest
+    # parse level shows up, so only one output section is held in memory at a time.
+    # stream is the DocxStream opened on file_path, closed when done.
+    with stream:
+        doc_folder, doc_path = create_doc_folder(file_path, output_folder, sink)
+        with open_exporter(sink, file_path, doc_path, keywords, output_format) as exporter:
+            manifest = None if exporter else open_manifest(manifest_folder, doc_path, parse_level, keywords)
+            written = 0
+            paths = set()
+            # Detection is interleaved with writing; only the time between writes counts
+            detect_seconds = 0.0
+            detect_start = time.perf_counter()
+            sections = SectionTree()
+            flush_level = min(parse_levels(parse_level))
+            for block in stream.iter_block_items():
+                heading_level = stream.heading_level(block) if isinstance(block, Paragraph) else None
+                sections.add(block, heading_level)
+                if heading_level and heading_level <= flush_level:
+                    detect_seconds += time.perf_counter() - detect_start
+                    written += write_levels(sections.content, sink, doc_path, parse_level, keywords, manifest,
+                                            exporter, paths)
+                    sections.content.clear()
+                    detect_start = time.perf_counter()
+            sections.close()
+            detect_seconds += time.perf_counter() - detect_start
+            written += write_levels(sections.content, sink, doc_path, parse_level, keywords, manifest, exporter,
+                                    paths)
+            metrics.record('heading_detection', detect_seconds)
+            metrics.count('paragraphs', sections.blocks)
+
+    logger.info(f"Streaming parse complete. Output folder: {doc_folder}")
+    return doc_folder, close_manifest(manifest, written)
+
+def parse_levels(parse_level):
+    # parse_level is one level or a collection of them, each 1 to 3
+    levels = sorted({parse_level} if isinstance(parse_level, int) else set(parse_level))
+    if not levels or levels[0] < 1 or levels[-1] > 3:
+        raise ValueError(f"Invalid parse level: {parse_level}")
+    return levels
+
+def write_levels(content, sink, doc_path, parse_level, keywords, manifest=None, exporter=None, paths=None):
+    # All requested splits are written from the one section tree. With more
+    # than one level each goes to a level_<n> folder of its own, as the file
+    # names of different levels can collide. An exporter takes the sections
+    # in place of the sink. paths collects the section paths written for the
+    # document across calls (see unique_path).
+    levels = parse_levels(parse_level)
+    written = 0
+    for level in levels:
+        level_path = doc_path if len(levels) == 1 else f"{doc_path}/level_{level}"
+        if exporter is not None:
+            written += export_sections(content, exporter, level_path, level)
+        else:
+            written += write_sections(content, sink, level_path, level, keywords, manifest, paths)
+    for bodies in (manifest, exporter):
+        if bodies is not None:
+            bodies.release_bodies()
+    return written
+
+@contextmanager
+def open_exporter(sink, file_path, doc_path, keywords, output_format):
+    # A SectionExporter writing the document's NDJSON file, or None when the
+    # sections are rendered as .docx files
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format: {output_format}")
+    if output_format == 'docx':
+        yield None
+        return
+    with sink.open(f"{doc_path}/{EXPORT_FILE}") as stream:
+        yield SectionExporter(stream, os.path.basename(file_path), keywords)
+
+def open_manifest(manifest_folder, doc_path, parse_level, keywords):
+    if not manifest_folder:
+        return None
+    levels = parse_levels(parse_level)
+    return SectionManifest(manifest_folder, doc_path, levels[0] if len(levels) == 1 else levels, keywords)
+
+def close_manifest(manifest, written):
+    reused = 0
+    if manifest is not None:
+        manifest.save()
+        reused = manifest.reused
+    if reused:
+        logger.info(f"Reused {reused} of {written} unchanged sections")
+    return {'reused': reused, 'rebuilt': written - reused}
 
-    for paragraph in doc.paragraphs:
-        heading_level = get_heading_level(paragraph)
+# Heading text that is equal only to itself, so every occurrence of a heading
+# keys a section of its own, as the streaming parser cannot merge into a
+# section it has already written
+class Heading(str):
+    __eq__ = object.__eq__
+    __ne__ = object.__ne__
+    __hash__ = object.__hash__
 
+class SectionTree:
+    def __init__(self):
+        self.content = OrderedDict()
+        self.current_headings = [None, None, None]
+        self.current_content = []
+        self.blocks = 0
+
+    def add(self, block, heading_level):
+        self.blocks += 1
         if heading_level and heading_level <= 3:
-            save_current_content()
-            current_headings[heading_level - 1] = paragraph.text
+            self.save_current_content()
+            self.current_headings[heading_level - 1] = Heading(block.text)
             for i in range(heading_level, 3):
-                current_headings[i] = None
+                self.current_headings[i] = None
         else:
-            current_content.append(paragraph)
+            self.current_content.append(block)
+
+    def close(self):
+        self.save_current_content()
 
-    save_current_content()
+    def save_current_content(self):
+        # A repeated heading starts a section of its own; iter_sections gives
+        # it a numbered path
+        h1, h2, h3 = self.current_headings
+        if h1:
+            h2_dict = self.content.setdefault(h1, OrderedDict())
+            h3_dict = h2_dict.setdefault(h2 or "", OrderedDict())
+            h3_dict.setdefault((h3 or "") if h2 else "", []).extend(self.current_content)
+        self.current_content.clear()
 
-    # Create main folder for the document
-    doc_title = os.path.splitext(os.path.basename(file_path))[0]
-    doc_folder = os.path.join(output_folder, sanitize_filename(doc_title))
-    os.makedirs(doc_folder, exist_ok=True)
+def create_doc_folder(file_path, output_folder, sink):
+    # Main folder for the document, as a path and as the sink-relative prefix
+    doc_path = sanitize_filename(os.path.splitext(os.path.basename(file_path))[0])
+    doc_folder = os.path.join(output_folder, doc_path)
+    if isinstance(sink, DirectorySink):
+        os.makedirs(doc_folder, exist_ok=True)
+    return doc_folder, doc_path
 
-    # Write content to DOCX files
+def iter_sections(content, doc_path, parse_level, paths=None):
+    # (file path, h1, h2, h3, section content) of every section at parse_level.
+    # paths is the set of section paths the document has written so far.
     for h1, h2_dict in content.items():
-        h1_folder = os.path.join(doc_folder, sanitize_filename(h1))
-        os.makedirs(h1_folder, exist_ok=True)
+        h1_path = f"{doc_path}/{sanitize_filename(h1)}"
 
         if parse_level == 1:
-            file_name = f"{sanitize_filename(h1)}.docx"
-            full_path = os.path.join(doc_folder, file_name)
-            save_docx(full_path, h1, "", "", h2_dict, 1)
-            if keywords:
-                tags = tag_document(full_path, keywords)
-                logger.info(f"Tagged document {full_path} with tags: {tags}")
+            yield unique_path(f"{h1_path}.docx", paths), h1, "", "", h2_dict
         else:
             for h2, h3_dict in h2_dict.items():
-                h2_folder = os.path.join(h1_folder, sanitize_filename(h2)) if h2 else h1_folder
-                os.makedirs(h2_folder, exist_ok=True)
+                h2_path = f"{h1_path}/{sanitize_filename(h2)}" if h2 else h1_path
 
                 if parse_level == 2:
-                    file_name = f"{sanitize_filename(h2 or 'content')}.docx"
-                    full_path = os.path.join(h2_folder, file_name)
-                    save_docx(full_path, h1, h2, "", h3_dict, 2)
-                    if keywords:
-                        tags = tag_document(full_path, keywords)
-                        logger.info(f"Tagged document {full_path} with tags: {tags}")
+                    yield (unique_path(f"{h2_path}/{sanitize_filename(h2 or 'content')}.docx", paths),
+                           h1, h2, "", h3_dict)
                 elif parse_level == 3:
                     for h3, paragraphs in h3_dict.items():
-                        file_name = f"{sanitize_filename(h3 or 'content')}.docx"
-                        full_path = os.path.join(h2_folder, file_name)
-                        save_docx(full_path, h1, h2, h3, paragraphs, 3)
-                        if keywords:
-                            tags = tag_document(full_path, keywords)
-                            logger.info(f"Tagged document {full_path} with tags: {tags}")
+                        yield (unique_path(f"{h2_path}/{sanitize_filename(h3 or 'content')}.docx", paths),
+                               h1, h2, h3, paragraphs)
 
-    logger.info(f"Parsing complete. Output folder: {doc_folder}")
-    return doc_folder
-
-def save_docx(full_path, h1, h2, h3, content, level):
-    try:
-        doc = Document()
-        if level >= 1 and h1:
-            doc.add_heading(h1, level=1)
-        if level >= 2 and h2:
-            doc.add_heading(h2, level=2)
-        if level == 3 and h3:
-            doc.add_heading(h3, level=3)
-
-        if level == 1:
-            for h2, h3_dict in content.items():
-                if h2:
-                    doc.add_heading(h2, level=2)
-                for h3, paragraphs in h3_dict.items():
+def unique_path(path, paths):
+    # Headings can repeat, and different headings can sanitize to the same
+    # name. Such a section gets a numbered path instead of replacing the one
+    # written before it.
+    if paths is None:
+        return path
+    base, ext = os.path.splitext(path)
+    unique = path
+    number = 2
+    while unique in paths:
+        unique = f"{base} ({number}){ext}"
+        number += 1
+    paths.add(unique)
+    return unique
+
+def write_sections(content, sink, doc_path, parse_level, keywords, manifest=None, paths=None):
+    # Write content to DOCX files and return how many were written
+    written = 0
+    for path, h1, h2, h3, section in iter_sections(content, doc_path, parse_level, paths):
+        written += save_section(sink, path, h1, h2, h3, section, parse_level, keywords, manifest)
+    metrics.count('sections', written)
+    return written
+
+def export_sections(content, exporter, doc_path, parse_level):
+    # Export the sections as records and return how many were written
+    written = 0
+    for _, h1, h2, h3, section in iter_sections(content, doc_path, parse_level):
+        written += exporter.write(parse_level, h1, h2, h3, section)
+    metrics.count('sections', written)
+    return written
+
+def save_section(sink, path, h1, h2, h3, content, level, keywords, manifest):
+    if manifest is None:
+        return save_docx(sink, path, h1, h2, h3, content, level, keywords) is not None
+    fingerprint = manifest.fingerprint(h1, h2, h3, content, level)
+    if manifest.reuse(path, fingerprint, sink):
+        logger.info(f"Reused unchanged section: {path}")
+        return True
+    if save_docx(sink, path, h1, h2, h3, content, level, keywords) is None:
+        return False
+    manifest.record(path, fingerprint, sink)
+    return True
+
+def save_docx(sink, path, h1, h2, h3, content, level, keywords=None):
+    with metrics.timed('save_docx'):
+        try:
+            doc = new_document()
+            writer = SectionWriter(doc)
+            if level >= 1 and h1:
+                add_heading(doc, h1, 1)
+            if level >= 2 and h2:
+                add_heading(doc, h2, 2)
+            if level == 3 and h3:
+                add_heading(doc, h3, 3)
+
+            if level == 1:
+                for h2, h3_dict in content.items():
+                    if h2:
+                        add_heading(doc, h2, 2)
+                    for h3, blocks in h3_dict.items():
+                        if h3:
+                            add_heading(doc, h3, 3)
+                        writer.append(blocks)
+            elif level == 2:
+                for h3, blocks in content.items():
                     if h3:
-                        doc.add_heading(h3, level=3)
-                    add_paragraphs(doc, paragraphs)
-        elif level == 2:
-            for h3, paragraphs in content.items():
-                if h3:
-                    doc.add_heading(h3, level=3)
-                add_paragraphs(doc, paragraphs)
-        else:
-            add_paragraphs(doc, content)
+                        add_heading(doc, h3, 3)
+                    writer.append(blocks)
+            else:
+                writer.append(content)
+
+            # Tag while the section is still in memory so it is saved only once
+            tags = add_tags(doc, keywords) if keywords else []
 
-        doc.save(full_path)
-        logger.info(f"Saved parsed content to: {full_path}")
-    except Exception as e:
-        logger.error(f"Error saving document {full_path}: {str(e)}")
+            sink.save(path, doc)
+            logger.info(f"Saved parsed content to: {path}")
+            if keywords:
+                logger.info(f"Tagged document {path} with tags: {tags} (skipped reload and re-save)")
+            return tags
+        except Exception as e:
+            logger.error(f"Error saving document {path}: {str(e)}")
+
+def add_heading(doc, text, level):
+    # As doc.add_heading, with the heading style resolved once per template
+    style_id = heading_style_id(level)
+    if style_id is None:
+        return doc.add_heading(text, level=level)
+    paragraph = doc.add_paragraph(text)
+    paragraph._p.style = style_id
+    return paragraph
 
 def add_paragraphs(doc, paragraphs):
     for para in paragraphs:
@@ -149,14 +362,6 @@ def add_paragraphs(doc, paragraphs):
             new_run.underline = run.underline
             # Add more formatting attributes as needed
 
-def get_heading_level(paragraph):
-    if paragraph.style.name.startswith('Heading'):
-        try:
-            return int(paragraph.style.name.split()[-1])
-        except ValueError:
-            logger.warning(f"Invalid heading style: {paragraph.style.name}")
-    return None
-
 def sanitize_filename(filename):
     # Remove invalid characters and limit length
     sanitized = re.sub(r'[^\w\-_\. ]', '_', filename)
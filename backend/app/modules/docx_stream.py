@@ -0,0 +1,175 @@
+import posixpath
+import zipfile
+import logging
+from lxml import etree
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from docx.opc.packuri import PackURI
+from docx.opc.part import Part
+from docx.opc.rel import Relationships
+from docx.oxml.ns import qn, nsdecls
+from docx.oxml.parser import element_class_lookup, parse_xml
+from docx.styles.styles import Styles
+from docx.table import Table
+from docx.text.paragraph import Paragraph
+from docx.shared import lazyproperty
+from .heading_styles import HeadingStyles
+
+logger = logging.getLogger(__name__)
+
+W_BODY = qn('w:body')
+W_P = qn('w:p')
+W_TBL = qn('w:tbl')
+PR_RELATIONSHIP = '{http://schemas.openxmlformats.org/package/2006/relationships}Relationship'
+CT_DEFAULT = '{http://schemas.openxmlformats.org/package/2006/content-types}Default'
+CT_OVERRIDE = '{http://schemas.openxmlformats.org/package/2006/content-types}Override'
+
+
+def rels_part_name(part_name):
+    directory, filename = posixpath.split(part_name)
+    return posixpath.join(directory, '_rels', f"{filename}.rels")
+
+
+def resolve_target(source_part_name, target):
+    if target.startswith('/'):
+        return target[1:]
+    return posixpath.normpath(posixpath.join(posixpath.dirname(source_part_name), target)).lstrip('/')
+
+
+# Package part whose bytes stay in the source zip until something serializes
+# it, so related parts (images, charts, embeddings) can be attached to section
+# documents without loading every one of them up front.
+class ZipPart(Part):
+    def __init__(self, partname, content_type, zip_file):
+        super().__init__(PackURI(f"/{partname}"), content_type)
+        self._zip = zip_file
+
+    @property
+    def blob(self):
+        return self._zip.read(self.partname[1:])
+
+    @lazyproperty
+    def element(self):
+        return parse_xml(self.blob)
+
+
+# Reads the body of a .docx package one top-level paragraph or table at a time. Only
+# styles.xml is parsed up front; the main document part is consumed with
+# iterparse and each body element is detached from the tree once handed out,
+# so memory is bounded by what the caller keeps alive. Block items are yielded
+# as python-docx proxies with the stream standing in as their part, which keeps
+# style lookups working the same way as for a fully loaded Document.
+class DocxStream:
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self._zip = zipfile.ZipFile(file_path)
+        try:
+            self.document_part = self._related_part('', RT.OFFICE_DOCUMENT)
+            if self.document_part is None:
+                raise ValueError(f"No main document part found in {file_path}")
+            self._content_types = self._read_content_types()
+            self._parts = {}
+            self.rels = self._load_rels(self.document_part)
+            try:
+                styles_element = self.part_related_by(RT.STYLES).element
+            except KeyError:
+                styles_element = parse_xml(f'<w:styles {nsdecls("w")}/>')
+            self.styles = Styles(styles_element)
+            self.heading_styles = HeadingStyles(styles_element)
+        except Exception:
+            self._zip.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self._zip.close()
+
+    @property
+    def part(self):
+        return self
+
+    def get_style(self, style_id, style_type):
+        return self.styles.get_by_id(style_id, style_type)
+
+    def part_related_by(self, reltype):
+        return self.rels.part_with_reltype(reltype)
+
+    def relationships(self, part_name):
+        rels_name = rels_part_name(part_name) if part_name else '_rels/.rels'
+        try:
+            root = etree.fromstring(self._zip.read(rels_name))
+        except KeyError:
+            return []
+        return [rel.attrib for rel in root.iter(PR_RELATIONSHIP)]
+
+    def _related_part(self, part_name, reltype):
+        for rel in self.relationships(part_name):
+            if rel.get('Type') == reltype and rel.get('TargetMode') != 'External':
+                return resolve_target(part_name, rel['Target'])
+        return None
+
+    def _read_content_types(self):
+        root = etree.fromstring(self._zip.read('[Content_Types].xml'))
+        content_types = {}
+        for default in root.iter(CT_DEFAULT):
+            content_types[default.get('Extension').lower()] = default.get('ContentType')
+        for override in root.iter(CT_OVERRIDE):
+            content_types[override.get('PartName').lstrip('/')] = override.get('ContentType')
+        return content_types
+
+    def _content_type(self, part_name):
+        if part_name in self._content_types:
+            return self._content_types[part_name]
+        return self._content_types.get(posixpath.splitext(part_name)[1][1:].lower(), 'application/octet-stream')
+
+    def _load_part(self, part_name):
+        part = self._parts.get(part_name)
+        if part is None:
+            part = self._parts[part_name] = ZipPart(part_name, self._content_type(part_name), self._zip)
+            self._load_rels(part_name, part.rels)
+        return part
+
+    def _load_rels(self, part_name, rels=None):
+        if rels is None:
+            rels = Relationships(posixpath.dirname(f"/{part_name}"))
+        for rel in self.relationships(part_name):
+            is_external = rel.get('TargetMode') == 'External'
+            if is_external:
+                target = rel['Target']
+            else:
+                target_name = resolve_target(part_name, rel['Target'])
+                if target_name not in self._zip.NameToInfo:
+                    continue
+                target = self._load_part(target_name)
+            rels.add_relationship(rel['Type'], target, rel['Id'], is_external)
+        return rels
+
+    def heading_level(self, paragraph):
+        return self.heading_styles.level(paragraph._p)
+
+    def iter_block_items(self):
+        with self._zip.open(self.document_part) as stream:
+            context = etree.iterparse(stream, events=('start', 'end'), tag=(W_BODY, W_P, W_TBL),
+                                      remove_blank_text=True, resolve_entities=False)
+            context.set_element_class_lookup(element_class_lookup)
+            body = None
+            for event, elem in context:
+                if event == 'start':
+                    if elem.tag == W_BODY:
+                        body = elem
+                    continue
+                if body is None or elem.getparent() is not body:
+                    continue
+                # Earlier siblings have already been handed out or are body-level
+                # markup we don't emit. The current element itself has to stay
+                # attached until the parser moves on to its next sibling.
+                while elem.getprevious() is not None:
+                    body.remove(elem.getprevious())
+                if elem.tag == W_P:
+                    yield Paragraph(elem, self)
+                else:
+                    yield Table(elem, self)
@@ -0,0 +1,143 @@
+import os
+import time
+import logging
+import multiprocessing
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from . import heading_styles, metrics, template_cache
+from .scheduler import scheduler
+
+logger = logging.getLogger(__name__)
+
+EXECUTOR_BACKENDS = ('thread', 'process', 'inline')
+
+# Arguments shared by every task of a batch. Process workers receive them once
+# through the pool initializer instead of once per submitted file.
+_shared_args = {}
+
+
+# Process workers must not be forked from this process: the request and
+# stage threads may be inside lxml at that moment, and a child that inherits
+# libxml2's lock held hangs on its first parse. A fork server starts them
+# from a clean single-threaded process instead.
+if 'forkserver' in multiprocessing.get_all_start_methods():
+    _process_context = multiprocessing.get_context('forkserver')
+    _process_context.set_forkserver_preload(['app.modules.document_parser', 'app.modules.keyword_tagger',
+                                                  'app.modules.word_counter'])
+else:
+    _process_context = multiprocessing.get_context('spawn')
+
+
+def _install_shared_args(shared, template_path, heading_patterns):
+    # Workers start without the app's per-process setup
+    template_cache.load_template(template_path)
+    heading_styles.configure(heading_patterns)
+    _shared_args.clear()
+    _shared_args.update(shared)
+
+
+def _timed_call(fn, file_path, shared):
+    # Returns (value, exception, seconds) so the time spent on a file reaches
+    # the caller whether it succeeded or not, from threads and processes alike
+    start = time.perf_counter()
+    try:
+        return fn(file_path, **shared), None, time.perf_counter() - start
+    except Exception as exc:
+        return None, exc, time.perf_counter() - start
+
+
+def _call_with_shared_args(fn, file_path):
+    # Stage metrics recorded in the worker travel back with the outcome
+    with metrics.Timings().activate() as timings:
+        outcome = _timed_call(fn, file_path, _shared_args)
+    return outcome, timings.snapshot()
+
+
+def _file_future(outcome):
+    value, exc, seconds = outcome
+    future = Future()
+    future.seconds = seconds
+    if exc is not None:
+        future.set_exception(exc)
+    else:
+        future.set_result(value)
+    return future
+
+
+def largest_first(file_paths):
+    # Starting the biggest files first keeps one large document from becoming
+    # the tail of the batch
+    def size(file_path):
+        try:
+            return os.path.getsize(file_path)
+        except OSError:
+            return 0
+    return sorted(file_paths, key=size, reverse=True)
+
+
+def _in_process(executor, fn, file_path):
+    # Holds a scheduler slot while a process worker does the work
+    return executor.submit(_call_with_shared_args, fn, file_path).result()
+
+
+def map_files(fn, file_paths, shared=None, backend='thread', max_workers=None):
+    # Runs fn(file_path, **shared) for every file and yields (file_path, future)
+    # as they complete; future.seconds is the time spent on that file. Only
+    # file paths travel to the workers; for the process backend fn must be a
+    # module-level function and shared must be picklable. Files are queued on
+    # the process-wide scheduler, which bounds the documents in flight across
+    # all batches; max_workers bounds those of this call and sizes the
+    # process pool.
+    shared = shared or {}
+    ordered = largest_first(file_paths)
+
+    if backend == 'inline':
+        for file_path in ordered:
+            yield file_path, _file_future(_timed_call(fn, file_path, shared))
+        return
+
+    if backend == 'process':
+        executor = ProcessPoolExecutor(max_workers=min(max_workers or os.cpu_count() or 1, len(ordered) or 1),
+                                       mp_context=_process_context, initializer=_install_shared_args,
+                                       initargs=(shared, template_cache.template_path(), heading_styles.patterns()))
+    elif backend != 'thread':
+        raise ValueError(f"Unknown executor backend: {backend}")
+
+    logger.info(f"Running {fn.__name__} on {len(ordered)} files with {backend} executor (max_workers={max_workers})")
+    remaining = iter(ordered)
+    future_to_file = {}
+
+    def submit_next():
+        file_path = next(remaining, None)
+        if file_path is None:
+            return
+        if backend == 'process':
+            future = scheduler.submit(_in_process, executor, fn, file_path)
+        else:
+            future = scheduler.submit(_timed_call, fn, file_path, shared)
+        future_to_file[future] = file_path
+
+    try:
+        for _ in range(max_workers or len(ordered)):
+            submit_next()
+        while future_to_file:
+            done, _ = wait(future_to_file, return_when=FIRST_COMPLETED)
+            for future in done:
+                file_path = future_to_file.pop(future)
+                submit_next()
+                try:
+                    outcome = future.result()
+                    if backend == 'process':
+                        outcome, snapshot = outcome
+                        metrics.merge(snapshot)
+                except Exception as exc:
+                    # The worker itself failed (e.g. a broken process pool)
+                    outcome = None, exc, 0.0
+                yield file_path, _file_future(outcome)
+    finally:
+        # If the consumer stops early (e.g. the batch was cancelled) drop
+        # the files that have not started yet and wait for the rest
+        for future in future_to_file:
+            future.cancel()
+        wait(future_to_file)
+        if backend == 'process':
+            executor.shutdown()
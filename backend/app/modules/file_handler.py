@@ -1,10 +1,15 @@
 import os
 import uuid
+import hashlib
+import shutil
 import zipfile
 import io
 import traceback
 from werkzeug.utils import secure_filename
 from flask import current_app
+from .output_sink import compress_type_for
+from .storage import last_used, storage
+from .upload_session import UploadSession
 
 
 def allowed_file(filename):
@@ -17,25 +22,39 @@ def allowed_file(filename):
 
 
 def save_uploaded_file(file, folder):
+    file_path, digest = save_uploaded_file_hashed(file, folder)
+    return file_path
+
+
+def save_uploaded_file_hashed(file, folder, chunk_size=1024 * 1024):
+    # Saves the upload and returns (path, sha256 hex digest of its bytes); the
+    # digest is computed while the stream is copied, not by reading it back
     try:
         if file and allowed_file(file.filename):
             filename = secure_filename(file.filename)
             file_path = os.path.join(folder, filename)
-            file.save(file_path)
+            sha256 = hashlib.sha256()
+            with open(file_path, 'wb') as f:
+                while True:
+                    chunk = file.stream.read(chunk_size)
+                    if not chunk:
+                        break
+                    sha256.update(chunk)
+                    f.write(chunk)
             current_app.logger.info(f"File saved successfully: {file_path}")
-            return file_path
+            return file_path, sha256.hexdigest()
         else:
             current_app.logger.warning(f"Invalid file: {file.filename if file else 'No file'}")
-            return None
+            return None, None
     except Exception as e:
         current_app.logger.error(f"Error saving uploaded file: {str(e)}")
         current_app.logger.error(traceback.format_exc())
-        return None
+        return None, None
 
 
-def create_batch_folder():
+def create_batch_folder(batch_id=None):
     try:
-        batch_id = str(uuid.uuid4())
+        batch_id = batch_id or str(uuid.uuid4())
         batch_folder = os.path.join(current_app.config['RESULTS_FOLDER'], batch_id)
         os.makedirs(batch_folder, exist_ok=True)
         current_app.logger.info(f"Created batch folder: {batch_folder}")
@@ -57,7 +76,7 @@ def create_zip_file(batch_folder, files_to_zip, zip_filename):
                 file_path = os.path.join(batch_folder, file)
                 if os.path.exists(file_path):
                     current_app.logger.info(f"Adding file to zip: {file_path}")
-                    zf.write(file_path, file)
+                    zf.write(file_path, file, compress_type=compress_type_for(file))
                 else:
                     current_app.logger.warning(f"File not found: {file_path}")
 
@@ -90,7 +109,26 @@ def clear_upload_folder():
     try:
         for filename in os.listdir(upload_folder):
             file_path = os.path.join(upload_folder, filename)
-            if os.path.isfile(file_path):
+            if os.path.isdir(file_path):
+                # A batch's uploads or a chunked upload's spool. Like the
+                # storage sweep, this leaves alone batches in use or used
+                # within the grace period, and also chunked uploads that are
+                # still open, however long since their last chunk.
+                used = last_used(file_path)
+                if used is None or storage.protected(filename, used):
+                    continue
+                session = UploadSession.load(upload_folder, filename)
+                if session is not None and not session.completed:
+                    continue
+                try:
+                    shutil.rmtree(file_path)
+                    files_removed += 1
+                    current_app.logger.info(f"Removed folder: {file_path}")
+                except Exception as e:
+                    errors += 1
+                    current_app.logger.error(f"Error removing folder {file_path}: {str(e)}")
+                    current_app.logger.error(traceback.format_exc())
+            elif os.path.isfile(file_path):
                 try:
                     os.unlink(file_path)
                     files_removed += 1
@@ -0,0 +1,135 @@
+import re
+import logging
+from docx.oxml.ns import qn
+from docx.styles import BabelFish
+
+logger = logging.getLogger(__name__)
+
+W_PPR = qn('w:pPr')
+W_PSTYLE = qn('w:pStyle')
+W_OUTLINE_LVL = qn('w:outlineLvl')
+W_STYLE = qn('w:style')
+W_NAME = qn('w:name')
+W_BASED_ON = qn('w:basedOn')
+W_TYPE = qn('w:type')
+W_DEFAULT = qn('w:default')
+W_STYLE_ID = qn('w:styleId')
+W_VAL = qn('w:val')
+
+# Style names taken for headings, matched case-insensitively against the whole
+# name with the level as first group. Word stores built-in names in English
+# ("heading 1") whatever the UI language, but documents converted from other
+# tools often carry localized names instead.
+DEFAULT_PATTERNS = (
+    r'(?:heading|überschrift|titre|título|titulo|titolo|kop|rubrik|overskrift|otsikko|nagłówek)\s*(\d+)',
+)
+
+# outlineLvl 9 is body text; 0-8 are heading levels 1-9
+BODY_TEXT_OUTLINE_LEVEL = 9
+
+_patterns = [re.compile(pattern, re.IGNORECASE) for pattern in DEFAULT_PATTERNS]
+
+
+def configure(patterns=None):
+    # Replaces the name patterns of this process; None restores the defaults
+    global _patterns
+    _patterns = [re.compile(pattern, re.IGNORECASE) for pattern in (patterns or DEFAULT_PATTERNS)]
+
+
+def patterns():
+    return [pattern.pattern for pattern in _patterns]
+
+
+def heading_level_from_name(style_name):
+    if not style_name:
+        return None
+    for pattern in _patterns:
+        match = pattern.fullmatch(style_name.strip())
+        if match:
+            try:
+                return int(match.group(1))
+            except (IndexError, ValueError):
+                logger.warning(f"Heading style pattern {pattern.pattern} gave no level for {style_name}")
+    return None
+
+
+def outline_level(ppr):
+    # Heading level from a w:pPr's outline level; 0 for explicit body text,
+    # None when it sets none
+    if ppr is None:
+        return None
+    element = ppr.find(W_OUTLINE_LVL)
+    if element is None:
+        return None
+    try:
+        value = int(element.get(W_VAL))
+    except (TypeError, ValueError):
+        return None
+    return value + 1 if 0 <= value < BODY_TEXT_OUTLINE_LEVEL else 0
+
+
+# Heading level of every paragraph style of a document, read once from
+# styles.xml: a style is a heading by its name, its own outline level or,
+# failing both, the style it is based on. Classifying a paragraph is then a
+# lookup of its raw w:pStyle value instead of resolving the style's name.
+# The styles' names are kept as python-docx reports them, for exports.
+class HeadingStyles:
+    def __init__(self, styles_element):
+        styles = {}
+        self.names = {}
+        self.default_style_id = None
+        for style in styles_element.iterchildren(W_STYLE):
+            if style.get(W_TYPE, 'paragraph') != 'paragraph':
+                continue
+            style_id = style.get(W_STYLE_ID)
+            styles[style_id] = style
+            name = style.find(W_NAME)
+            self.names[style_id] = BabelFish.internal2ui(name.get(W_VAL)) if name is not None else None
+            if self.default_style_id is None and style.get(W_DEFAULT) in ('1', 'true', 'on'):
+                self.default_style_id = style_id
+
+        resolved = {}
+
+        def resolve(style_id, seen=()):
+            if style_id in resolved:
+                return resolved[style_id]
+            style = styles.get(style_id)
+            if style is None or style_id in seen:
+                return 0
+            name = style.find(W_NAME)
+            level = heading_level_from_name(name.get(W_VAL) if name is not None else None)
+            if level is None:
+                level = outline_level(style.find(W_PPR))
+            if level is None:
+                based_on = style.find(W_BASED_ON)
+                level = resolve(based_on.get(W_VAL), seen + (style_id,)) if based_on is not None else 0
+            resolved[style_id] = level
+            return level
+
+        self.levels = {style_id: level for style_id in styles if (level := resolve(style_id))}
+
+    @classmethod
+    def of(cls, doc):
+        return cls(doc.styles.element)
+
+    def style_id(self, p):
+        ppr = p.find(W_PPR)
+        style = ppr.find(W_PSTYLE) if ppr is not None else None
+        return style.get(W_VAL) if style is not None else self.default_style_id
+
+    def name(self, p):
+        # Like python-docx, an unknown style id stands for the default style
+        style_id = self.style_id(p)
+        return self.names[style_id] if style_id in self.names else self.names.get(self.default_style_id)
+
+    def level(self, p):
+        # p is the paragraph's w:p element. An outline level set on the
+        # paragraph itself overrides its style's.
+        ppr = p.find(W_PPR)
+        if ppr is None:
+            return self.levels.get(self.default_style_id)
+        direct = ppr.find(W_OUTLINE_LVL)
+        if direct is not None:
+            return outline_level(ppr) or None
+        style = ppr.find(W_PSTYLE)
+        return self.levels.get(style.get(W_VAL) if style is not None else self.default_style_id)
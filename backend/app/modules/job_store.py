@@ -0,0 +1,227 @@
+import json
+import os
+import sqlite3
+import time
+from contextlib import closing
+
+QUEUED = 'queued'
+RUNNING = 'running'
+COMPLETED = 'completed'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+FINISHED_STATES = (COMPLETED, FAILED, CANCELLED)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    state TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    options TEXT,
+    files TEXT,
+    result TEXT,
+    error TEXT,
+    status_code INTEGER,
+    owner_pid INTEGER,
+    cancel_requested INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS job_files (
+    job_id TEXT NOT NULL,
+    file TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    state TEXT NOT NULL,
+    error TEXT,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (job_id, file, stage)
+);
+CREATE TABLE IF NOT EXISTS job_events (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id TEXT NOT NULL,
+    event TEXT NOT NULL,
+    data TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS job_events_job ON job_events (job_id, seq);
+"""
+
+
+# Durable job state in a SQLite file. Every call opens its own connection so
+# the store can be used from request threads, job workers and other gunicorn
+# worker processes at the same time.
+class JobStore:
+    def __init__(self, path):
+        self.path = path
+        with closing(self._connect()) as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _execute(self, sql, params=()):
+        with closing(self._connect()) as conn:
+            with conn:
+                return conn.execute(sql, params).rowcount
+
+    def create(self, job_id, options, files, stages):
+        # stages maps each stage to the names it reports progress for
+        now = time.time()
+        with closing(self._connect()) as conn:
+            with conn:
+                conn.execute(
+                    'INSERT INTO jobs (id, state, created_at, updated_at, options, files, owner_pid) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    (job_id, QUEUED, now, now, json.dumps(options), json.dumps(files), os.getpid())
+                )
+                conn.executemany(
+                    'INSERT INTO job_files (job_id, file, stage, state, updated_at) VALUES (?, ?, ?, ?, ?)',
+                    [(job_id, name, stage, QUEUED, now) for stage, names in stages.items() for name in names]
+                )
+
+    def set_state(self, job_id, state, result=None, error=None, status_code=None):
+        return self._execute(
+            'UPDATE jobs SET state = ?, result = ?, error = ?, status_code = ?, updated_at = ? WHERE id = ?',
+            (state, json.dumps(result) if result is not None else None, error, status_code, time.time(), job_id)
+        )
+
+    def start(self, job_id):
+        # Only a queued job can start; returns False if it was cancelled meanwhile
+        return self._execute(
+            'UPDATE jobs SET state = ?, updated_at = ? WHERE id = ? AND state = ?',
+            (RUNNING, time.time(), job_id, QUEUED)
+        ) > 0
+
+    def set_stage(self, job_id, stage, state):
+        self._execute(
+            'UPDATE job_files SET state = ?, updated_at = ? WHERE job_id = ? AND stage = ? AND state = ?',
+            (state, time.time(), job_id, stage, QUEUED)
+        )
+
+    def set_file_state(self, job_id, file, stage, state, error=None):
+        self._execute(
+            'UPDATE job_files SET state = ?, error = ?, updated_at = ? WHERE job_id = ? AND file = ? AND stage = ?',
+            (state, error, time.time(), job_id, file, stage)
+        )
+
+    def close_files(self, job_id, state):
+        self._execute(
+            'UPDATE job_files SET state = ?, updated_at = ? WHERE job_id = ? AND state IN (?, ?)',
+            (state, time.time(), job_id, QUEUED, RUNNING)
+        )
+
+    def request_cancel(self, job_id):
+        # Queued jobs are cancelled right away, running ones stop at the next
+        # file. Returns the job's state afterwards, or None if it had already
+        # finished.
+        now = time.time()
+        with closing(self._connect()) as conn:
+            with conn:
+                requested = conn.execute(
+                    'UPDATE jobs SET cancel_requested = 1, updated_at = ? WHERE id = ? AND state NOT IN (?, ?, ?)',
+                    (now, job_id) + FINISHED_STATES
+                ).rowcount > 0
+                if not requested:
+                    return None
+                dequeued = conn.execute(
+                    'UPDATE jobs SET state = ?, updated_at = ? WHERE id = ? AND state = ?',
+                    (CANCELLED, now, job_id, QUEUED)
+                ).rowcount > 0
+                return CANCELLED if dequeued else RUNNING
+
+    def cancel_requested(self, job_id):
+        with closing(self._connect()) as conn:
+            row = conn.execute('SELECT cancel_requested FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return bool(row and row['cancel_requested'])
+
+    def orphaned_jobs(self):
+        # Jobs left queued or running by a process that no longer exists will
+        # never finish. Jobs of sibling worker processes are left alone.
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                'SELECT id, owner_pid FROM jobs WHERE state IN (?, ?)', (QUEUED, RUNNING)
+            ).fetchall()
+        # A restarted container can reuse our own pid, and this process has
+        # not created any jobs yet
+        return [row['id'] for row in rows
+                if row['owner_pid'] == os.getpid() or not pid_alive(row['owner_pid'])]
+
+    def active_jobs(self):
+        # Ids of jobs that are queued or running in any process
+        with closing(self._connect()) as conn:
+            rows = conn.execute('SELECT id FROM jobs WHERE state IN (?, ?)', (QUEUED, RUNNING)).fetchall()
+        return {row['id'] for row in rows}
+
+    def delete(self, job_id):
+        with closing(self._connect()) as conn:
+            with conn:
+                conn.execute('DELETE FROM job_events WHERE job_id = ?', (job_id,))
+                conn.execute('DELETE FROM job_files WHERE job_id = ?', (job_id,))
+                conn.execute('DELETE FROM jobs WHERE id = ?', (job_id,))
+
+    def add_event(self, job_id, event, data):
+        self._execute(
+            'INSERT INTO job_events (job_id, event, data, created_at) VALUES (?, ?, ?, ?)',
+            (job_id, event, json.dumps(data), time.time())
+        )
+
+    def events(self, job_id, after=0):
+        # Events of a job in the order they happened, starting after seq `after`
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                'SELECT seq, event, data FROM job_events WHERE job_id = ? AND seq > ? ORDER BY seq',
+                (job_id, after)
+            ).fetchall()
+        return [(row['seq'], row['event'], json.loads(row['data'])) for row in rows]
+
+    def state(self, job_id):
+        with closing(self._connect()) as conn:
+            row = conn.execute('SELECT state FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return row['state'] if row else None
+
+    def get(self, job_id):
+        with closing(self._connect()) as conn:
+            job = conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+            if job is None:
+                return None
+            files = conn.execute(
+                'SELECT file, stage, state, error, updated_at FROM job_files WHERE job_id = ? ORDER BY rowid',
+                (job_id,)
+            ).fetchall()
+
+        progress = {}
+        for row in files:
+            stage = progress.setdefault(row['stage'], {'total': 0, 'done': 0, 'failed': 0, 'files': []})
+            stage['total'] += 1
+            if row['state'] == COMPLETED:
+                stage['done'] += 1
+            elif row['state'] == FAILED:
+                stage['failed'] += 1
+            stage['files'].append({'file': row['file'], 'state': row['state'], 'error': row['error']})
+
+        return {
+            'jobId': job['id'],
+            'state': job['state'],
+            'createdAt': job['created_at'],
+            'updatedAt': job['updated_at'],
+            'cancelRequested': bool(job['cancel_requested']),
+            'options': json.loads(job['options']) if job['options'] else None,
+            'progress': progress,
+            'result': json.loads(job['result']) if job['result'] else None,
+            'error': job['error'],
+            'statusCode': job['status_code'],
+        }
+
+
+def pid_alive(pid):
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
@@ -0,0 +1,153 @@
+import os
+import time
+import logging
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from . import job_store
+from .job_store import JobStore
+from .pipeline import ARCHIVE_NAME, BatchCancelled, PipelineError, Progress, run_pipeline
+
+logger = logging.getLogger(__name__)
+
+
+# Records pipeline progress in the job store and stops the batch at the next
+# finished file once a cancel was requested (possibly by another process).
+# Every step is also appended to the job's event log, which is what
+# /api/jobs/<id>/events streams to clients.
+class JobProgress(Progress):
+    def __init__(self, store, job_id, batch_folder):
+        self.store = store
+        self.job_id = job_id
+        self.batch_folder = batch_folder
+        self.started = time.perf_counter()
+
+    def elapsed(self):
+        return round(time.perf_counter() - self.started, 3)
+
+    def check_cancelled(self):
+        if self.store.cancel_requested(self.job_id):
+            raise BatchCancelled(f"Job {self.job_id} was cancelled")
+
+    def stage(self, stage):
+        self.check_cancelled()
+        self.store.set_stage(self.job_id, stage, job_store.RUNNING)
+        self.store.add_event(self.job_id, 'stage', {'stage': stage, 'elapsed': self.elapsed()})
+
+    def file_done(self, stage, result):
+        name = 'summary' if stage == 'summary' else result['file']
+        state = job_store.FAILED if 'error' in result else job_store.COMPLETED
+        self.store.set_file_state(self.job_id, name, stage, state, result.get('error'))
+
+        event = {'stage': stage, 'file': name, 'state': state, 'elapsed': self.elapsed(),
+                 'seconds': result.get('seconds'), 'error': result.get('error'),
+                 'outputs': result_outputs(self.job_id, self.batch_folder, result)}
+        if 'tags' in result:
+            event['tags'] = result['tags']
+        if 'sections_reused' in result:
+            event['sections'] = {'reused': result['sections_reused'], 'rebuilt': result['sections_rebuilt']}
+        self.store.add_event(self.job_id, 'file', event)
+        self.check_cancelled()
+
+
+def result_outputs(batch_id, batch_folder, result):
+    # Files a single stage result produced, as downloadable paths in the batch.
+    # Sections written straight into the batch archive are listed as members
+    # of it and can be downloaded once the archive is complete.
+    paths = []
+    if result.get('output_folder') and os.path.isdir(result['output_folder']):
+        for root, dirs, files in os.walk(result['output_folder']):
+            paths.extend(os.path.relpath(os.path.join(root, file), batch_folder) for file in files)
+    if result.get('output_file'):
+        paths.append(result['output_file'])
+    if result.get('summary_file'):
+        paths.append(os.path.relpath(result['summary_file'], batch_folder))
+    paths = [path.replace(os.sep, '/') for path in sorted(paths)]
+    outputs = [{'path': path, 'url': f'/api/download/{batch_id}/{path}'} for path in paths]
+    outputs.extend({'path': path, 'archive': f'/api/download/{batch_id}/{ARCHIVE_NAME}'}
+                   for path in result.get('outputs', []))
+    return outputs
+
+
+# Runs upload batches on a local pool of background threads. The job id is the
+# batch id, so a job's workspace is its batch folder under RESULTS_FOLDER.
+class JobManager:
+    def __init__(self):
+        self.store = None
+        self._app = None
+        self._executor = None
+
+    def init_app(self, app):
+        db_path = app.config['JOB_DB'] or os.path.join(app.config['RESULTS_FOLDER'], 'jobs.sqlite3')
+        self.store = JobStore(db_path)
+        self._app = app
+        self._executor = ThreadPoolExecutor(max_workers=app.config['JOB_WORKERS'], thread_name_prefix='job')
+
+        orphaned = self.store.orphaned_jobs()
+        for job_id in orphaned:
+            self.finish(job_id, job_store.FAILED, error="The server stopped before the job finished")
+        if orphaned:
+            logger.warning(f"Marked {len(orphaned)} unfinished jobs from a previous run as failed")
+        logger.info(f"Job store: {db_path}, workers: {app.config['JOB_WORKERS']}")
+
+    def submit(self, batch_id, batch_folder, doc_paths, keywords, options, cache_key=None, timings=None,
+               profile=False, digests=None):
+        names = [os.path.basename(path) for path in doc_paths]
+        stages = {}
+        if options['parse_doc']:
+            stages['parse'] = names
+        if options['create_summary']:
+            stages['summary'] = ['summary']
+        if options['keyword_tag']:
+            stages['tag'] = names
+        self.store.create(batch_id, options, names, stages)
+        self.store.add_event(batch_id, 'job', {'state': job_store.QUEUED})
+        self._executor.submit(self._run, batch_id, batch_folder, doc_paths, keywords, options, cache_key, timings,
+                              profile, digests)
+        logger.info(f"Queued job {batch_id} with {len(doc_paths)} files")
+        return batch_id
+
+    def _run(self, job_id, batch_folder, doc_paths, keywords, options, cache_key, timings, profile, digests=None):
+        if not self.store.start(job_id):
+            logger.info(f"Job {job_id} was cancelled before it started")
+            return
+        self.store.add_event(job_id, 'job', {'state': job_store.RUNNING})
+
+        with self._app.app_context():
+            try:
+                result = run_pipeline(job_id, batch_folder, doc_paths, keywords, options,
+                                      progress=JobProgress(self.store, job_id, batch_folder), cache_key=cache_key,
+                                      timings=timings, profile=profile, digests=digests)
+                self.finish(job_id, job_store.COMPLETED, result=result, status_code=200)
+                logger.info(f"Job {job_id} completed")
+            except BatchCancelled:
+                self.finish(job_id, job_store.CANCELLED)
+                logger.info(f"Job {job_id} cancelled")
+            except PipelineError as e:
+                self.finish(job_id, job_store.FAILED, error=str(e), status_code=e.status)
+            except Exception as e:
+                logger.error(f"Job {job_id} failed: {str(e)}")
+                logger.error(traceback.format_exc())
+                self.finish(job_id, job_store.FAILED, error=str(e), status_code=500)
+
+    def finish(self, job_id, state, result=None, error=None, status_code=None):
+        # Files that never reported (all of them on a result cache hit) take
+        # the final state of the job
+        self.store.close_files(job_id, state)
+        # The event goes first: event streams end once they see a finished
+        # job with no events left to send
+        self.store.add_event(job_id, 'job', {'state': state, 'result': result, 'error': error,
+                                             'statusCode': status_code})
+        self.store.set_state(job_id, state, result=result, error=error, status_code=status_code)
+
+    def get(self, job_id):
+        return self.store.get(job_id)
+
+    def cancel(self, job_id):
+        state = self.store.request_cancel(job_id)
+        if state == job_store.CANCELLED:
+            # It was still queued, so no worker will report the cancellation
+            self.finish(job_id, job_store.CANCELLED)
+        return state is not None
+
+
+jobs = JobManager()
@@ -0,0 +1,139 @@
+import sys
+import hashlib
+from collections import Counter, deque
+
+
+def is_word_char(char):
+    return char.isalnum() or char == '_'
+
+
+def keywords_digest(keywords, whole_words=False):
+    # Identifies a keyword set (and how it matches) by content, without compiling it
+    sha256 = hashlib.sha256(b'whole_words' if whole_words else b'substring')
+    for keyword in keywords:
+        encoded = keyword.encode('utf-8')
+        sha256.update(b'%d:' % len(encoded) + encoded)
+    return sha256.hexdigest()
+
+
+# Aho-Corasick automaton over a keyword list. All keywords are found in one
+# pass over the text regardless of how many there are, with the same
+# substring semantics as `keyword in text`. With whole_words=True a hit only
+# counts when it is not surrounded by (Unicode) letters, digits or '_'.
+class KeywordMatcher:
+    # Below this many keywords repeated `in` scans (C speed) beat walking the
+    # automaton in Python, so find() falls back to them
+    SUBSTRING_SCAN_LIMIT = 256
+
+    def __init__(self, keywords, whole_words=False):
+        self.keywords = list(keywords)
+        self.whole_words = whole_words
+        self.patterns = [keyword for keyword in dict.fromkeys(self.keywords) if keyword]
+        self._match_empty = '' in self.keywords and not whole_words
+        self._digest = None
+        self._build()
+
+    @property
+    def digest(self):
+        if self._digest is None:
+            self._digest = keywords_digest(self.keywords, self.whole_words)
+        return self._digest
+
+    def approx_bytes(self):
+        # Memory held by the keyword list and automaton, for cache accounting
+        total = sys.getsizeof(self.keywords) + sys.getsizeof(self.patterns)
+        total += sum(sys.getsizeof(keyword) for keyword in self.keywords)
+        total += sys.getsizeof(self._goto) + sys.getsizeof(self._fail) + sys.getsizeof(self._outputs)
+        total += sum(sys.getsizeof(transitions) for transitions in self._goto)
+        total += sum(sys.getsizeof(output) for output in self._outputs)
+        return total
+
+    def __len__(self):
+        return len(self.keywords)
+
+    def __bool__(self):
+        return bool(self.keywords)
+
+    def _build(self):
+        goto = [{}]
+        outputs = [[]]
+        for index, pattern in enumerate(self.patterns):
+            state = 0
+            for char in pattern:
+                next_state = goto[state].get(char)
+                if next_state is None:
+                    next_state = len(goto)
+                    goto[state][char] = next_state
+                    goto.append({})
+                    outputs.append([])
+                state = next_state
+            outputs[state].append(index)
+
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in goto[state].items():
+                queue.append(next_state)
+                fallback = fail[state]
+                while fallback and char not in goto[fallback]:
+                    fallback = fail[fallback]
+                fail[next_state] = goto[fallback].get(char, 0)
+                # Inherit the matches of the longest proper suffix
+                outputs[next_state] = outputs[next_state] + outputs[fail[next_state]]
+
+        self._goto = goto
+        self._fail = fail
+        self._outputs = outputs
+
+    def iter_matches(self, text):
+        # Yields (start, end, pattern_index) for every occurrence, overlapping ones included
+        goto, fail, outputs = self._goto, self._fail, self._outputs
+        patterns = self.patterns
+        whole_words = self.whole_words
+        state = 0
+        for position, char in enumerate(text):
+            transitions = goto[state]
+            while char not in transitions and state:
+                state = fail[state]
+                transitions = goto[state]
+            state = transitions.get(char, 0)
+            if outputs[state]:
+                end = position + 1
+                for index in outputs[state]:
+                    start = end - len(patterns[index])
+                    if whole_words and not self._on_word_boundary(text, start, end):
+                        continue
+                    yield start, end, index
+
+    @staticmethod
+    def _on_word_boundary(text, start, end):
+        if start > 0 and is_word_char(text[start - 1]):
+            return False
+        if end < len(text) and is_word_char(text[end]):
+            return False
+        return True
+
+    def find(self, text):
+        if not self.whole_words and len(self.patterns) <= self.SUBSTRING_SCAN_LIMIT:
+            return [keyword for keyword in self.keywords if keyword in text]
+        found = {self.patterns[index] for _, _, index in self.iter_matches(text)}
+        if self._match_empty:
+            found.add('')
+        # Same order (and duplicates) as the keyword list, like the plain list comprehension
+        return [keyword for keyword in self.keywords if keyword in found]
+
+    def count(self, text):
+        return Counter(self.patterns[index] for _, _, index in self.iter_matches(text))
+
+    def positions(self, text):
+        positions = {}
+        for start, _, index in self.iter_matches(text):
+            positions.setdefault(self.patterns[index], []).append(start)
+        return positions
+
+
+def compile_keywords(keywords, whole_words=False):
+    if isinstance(keywords, KeywordMatcher):
+        return keywords
+    return KeywordMatcher(keywords, whole_words=whole_words)
@@ -0,0 +1,181 @@
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+from .keyword_matcher import KeywordMatcher, keywords_digest
+
+logger = logging.getLogger(__name__)
+
+
+# Compiled matchers of this process, least recently used evicted first once
+# their approximate size passes max_bytes. Keys are content hashes, so a set
+# that is replaced, here or in another process, is simply asked for under a
+# new key.
+class MatcherCache:
+    def __init__(self, max_bytes=0):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def get(self, keywords, whole_words=False):
+        return self.get_or_build(keywords_digest(keywords), lambda: keywords, whole_words)
+
+    def get_or_build(self, keywords_hash, load_keywords, whole_words=False):
+        # keywords_hash is keywords_digest() of the list load_keywords returns;
+        # load_keywords is only called on a miss
+        digest = f"{keywords_hash}:{whole_words}"
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is not None:
+                self._entries.move_to_end(digest)
+                self._stats['hits'] += 1
+                return entry[0]
+            self._stats['misses'] += 1
+
+        start = time.perf_counter()
+        matcher = KeywordMatcher(load_keywords(), whole_words=whole_words)
+        size = matcher.approx_bytes()
+        logger.info(f"Compiled {len(matcher)} keywords ({size} bytes) in {time.perf_counter() - start:.3f}s")
+        if size > self.max_bytes:
+            return matcher
+
+        with self._lock:
+            if digest not in self._entries:
+                self._entries[digest] = (matcher, size)
+                self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self._stats['evictions'] += 1
+        return matcher
+
+    def invalidate(self, keywords_hash):
+        # Drops both matchers (substring and whole words) of a keyword list
+        with self._lock:
+            for whole_words in (False, True):
+                entry = self._entries.pop(f"{keywords_hash}:{whole_words}", None)
+                if entry is not None:
+                    self._bytes -= entry[1]
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, entries=len(self._entries), bytes=self._bytes, max_bytes=self.max_bytes)
+
+
+# Keyword sets uploaded once and referred to by id (keywordSetId) on later
+# uploads. Each set is <id>.json with its name and content hash, next to its
+# keywords in <id>-<hash>.txt; every process shares the folder. Replacing a
+# set writes the new keywords before pointing the JSON at them, so a reader
+# never pairs a hash with the wrong list.
+class KeywordSetRegistry:
+    def __init__(self):
+        self.folder = None
+        self.matchers = MatcherCache()
+
+    def init_app(self, app):
+        self.folder = app.config['KEYWORD_SET_FOLDER']
+        self.matchers.max_bytes = app.config['KEYWORD_CACHE_MAX_BYTES']
+        os.makedirs(self.folder, exist_ok=True)
+        logger.info(f"Keyword sets: {self.folder}, matcher cache max {self.matchers.max_bytes} bytes")
+
+    def _path(self, set_id, suffix):
+        # Ids are generated here; anything else cannot name a set
+        try:
+            set_id = uuid.UUID(hex=set_id).hex
+        except (TypeError, ValueError):
+            return None
+        return os.path.join(self.folder, f"{set_id}{suffix}")
+
+    def _write(self, path, content):
+        staging = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(staging, 'w', encoding='utf-8') as f:
+            f.write(content)
+        os.replace(staging, path)
+
+    def get(self, set_id):
+        path = self._path(set_id, '.json')
+        if path is None:
+            return None
+        try:
+            with open(path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def list(self):
+        records = []
+        for name in sorted(os.listdir(self.folder)):
+            if name.endswith('.json'):
+                record = self.get(name[:-len('.json')])
+                if record is not None:
+                    records.append(record)
+        return records
+
+    def keywords(self, record):
+        with open(self._path(record['id'], f"-{record['hash']}.txt"), encoding='utf-8') as f:
+            return f.read().split('\n') if record['count'] else []
+
+    def save(self, name, keywords, set_id=None):
+        # Creates a set, or replaces the keywords of set_id; returns its record
+        # or None if set_id does not exist
+        keywords_hash = keywords_digest(keywords)
+        now = time.time()
+        previous = None
+        if set_id is None:
+            set_id = uuid.uuid4().hex
+            record = {'id': set_id, 'created_at': now}
+        else:
+            previous = self.get(set_id)
+            if previous is None:
+                return None
+            record = dict(previous)
+        record.update({'name': name or record.get('name') or set_id, 'hash': keywords_hash,
+                       'count': len(keywords), 'updated_at': now})
+
+        self._write(self._path(set_id, f"-{keywords_hash}.txt"), '\n'.join(keywords))
+        self._write(self._path(set_id, '.json'), json.dumps(record))
+        if previous is not None and previous['hash'] != keywords_hash:
+            self._remove_keywords(previous)
+        logger.info(f"Saved keyword set {set_id} ({len(keywords)} keywords)")
+        return record
+
+    def delete(self, set_id):
+        record = self.get(set_id)
+        if record is None:
+            return False
+        try:
+            os.remove(self._path(set_id, '.json'))
+        except OSError:
+            pass
+        self._remove_keywords(record)
+        logger.info(f"Deleted keyword set {set_id}")
+        return True
+
+    def _remove_keywords(self, record):
+        try:
+            os.remove(self._path(record['id'], f"-{record['hash']}.txt"))
+        except OSError:
+            pass
+        # Another set may hold the same keywords; it recompiles them once
+        self.matchers.invalidate(record['hash'])
+
+    def matcher(self, set_id, whole_words=False):
+        # The compiled matcher of a set, or None if there is no such set
+        for _ in range(2):
+            record = self.get(set_id)
+            if record is None:
+                return None
+            try:
+                return self.matchers.get_or_build(record['hash'], lambda: self.keywords(record), whole_words)
+            except FileNotFoundError:
+                # Replaced between reading the record and its keywords
+                continue
+        return None
+
+
+keyword_sets = KeywordSetRegistry()
@@ -1,8 +1,11 @@
 import os
 import csv
+import time
 from docx import Document
 import logging
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from .executor import map_files
+from .keyword_matcher import compile_keywords
+from . import metrics
 
 logger = logging.getLogger(__name__)
 
@@ -27,18 +30,25 @@ def read_keywords(reference_file):
 
     return keywords
 
+def add_tags(doc, keywords, text=None):
+    if text is None:
+        text = " ".join([para.text.lower() for para in doc.paragraphs])
+
+    tags = compile_keywords(keywords).find(text)
+
+    if tags:
+        doc.add_paragraph()
+        tag_paragraph = doc.add_paragraph("Tags: ")
+        tag_paragraph.add_run(', '.join(f'"{tag}"' for tag in tags))
+
+    return tags
+
 def tag_document(doc_path, keywords):
     try:
         doc = Document(doc_path)
-        text = " ".join([para.text.lower() for para in doc.paragraphs])
-
-        tags = [keyword for keyword in keywords if keyword in text]
+        tags = add_tags(doc, keywords)
 
         if tags:
-            doc.add_paragraph()
-            tag_paragraph = doc.add_paragraph("Tags: ")
-            tag_paragraph.add_run(', '.join(f'"{tag}"' for tag in tags))
-
             doc.save(doc_path)
             logger.info(f"Document {doc_path} tagged with {len(tags)} keywords")
         else:
@@ -49,36 +59,43 @@ def tag_document(doc_path, keywords):
         logger.error(f"Error tagging document {doc_path}: {str(e)}")
         raise
 
-def tag_multiple_documents(doc_paths, output_folder, keywords):
+def tag_multiple_documents(doc_paths, output_folder, keywords, cache=None, backend='thread', max_workers=None,
+                           on_result=None):
     results = []
-    with ThreadPoolExecutor() as executor:
-        future_to_file = {executor.submit(tag_document_and_save, doc_path, output_folder, keywords): doc_path for doc_path in doc_paths}
-        for future in as_completed(future_to_file):
-            doc_path = future_to_file[future]
-            try:
-                output_file, tags = future.result()
-                results.append({"file": os.path.basename(doc_path), "output_file": output_file, "tags": tags})
-                logger.info(f"Successfully processed {doc_path}")
-            except Exception as exc:
-                logger.error(f'Error processing {doc_path}: {exc}')
-                results.append({"file": os.path.basename(doc_path), "error": str(exc)})
+    shared = {'output_folder': output_folder, 'keywords': compile_keywords(keywords)}
+    if backend != 'process':
+        shared['cache'] = cache
+    for doc_path, future in map_files(tag_document_and_save, doc_paths, shared, backend, max_workers):
+        try:
+            output_file, tags = future.result()
+            results.append({"file": os.path.basename(doc_path), "output_file": output_file, "tags": tags,
+                            "seconds": round(future.seconds, 3)})
+            logger.info(f"Successfully processed {doc_path}")
+        except Exception as exc:
+            logger.error(f'Error processing {doc_path}: {exc}')
+            results.append({"file": os.path.basename(doc_path), "error": str(exc), "seconds": round(future.seconds, 3)})
+        if on_result:
+            on_result(results[-1])
     return results
 
-def tag_document_and_save(doc_path, output_folder, keywords):
+def tag_document_and_save(doc_path, output_folder, keywords, cache=None):
     try:
-        doc = Document(doc_path)
-        text = " ".join([para.text.lower() for para in doc.paragraphs])
-
-        tags = [keyword for keyword in keywords if keyword in text]
-
-        if tags:
-            doc.add_paragraph()
-            tag_paragraph = doc.add_paragraph("Tags: ")
-            tag_paragraph.add_run(', '.join(f'"{tag}"' for tag in tags))
+        if cache is not None:
+            # The shared model is read by other operations, tag a private copy
+            model = cache.get(doc_path)
+            start = time.perf_counter()
+            doc = model.clone()
+            tags = add_tags(doc, keywords, model.text)
+        else:
+            with metrics.timed('document_load'):
+                doc = Document(doc_path)
+            start = time.perf_counter()
+            tags = add_tags(doc, keywords)
 
         output_filename = f"tagged_{os.path.basename(doc_path)}"
         output_path = os.path.join(output_folder, output_filename)
         doc.save(output_path)
+        metrics.record('tagging', time.perf_counter() - start)
 
         logger.info(f"Tagged document saved: {output_path}")
         return output_filename, tags
@@ -0,0 +1,228 @@
+import math
+import time
+import threading
+import contextvars
+from collections import Counter
+from contextlib import contextmanager
+from functools import partial
+
+# Stages timed across the pipeline
+STAGES = ('upload_save', 'queue_wait', 'document_load', 'heading_detection', 'save_docx', 'section_export', 'tagging',
+          'word_count', 'phrase_count', 'xlsx_write', 'zip')
+
+# Seconds; sections take milliseconds, whole documents and archives seconds
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+# Things counted per batch, each exported as parser_<name>_total
+COUNTS = {
+    'documents': 'Documents processed',
+    'sections': 'Section documents written or reused',
+    'paragraphs': 'Paragraphs and tables split into sections',
+    'input_bytes': 'Bytes of uploaded documents processed',
+    'output_bytes': 'Bytes of batch archives produced',
+}
+
+
+def format_labels(labels):
+    return ','.join(f'{name}="{value}"' for name, value in labels)
+
+
+def format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    def __init__(self, name, help, label, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.buckets = tuple(buckets) + (math.inf,)
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observe(self, label_value, value):
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                series = self._series[label_value] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['buckets'][i] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for label_value, series in sorted(self._series.items()):
+                labels = [(self.label, label_value)]
+                for bound, count in zip(self.buckets, series['buckets']):
+                    lines.append(f'{self.name}_bucket{{{format_labels(labels + [("le", format_value(bound))])}}} {count}')
+                lines.append(f'{self.name}_sum{{{format_labels(labels)}}} {format_value(series["sum"])}')
+                lines.append(f'{self.name}_count{{{format_labels(labels)}}} {series["count"]}')
+        return lines
+
+
+class CounterMetric:
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self._lock = threading.Lock()
+        self._value = 0
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    def render(self):
+        with self._lock:
+            value = self._value
+        return [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter', f'{self.name} {format_value(value)}']
+
+
+class GaugeMetric:
+    # Read when rendered, from the state that owns the value
+    def __init__(self, name, help, read):
+        self.name = name
+        self.help = help
+        self.read = read
+
+    def render(self):
+        return [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} gauge', f'{self.name} {format_value(self.read())}']
+
+
+# Process-wide metrics in the Prometheus text format. Each gunicorn worker
+# keeps its own, like any in-process registry.
+class MetricsRegistry:
+    def __init__(self):
+        self.stage_seconds = Histogram('parser_stage_seconds', 'Seconds per invocation of a pipeline stage', 'stage')
+        self.batch_seconds = Histogram('parser_batch_seconds', 'Seconds per batch by outcome', 'outcome')
+        self.counters = {name: CounterMetric(f'parser_{name}_total', help) for name, help in COUNTS.items()}
+        self.extra = []
+
+    def register(self, metric):
+        # Metrics of other modules, such as the scheduler's gauges
+        self.extra.append(metric)
+        return metric
+
+    def render(self):
+        lines = self.stage_seconds.render() + self.batch_seconds.render()
+        for counter in self.counters.values():
+            lines.extend(counter.render())
+        for metric in self.extra:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+# Timings of one batch, collected from every thread that works on it and
+# returned with the response. Stage seconds are summed over threads, so they
+# can add up to more than the batch's wall time.
+class Timings:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+        self.observations = []
+        self.counts = Counter()
+
+    @contextmanager
+    def activate(self):
+        token = _current.set(self)
+        try:
+            yield self
+        finally:
+            _current.reset(token)
+
+    def add(self, stage, seconds):
+        with self._lock:
+            self.observations.append((stage, seconds))
+
+    def count(self, name, amount):
+        with self._lock:
+            self.counts[name] += amount
+
+    def snapshot(self):
+        with self._lock:
+            return {'observations': list(self.observations), 'counts': dict(self.counts)}
+
+    def summary(self):
+        stages = {}
+        with self._lock:
+            for stage, seconds in self.observations:
+                totals = stages.setdefault(stage, {'count': 0, 'seconds': 0.0, 'max': 0.0})
+                totals['count'] += 1
+                totals['seconds'] += seconds
+                totals['max'] = max(totals['max'], seconds)
+            counts = dict(self.counts)
+        for totals in stages.values():
+            totals['seconds'] = round(totals['seconds'], 4)
+            totals['max'] = round(totals['max'], 4)
+        return {
+            'seconds': round(time.perf_counter() - self.started, 4),
+            'stages': {stage: stages[stage] for stage in STAGES if stage in stages},
+            'counts': counts,
+        }
+
+
+_current = contextvars.ContextVar('timings', default=None)
+
+
+def record(stage, seconds):
+    registry.stage_seconds.observe(stage, seconds)
+    timings = _current.get()
+    if timings is not None:
+        timings.add(stage, seconds)
+
+
+def count(name, amount=1):
+    registry.counters[name].inc(amount)
+    timings = _current.get()
+    if timings is not None:
+        timings.count(name, amount)
+
+
+@contextmanager
+def timed(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - start)
+
+
+def merge(snapshot):
+    # Replays what a process worker recorded; its own registry is discarded
+    for stage, seconds in snapshot['observations']:
+        record(stage, seconds)
+    for name, amount in snapshot['counts'].items():
+        count(name, amount)
+
+
+# Called as wrapper(fn, *args, **kwargs) around every propagated call, such
+# as the profiler's, which joins pool threads to the batch profile
+_call_wrappers = []
+
+
+def wrap_calls(wrapper):
+    if wrapper not in _call_wrappers:
+        _call_wrappers.append(wrapper)
+
+
+def _call(fn, *args, **kwargs):
+    for wrapper in _call_wrappers:
+        fn = partial(wrapper, fn)
+    return fn(*args, **kwargs)
+
+
+def propagate(fn):
+    # Runs fn in a copy of the caller's context, so pool threads record into
+    # the caller's batch, through the registered call wrappers
+    return partial(contextvars.copy_context().run, _call, fn)
+
+
+def finish_batch(timings, outcome):
+    registry.batch_seconds.observe(outcome, time.perf_counter() - timings.started)
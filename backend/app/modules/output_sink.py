@@ -0,0 +1,200 @@
+import os
+import io
+import shutil
+import logging
+import tempfile
+import threading
+import time
+import zipfile
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Formats that are zip archives themselves; deflating them again only burns CPU
+PRECOMPRESSED_EXTENSIONS = {'.docx', '.xlsx', '.zip'}
+
+# Bytes of a ZipSink stream kept in memory before it spools to disk
+SPOOL_MAX_BYTES = 8 * 1024 * 1024
+
+COPY_CHUNK_BYTES = 1024 * 1024
+
+
+def compress_type_for(path):
+    if os.path.splitext(path)[1].lower() in PRECOMPRESSED_EXTENSIONS:
+        return zipfile.ZIP_STORED
+    return zipfile.ZIP_DEFLATED
+
+
+# Where generated files go. Paths are relative and '/'-separated; each sink
+# decides how they are stored. Sinks are shared by the worker threads of a
+# batch, so writes must be thread-safe.
+class OutputSink:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._paths = []
+        self.bytes_written = 0
+
+    def save(self, path, doc):
+        # doc is anything with a python-docx style save(path_or_stream)
+        buffer = io.BytesIO()
+        doc.save(buffer)
+        self.write(path, buffer.getvalue())
+
+    def write(self, path, data):
+        raise NotImplementedError
+
+    @contextmanager
+    def open(self, path):
+        # A binary stream for a file written piece by piece, stored when the
+        # block exits cleanly. By default it is kept in memory until then;
+        # DirectorySink and ZipSink bound what they hold.
+        buffer = io.BytesIO()
+        yield buffer
+        self.write(path, buffer.getvalue())
+
+    def add_file(self, source_path, path):
+        with open(source_path, 'rb') as f:
+            self.write(path, f.read())
+
+    def _record(self, path, size):
+        with self._lock:
+            self._paths.append(path)
+            self.bytes_written += size
+
+    def location(self, path):
+        # Where a written file can be read back later, or None if it can't
+        return None
+
+    def paths(self, prefix=''):
+        with self._lock:
+            return [path for path in self._paths if path.startswith(prefix)]
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+# Files in a directory tree, the layout the parser always produced.
+class DirectorySink(OutputSink):
+    def __init__(self, root):
+        super().__init__()
+        self.root = root
+        self._folders = set()
+
+    def full_path(self, path):
+        return os.path.join(self.root, *path.split('/'))
+
+    def _makedirs(self, full_path):
+        folder = os.path.dirname(full_path)
+        if folder not in self._folders:
+            os.makedirs(folder, exist_ok=True)
+            self._folders.add(folder)
+
+    def save(self, path, doc):
+        full_path = self.full_path(path)
+        self._makedirs(full_path)
+        doc.save(full_path)
+        self._record(path, os.path.getsize(full_path))
+
+    def write(self, path, data):
+        full_path = self.full_path(path)
+        self._makedirs(full_path)
+        with open(full_path, 'wb') as f:
+            f.write(data)
+        self._record(path, len(data))
+
+    @contextmanager
+    def open(self, path):
+        full_path = self.full_path(path)
+        self._makedirs(full_path)
+        with open(full_path, 'wb') as f:
+            yield f
+        self._record(path, os.path.getsize(full_path))
+
+    def location(self, path):
+        return {'file': os.path.abspath(self.full_path(path))}
+
+    def add_file(self, source_path, path):
+        full_path = self.full_path(path)
+        if os.path.abspath(source_path) != os.path.abspath(full_path):
+            self._makedirs(full_path)
+            shutil.copyfile(source_path, full_path)
+        self._record(path, os.path.getsize(full_path))
+
+
+# Members of a zip archive written as they are produced, so there is no
+# intermediate tree to walk and read back. Already compressed formats (the
+# generated .docx and .xlsx) are stored as they are.
+class ZipSink(OutputSink):
+    def __init__(self, zip_path):
+        super().__init__()
+        self.zip_path = zip_path
+        self._zip = zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED)
+
+    def write(self, path, data):
+        with self._lock:
+            self._zip.writestr(path, data, compress_type=compress_type_for(path))
+        self._record(path, len(data))
+
+    @contextmanager
+    def open(self, path):
+        # The archive takes one member at a time, and other threads keep
+        # adding theirs while this one is produced. So the stream spools to a
+        # temporary file past SPOOL_MAX_BYTES and is copied into the archive
+        # in chunks when the block exits, instead of holding the lock meanwhile.
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES) as spool:
+            yield spool
+            size = spool.tell()
+            spool.seek(0)
+            info = zipfile.ZipInfo(path, date_time=time.localtime(time.time())[:6])
+            info.compress_type = compress_type_for(path)
+            info.file_size = size
+            with self._lock:
+                with self._zip.open(info, 'w') as member:
+                    shutil.copyfileobj(spool, member, COPY_CHUNK_BYTES)
+        self._record(path, size)
+
+    def location(self, path):
+        return {'archive': os.path.abspath(self.zip_path), 'member': path}
+
+    def add_file(self, source_path, path):
+        with self._lock:
+            self._zip.write(source_path, path, compress_type=compress_type_for(path))
+        self._record(path, os.path.getsize(source_path))
+
+    def close(self):
+        with self._lock:
+            if self._zip.fp is not None:
+                self._zip.close()
+                logger.info(f"Closed archive {self.zip_path} with {len(self._paths)} files, "
+                            f"{os.path.getsize(self.zip_path)} bytes")
+
+
+# Keeps everything in memory, for callers that post-process the output.
+class MemorySink(OutputSink):
+    def __init__(self):
+        super().__init__()
+        self.files = {}
+
+    def write(self, path, data):
+        with self._lock:
+            self.files[path] = data
+        self._record(path, len(data))
+
+
+def read_location(location, archives=None):
+    # Reads back a file recorded by OutputSink.location. Open archives are
+    # kept in `archives` so a caller reading many members opens each once.
+    if 'file' in location:
+        with open(location['file'], 'rb') as f:
+            return f.read()
+    archives = {} if archives is None else archives
+    archive = archives.get(location['archive'])
+    if archive is None:
+        archive = archives[location['archive']] = zipfile.ZipFile(location['archive'])
+    return archive.read(location['member'])
@@ -0,0 +1,262 @@
+import os
+import time
+import logging
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from flask import current_app
+from .file_handler import create_zip_file, get_file_size
+from .document_parser import parse_multiple_docx
+from .keyword_tagger import tag_multiple_documents
+from .word_counter import create_word_count_summary
+from .document_model import DocumentCache
+from .output_sink import ZipSink
+from .result_cache import result_cache
+from .term_index import term_index
+from . import metrics
+from .profiler import BatchProfiler
+from .scheduler import scheduler
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_NAME = "processed_documents.zip"
+
+
+class BatchCancelled(Exception):
+    pass
+
+
+class PipelineError(Exception):
+    def __init__(self, message, status=500):
+        super().__init__(message)
+        self.status = status
+
+
+# Receives progress from run_pipeline. Calls can come from several worker
+# threads at once; raising from any of them aborts the batch.
+class Progress:
+    def stage(self, stage):
+        pass
+
+    def file_done(self, stage, result):
+        pass
+
+
+def run_pipeline(batch_id, batch_folder, doc_paths, keywords, options, progress=None, cache_key=None, timings=None,
+                 profile=False, digests=None):
+    # timings may already hold what the request recorded, such as saving the
+    # uploads; the batch's breakdown is returned as response['timings'].
+    # digests maps doc paths to the sha256 computed when they were saved. A
+    # profiled batch writes its profile into the batch folder, even if it
+    # fails, and lists the files in response['profile'].
+    timings = timings or metrics.Timings()
+    profiler = None
+    if profile:
+        profiler = BatchProfiler(current_app.config['PROFILE_SAMPLE_INTERVAL'])
+        # A cache hit would profile nothing
+        cache_key = None
+    try:
+        with timings.activate(), scheduler.batch(batch_id), profiler.activate() if profiler else nullcontext():
+            try:
+                response = process_batch(batch_id, batch_folder, doc_paths, keywords, options, progress, cache_key,
+                                         digests)
+            except BatchCancelled:
+                metrics.finish_batch(timings, 'cancelled')
+                raise
+            except BaseException:
+                metrics.finish_batch(timings, 'failed')
+                raise
+    finally:
+        profile_files = profiler.write(batch_folder) if profiler else None
+    metrics.finish_batch(timings, 'cached' if response.get('cached') else 'completed')
+    response['timings'] = timings.summary()
+    if profile_files:
+        response['profile'] = [{'path': file, 'url': f'/api/download/{batch_id}/{file}'} for file in profile_files]
+    return response
+
+
+def process_batch(batch_id, batch_folder, doc_paths, keywords, options, progress, cache_key, digests=None):
+    progress = progress or Progress()
+
+    if cache_key:
+        cached = result_cache.get(cache_key, batch_id, batch_folder)
+        if cached is not None:
+            if options['create_summary'] and term_index.enabled:
+                term_index.link_files(batch_id, doc_paths, digests)
+            return cached
+
+    metrics.count('documents', len(doc_paths))
+    metrics.count('input_bytes', sum(os.path.getsize(path) for path in doc_paths if os.path.exists(path)))
+
+    # When several operations run on the same uploads, load every file once
+    # and let the operations share it while they run side by side
+    operation_count = sum([options['parse_doc'], options['create_summary'], options['keyword_tag']])
+    backend = current_app.config['EXECUTOR_BACKEND']
+    max_workers = current_app.config['EXECUTOR_WORKERS']
+    cache = DocumentCache() if operation_count > 1 and backend != 'process' else None
+    streaming = current_app.config['STREAMING_PARSE']
+    # Sections unchanged since a document was last uploaded are copied from
+    # that batch's output rather than rendered again
+    manifest_folder = current_app.config['SECTION_MANIFEST_FOLDER'] or None
+
+    sink = None
+    if options['parse_doc'] and output_sink(current_app.config) == 'zip':
+        sink = ZipSink(os.path.join(batch_folder, ARCHIVE_NAME))
+
+    try:
+        results, files_to_zip = run_stages(batch_id, batch_folder, doc_paths, keywords, options, progress, sink,
+                                           cache, streaming, backend, max_workers, manifest_folder, digests)
+    except BaseException:
+        # A partial archive must not look like a result
+        if sink is not None:
+            discard_archive(sink)
+        raise
+    if sink is not None and not sink.paths():
+        discard_archive(sink)
+        sink = None
+
+    logger.info(f"Processing complete. Results: {results}")
+    logger.info(f"Files to zip: {files_to_zip}")
+
+    if sink is not None or files_to_zip:
+        progress.stage('zip')
+        zip_start = time.perf_counter()
+        try:
+            logger.info(f"Creating zip file: {ARCHIVE_NAME}")
+            if sink is not None:
+                for file in files_to_zip:
+                    sink.add_file(os.path.join(batch_folder, file), file)
+                sink.close()
+                zip_path = sink.zip_path
+            else:
+                zip_path = create_zip_file(batch_folder, files_to_zip, ARCHIVE_NAME)
+            zip_size = get_file_size(zip_path)
+            metrics.record('zip', time.perf_counter() - zip_start)
+            metrics.count('output_bytes', zip_size or 0)
+            logger.info(f"Zip file created: {zip_path}, Size: {zip_size} bytes")
+
+            processed_folders = [{
+                'output_folder': 'All Processed Documents',
+                'zipUrl': f'/api/download/{batch_id}/{ARCHIVE_NAME}'
+            }]
+        except Exception as e:
+            logger.error(f"Error in zip file creation: {str(e)}")
+            logger.error(traceback.format_exc())
+            raise PipelineError(f"Error in zip file creation: {str(e)}")
+        finally:
+            if sink is not None:
+                sink.close()
+    else:
+        logger.warning("No files to zip")
+        processed_folders = []
+
+    response = {
+        'batchId': batch_id,
+        'message': 'Processing completed successfully.',
+        'processedFolders': processed_folders,
+        'results': results
+    }
+    if options['parse_doc']:
+        response['sections'] = {
+            'reused': sum(result.get('sections_reused', 0) for result in results),
+            'rebuilt': sum(result.get('sections_rebuilt', 0) for result in results),
+        }
+    # Failed files might succeed next time, so only clean batches are reused.
+    # Section trees of the directory sink are among files_to_zip and are
+    # cached with the archive, as the results point into them.
+    if cache_key and processed_folders and not any('error' in result for result in results):
+        result_cache.put(cache_key, batch_id, batch_folder, [ARCHIVE_NAME] + files_to_zip, response)
+    return response
+
+
+def output_sink(config):
+    # Parsed sections go straight into the batch archive as they are written.
+    # Process workers cannot share the archive and write a tree that is zipped
+    # afterwards, as does the 'directory' sink.
+    if config['OUTPUT_SINK'] == 'zip' and config['EXECUTOR_BACKEND'] != 'process':
+        return 'zip'
+    return 'directory'
+
+
+def discard_archive(sink):
+    sink.close()
+    os.remove(sink.zip_path)
+
+
+def run_stages(batch_id, batch_folder, doc_paths, keywords, options, progress, sink, cache, streaming, backend, max_workers,
+               manifest_folder=None, digests=None):
+    parse_doc = options['parse_doc']
+    create_summary = options['create_summary']
+    keyword_tag = options['keyword_tag']
+    operation_count = sum([parse_doc, create_summary, keyword_tag])
+
+    results = []
+    files_to_zip = []
+
+    def file_done(stage):
+        return lambda result: progress.file_done(stage, result)
+
+    with ThreadPoolExecutor(max_workers=operation_count) as executor:
+        if parse_doc:
+            logger.info(f"Parsing documents: {doc_paths}")
+            progress.stage('parse')
+            parse_future = executor.submit(metrics.propagate(parse_multiple_docx), doc_paths, batch_folder, options['parse_level'],
+                                           keywords if keyword_tag else None, streaming=streaming, cache=cache,
+                                           backend=backend, max_workers=max_workers, on_result=file_done('parse'),
+                                           sink=sink, manifest_folder=manifest_folder,
+                                           output_format=options.get('output_format', 'docx'))
+        if create_summary:
+            logger.info(f"Creating word count summary for all documents")
+            progress.stage('summary')
+            summary_future = executor.submit(metrics.propagate(create_word_count_summary), doc_paths, batch_folder,
+                                             options['min_count'], options['max_count'], cache=cache,
+                                             backend=backend, max_workers=max_workers,
+                                             index=term_index if term_index.enabled else None, batch_id=batch_id,
+                                             phrases=options.get('phrases'), digests=digests)
+        if keyword_tag:
+            logger.info(f"Tagging documents with keywords: {doc_paths}")
+            progress.stage('tag')
+            tag_future = executor.submit(metrics.propagate(tag_multiple_documents), doc_paths, batch_folder, keywords, cache=cache,
+                                         backend=backend, max_workers=max_workers, on_result=file_done('tag'))
+
+    if parse_doc:
+        parsed_results = stage_result(parse_future, "Error parsing documents")
+        results.extend(parsed_results)
+        for result in parsed_results:
+            if 'output_folder' in result and sink is None:
+                for root, dirs, files in os.walk(result['output_folder']):
+                    for file in files:
+                        relative_path = os.path.relpath(os.path.join(root, file), batch_folder)
+                        files_to_zip.append(relative_path)
+        logger.info(f"Added {len(files_to_zip)} files to zip list from parsing")
+
+    if create_summary:
+        summary_file, summary_message = stage_result(summary_future, "Error creating word count summary")
+        if summary_file:
+            summary_filename = os.path.basename(summary_file)
+            results.append({'summary_file': summary_filename})
+            files_to_zip.append(summary_filename)
+            logger.info(f"Summary file saved: {summary_file}")
+        else:
+            logger.warning(summary_message)
+        results.append({'summary_message': summary_message})
+        progress.file_done('summary', {'summary_file': summary_file, 'summary_message': summary_message})
+
+    if keyword_tag:
+        tagged_results = stage_result(tag_future, "Error tagging documents with keywords")
+        results.extend(tagged_results)
+        files_to_zip.extend([result['output_file'] for result in tagged_results if 'output_file' in result])
+        logger.info(f"Tagged {len(tagged_results)} documents")
+
+    return results, files_to_zip
+
+
+def stage_result(future, error_message):
+    try:
+        return future.result()
+    except (PipelineError, BatchCancelled):
+        raise
+    except Exception as e:
+        logger.error(f"{error_message}: {str(e)}")
+        logger.error(traceback.format_exc())
+        raise PipelineError(f"{error_message}: {str(e)}")
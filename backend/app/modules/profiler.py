@@ -0,0 +1,153 @@
+import os
+import sys
+import hmac
+import pstats
+import cProfile
+import logging
+import threading
+import contextvars
+from collections import Counter
+from contextlib import contextmanager
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+PROFILE_STATS = 'profile.pstats'
+PROFILE_STACKS = 'profile.collapsed'
+PROFILE_SUMMARY = 'profile.txt'
+
+# From Python 3.12 cProfile sits on sys.monitoring: one profiler sees every
+# thread, and only one can be enabled at a time. Before that a profiler only
+# sees the thread that enabled it, so each thread of the batch gets its own.
+PROCESS_WIDE_PROFILER = sys.version_info >= (3, 12)
+
+
+def token_valid(token, secret):
+    return bool(token and secret) and hmac.compare_digest(token.encode('utf-8'), secret.encode('utf-8'))
+
+
+def frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+# Profiles one batch: cProfile for exact call counts and times, plus a
+# sampler that records the stacks of the batch's threads every interval for
+# flame graphs. Threads join the batch through thread(); process workers are
+# not profiled, only the time the batch spends waiting for them.
+class BatchProfiler:
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._profiles = []
+        self._threads = {}
+        self._local = threading.local()
+        self._samples = Counter()
+        self._stop = threading.Event()
+        self._sampler = None
+        self._process_profile = None
+
+    @contextmanager
+    def activate(self):
+        token = _current.set(self)
+        self._sampler = threading.Thread(target=self._sample, name='profile-sampler', daemon=True)
+        self._sampler.start()
+        if PROCESS_WIDE_PROFILER:
+            try:
+                self._process_profile = cProfile.Profile()
+                self._process_profile.enable()
+            except ValueError:
+                # Another batch is being profiled; the samples still cover this one
+                logger.warning("Another profiler is active, writing stack samples only")
+                self._process_profile = None
+        try:
+            with self.thread():
+                yield self
+        finally:
+            if self._process_profile is not None:
+                self._process_profile.disable()
+                self._profiles.append(self._process_profile)
+            self._stop.set()
+            self._sampler.join()
+            _current.reset(token)
+
+    @contextmanager
+    def thread(self):
+        # Profiles the calling thread until the block ends
+        if getattr(self._local, 'active', False):
+            yield
+            return
+        self._local.active = True
+        ident = threading.get_ident()
+        with self._lock:
+            self._threads[ident] = threading.current_thread().name
+        profile = None
+        if not PROCESS_WIDE_PROFILER:
+            profile = cProfile.Profile()
+            profile.enable()
+        try:
+            yield
+        finally:
+            if profile is not None:
+                profile.disable()
+            with self._lock:
+                self._threads.pop(ident, None)
+                if profile is not None:
+                    self._profiles.append(profile)
+            self._local.active = False
+
+    def _sample(self):
+        sampler = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            with self._lock:
+                threads = dict(self._threads)
+            frames = sys._current_frames()
+            for ident, name in threads.items():
+                frame = frames.get(ident)
+                if frame is None or ident == sampler:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(frame_label(frame))
+                    frame = frame.f_back
+                stack.append(name)
+                stack.reverse()
+                self._samples[';'.join(stack)] += 1
+
+    def write(self, folder):
+        # Returns the names of the files written into folder
+        written = []
+        with self._lock:
+            profiles = list(self._profiles)
+            samples = dict(self._samples)
+        if profiles:
+            stats = pstats.Stats(profiles[0])
+            for profile in profiles[1:]:
+                stats.add(profile)
+            stats.dump_stats(os.path.join(folder, PROFILE_STATS))
+            with open(os.path.join(folder, PROFILE_SUMMARY), 'w') as f:
+                stats.stream = f
+                stats.sort_stats('cumulative').print_stats(60)
+            written.extend([PROFILE_STATS, PROFILE_SUMMARY])
+        with open(os.path.join(folder, PROFILE_STACKS), 'w') as f:
+            for stack, count in sorted(samples.items()):
+                f.write(f"{stack} {count}\n")
+        written.append(PROFILE_STACKS)
+        logger.info(f"Wrote profile of {len(profiles)} threads and {sum(samples.values())} samples to {folder}")
+        return written
+
+
+_current = contextvars.ContextVar('profiler', default=None)
+
+
+def run_profiled(fn, *args, **kwargs):
+    # Joins the calling thread to the active batch profile, if any
+    profiler = _current.get()
+    if profiler is None:
+        return fn(*args, **kwargs)
+    with profiler.thread():
+        return fn(*args, **kwargs)
+
+
+# Threads running propagated calls join the profile of the batch they run for
+metrics.wrap_calls(run_profiled)
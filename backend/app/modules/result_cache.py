@@ -0,0 +1,159 @@
+import os
+import json
+import uuid
+import shutil
+import hashlib
+import logging
+import threading
+from .template_cache import template_path
+from .storage import folder_size
+from . import heading_styles
+
+logger = logging.getLogger(__name__)
+
+# Bump when a change to the pipeline changes what it produces for the same input
+CACHE_VERSION = 3
+
+RESPONSE_FILE = 'response.json'
+
+# Per-file fields describing the run that produced a result rather than the
+# result itself; a cache hit did none of that work
+RUN_FIELDS = ('seconds', 'sections_reused', 'sections_rebuilt')
+
+
+def result_cache_key(uploads, keywords, options, settings=None):
+    # uploads: (filename, sha256) per uploaded document. File names are part
+    # of the key because they name the output folders and tagged files.
+    # settings holds the app settings that change what a batch produces.
+    key = {
+        'version': CACHE_VERSION,
+        'files': sorted(uploads),
+        'keywords': keywords.digest if keywords else None,
+        'options': options,
+        'settings': settings,
+        'template': template_path(),
+        'headings': heading_styles.patterns(),
+    }
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def link_or_copy(source, target):
+    # Entries are immutable, so a hard link is as good as a copy and costs no space
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copyfile(source, target)
+
+
+def without_run_fields(response):
+    response = {name: value for name, value in response.items() if name != 'sections'}
+    if 'results' in response:
+        response['results'] = [{name: value for name, value in result.items() if name not in RUN_FIELDS}
+                               for result in response['results']]
+    return response
+
+
+# Finished batches by content: the files a batch put into its folder plus the
+# JSON response, stored under the hash of everything that determines them.
+# Recency is the entry folder's mtime, so every process sharing the folder
+# sees the same LRU order; the total size is bounded by max_bytes.
+class ResultCache:
+    def __init__(self):
+        self.folder = None
+        self.max_bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+
+    def init_app(self, app):
+        self.folder = app.config['RESULT_CACHE_FOLDER']
+        self.max_bytes = app.config['RESULT_CACHE_MAX_BYTES']
+        if self.enabled:
+            os.makedirs(self.folder, exist_ok=True)
+            logger.info(f"Result cache: {self.folder}, max {self.max_bytes} bytes")
+
+    @property
+    def enabled(self):
+        return bool(self.folder and self.max_bytes > 0)
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def get(self, key, batch_id, batch_folder):
+        # Copies a cached result into the batch folder and returns the response
+        # rewritten for the new batch, or None on a miss
+        if not self.enabled:
+            return None
+        entry = os.path.join(self.folder, key)
+        try:
+            with open(os.path.join(entry, RESPONSE_FILE)) as f:
+                cached = json.load(f)
+            for file in cached['files']:
+                link_or_copy(os.path.join(entry, file), os.path.join(batch_folder, file))
+            os.utime(entry)
+        except (OSError, ValueError, KeyError):
+            self._count('misses')
+            return None
+
+        self._count('hits')
+        logger.info(f"Result cache hit {key} for batch {batch_id}")
+        response = json.loads(json.dumps(cached['response']).replace(cached['batch_id'], batch_id))
+        response['cached'] = True
+        return response
+
+    def put(self, key, batch_id, batch_folder, files, response):
+        if not self.enabled:
+            return
+        entry = os.path.join(self.folder, key)
+        if os.path.exists(entry):
+            return
+        staging = os.path.join(self.folder, f".{key}.{uuid.uuid4().hex}")
+        try:
+            os.makedirs(staging)
+            for file in files:
+                link_or_copy(os.path.join(batch_folder, file), os.path.join(staging, file))
+            with open(os.path.join(staging, RESPONSE_FILE), 'w') as f:
+                json.dump({'batch_id': batch_id, 'files': files, 'response': without_run_fields(response)}, f)
+            # Readers never see a half-written entry
+            os.rename(staging, entry)
+        except OSError as e:
+            logger.warning(f"Could not store result cache entry {key}: {str(e)}")
+            shutil.rmtree(staging, ignore_errors=True)
+            return
+        self._count('stores')
+        self.evict()
+
+    def evict(self):
+        entries = []
+        total = 0
+        for name in os.listdir(self.folder):
+            if name.startswith('.'):
+                continue
+            entry = os.path.join(self.folder, name)
+            try:
+                size = folder_size(entry)
+                entries.append((os.path.getmtime(entry), size, entry))
+            except OSError:
+                continue
+            total += size
+
+        for mtime, size, entry in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+            self._count('evictions')
+            logger.info(f"Evicted result cache entry {os.path.basename(entry)} ({size} bytes)")
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = stats['hits'] / lookups if lookups else None
+        stats['enabled'] = self.enabled
+        stats['max_bytes'] = self.max_bytes
+        return stats
+
+
+result_cache = ResultCache()
@@ -0,0 +1,151 @@
+import os
+import time
+import logging
+import threading
+import contextvars
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from contextlib import contextmanager
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def default_workers():
+    # What ThreadPoolExecutor would pick for a single pool
+    return min(32, (os.cpu_count() or 1) + 4)
+
+
+def _after_wait(enqueued, fn, args):
+    metrics.record('queue_wait', time.perf_counter() - enqueued)
+    return fn(*args)
+
+
+# One bounded set of worker threads for the per-document work of every batch
+# in the process, so concurrent uploads share `workers` threads instead of
+# each starting its own pools. Each batch has its own queue and workers take
+# from the batches in turn, so a large batch cannot hold back a small one
+# that arrives after it. Uploads are refused while more than max_queued
+# tasks are waiting.
+class WorkScheduler:
+    def __init__(self):
+        self.workers = 0
+        self.max_queued = 0
+        self.retry_after = 0
+        self._lock = threading.Lock()
+        self._ready = threading.Condition(self._lock)
+        self._queues = OrderedDict()
+        self._queued = 0
+        self._running = 0
+        self._threads = []
+        self._rejected = metrics.CounterMetric('parser_scheduler_rejected_total',
+                                               'Uploads refused because the work queue was full')
+        self._registered = False
+
+    def init_app(self, app):
+        self.workers = app.config['MAX_IN_FLIGHT_DOCUMENTS'] or default_workers()
+        self.max_queued = app.config['MAX_QUEUED_DOCUMENTS']
+        self.retry_after = app.config['QUEUE_RETRY_AFTER']
+        self._register_metrics()
+        self._start()
+        logger.info(f"Scheduler: {self.workers} workers, at most {self.max_queued} queued document tasks")
+
+    def _register_metrics(self):
+        # Once per process, however many apps are created around the scheduler
+        if self._registered:
+            return
+        self._registered = True
+        metrics.registry.register(self._rejected)
+        metrics.registry.register(metrics.GaugeMetric(
+            'parser_scheduler_queued_tasks', 'Document tasks waiting for a worker', lambda: self._queued))
+        metrics.registry.register(metrics.GaugeMetric(
+            'parser_scheduler_running_tasks', 'Document tasks being worked on', lambda: self._running))
+        metrics.registry.register(metrics.GaugeMetric(
+            'parser_scheduler_queued_batches', 'Batches with document tasks waiting', lambda: len(self._queues)))
+
+    def _start(self):
+        with self._lock:
+            if not self.workers:
+                # Used without an app, as by the benchmarks
+                self.workers = default_workers()
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._work, name=f'scheduler-{len(self._threads)}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def admit(self, tasks):
+        # Returns None when a batch of `tasks` document tasks may start, or the
+        # seconds the client should wait before retrying. With nothing
+        # queued a batch is always admitted, however large.
+        with self._lock:
+            if not self.max_queued or not self._queued or self._queued + tasks <= self.max_queued:
+                return None
+            queued = self._queued
+        self._rejected.inc()
+        logger.warning(f"Refusing {tasks} document tasks: {queued} queued, at most {self.max_queued}")
+        return self.retry_after
+
+    @contextmanager
+    def batch(self, batch_id):
+        # Work submitted within the block, from any thread it propagates to,
+        # is queued as batch_id's
+        token = _batch.set(batch_id)
+        try:
+            yield
+        finally:
+            _batch.reset(token)
+
+    def submit(self, fn, *args, batch=None):
+        # Returns a Future of fn(*args), run in the caller's context
+        if not self._threads or len(self._threads) < self.workers:
+            self._start()
+        future = Future()
+        task = (future, metrics.propagate(_after_wait), (time.perf_counter(), fn, args))
+        key = batch or _batch.get() or future
+        with self._lock:
+            queue = self._queues.get(key)
+            if queue is None:
+                queue = self._queues[key] = deque()
+            queue.append(task)
+            self._queued += 1
+            self._ready.notify()
+        return future
+
+    def _next(self):
+        # One task of the batch whose turn it is; the batch goes to the back
+        key, queue = next(iter(self._queues.items()))
+        task = queue.popleft()
+        if queue:
+            self._queues.move_to_end(key)
+        else:
+            del self._queues[key]
+        self._queued -= 1
+        return task
+
+    def _work(self):
+        while True:
+            with self._lock:
+                while not self._queues:
+                    self._ready.wait()
+                future, call, args = self._next()
+                # Tasks of a batch that stopped early were cancelled
+                if not future.set_running_or_notify_cancel():
+                    continue
+                self._running += 1
+            try:
+                future.set_result(call(*args))
+            except BaseException as exc:
+                future.set_exception(exc)
+            finally:
+                with self._lock:
+                    self._running -= 1
+
+    def stats(self):
+        with self._lock:
+            return {'workers': self.workers, 'queued': self._queued, 'running': self._running,
+                    'batches': len(self._queues), 'max_queued': self.max_queued}
+
+
+_batch = contextvars.ContextVar('batch', default=None)
+
+scheduler = WorkScheduler()
@@ -0,0 +1,140 @@
+import json
+from docx.oxml.ns import qn
+from docx.table import Table
+from .heading_styles import HeadingStyles
+from .keyword_matcher import compile_keywords
+from . import metrics
+
+W_R = qn('w:r')
+W_RPR = qn('w:rPr')
+W_HYPERLINK = qn('w:hyperlink')
+W_VAL = qn('w:val')
+
+# Run children that stand for text, as in python-docx's Run.text
+RUN_TEXT_TAGS = {qn('w:t'), qn('w:tab'), qn('w:ptab'), qn('w:br'), qn('w:cr'), qn('w:noBreakHyphen')}
+
+# Run properties reported as formatted spans of a paragraph's text: tag ->
+# (name, w:val values that switch the property off)
+SPAN_FORMATTING = {
+    qn('w:b'): ('bold', ('0', 'false', 'off')),
+    qn('w:i'): ('italic', ('0', 'false', 'off')),
+    qn('w:u'): ('underline', ('none', None)),
+}
+
+# Section output of the parser: a .docx per section, or one NDJSON file per
+# document written by SectionExporter
+OUTPUT_FORMATS = ('docx', 'ndjson')
+
+EXPORT_FILE = 'sections.ndjson'
+
+
+# Writes the sections of one document as NDJSON, a line per section and
+# parse level, in place of rendering them as .docx files:
+#   {"document", "level", "headings": [h1, ...], "tags",
+#    "blocks": [{"type": "heading", "level", "text"} |
+#               {"type": "paragraph", "style", "text", "spans": [{"start", "end", "bold", ...}]} |
+#               {"type": "table", "rows": [[cell text, ...], ...]}]}
+# Headings and tags are those the section's .docx would have had.
+class SectionExporter:
+    def __init__(self, stream, document, keywords=None):
+        self.stream = stream
+        self.document = document
+        self.matcher = compile_keywords(keywords) if keywords else None
+        self._styles = None
+        self._bodies = {}
+
+    def write(self, level, h1, h2, h3, content):
+        with metrics.timed('section_export'):
+            headings = [h1, h2, h3][:level]
+            fragments = []
+            texts = [heading.lower() for heading in headings if heading]
+            if level == 1:
+                for h2, h3_dict in content.items():
+                    if h2:
+                        self._heading(2, h2, fragments, texts)
+                    for h3, blocks in h3_dict.items():
+                        if h3:
+                            self._heading(3, h3, fragments, texts)
+                        self._body(blocks, fragments, texts)
+            elif level == 2:
+                for h3, blocks in content.items():
+                    if h3:
+                        self._heading(3, h3, fragments, texts)
+                    self._body(blocks, fragments, texts)
+            else:
+                self._body(content, fragments, texts)
+
+            tags = self.matcher.find(" ".join(texts)) if self.matcher else []
+            head = json.dumps({'document': self.document, 'level': level, 'headings': headings, 'tags': tags},
+                              ensure_ascii=False)
+            # Block fragments are serialized once and spliced in as they are
+            self.stream.write(f'{head[:-1]}, "blocks": [{", ".join(fragments)}]}}\n'.encode('utf-8'))
+        return 1
+
+    def release_bodies(self):
+        # Called once the sections holding the cached bodies are written
+        self._bodies.clear()
+
+    def _heading(self, level, text, fragments, texts):
+        fragments.append(json.dumps({'type': 'heading', 'level': level, 'text': text}, ensure_ascii=False))
+        texts.append(text.lower())
+
+    def _body(self, blocks, fragments, texts):
+        # A section body is part of the sections of every requested parse
+        # level above it, and is only serialized for the first of them
+        cached = self._bodies.get(id(blocks))
+        if cached is None or cached[0] is not blocks:
+            body_fragments = []
+            body_texts = []
+            for block in blocks:
+                record = self._block(block)
+                body_fragments.append(json.dumps(record, ensure_ascii=False))
+                if record['type'] == 'paragraph':
+                    body_texts.append(record['text'].lower())
+            cached = self._bodies[id(blocks)] = (blocks, body_fragments, body_texts)
+        fragments.extend(cached[1])
+        texts.extend(cached[2])
+
+    def _block(self, block):
+        if isinstance(block, Table):
+            return {'type': 'table', 'rows': [[cell.text for cell in row.cells] for row in block.rows]}
+        if self._styles is None:
+            self._styles = HeadingStyles(block.part.styles.element)
+        p = block._p
+        offset = 0
+        parts = []
+        spans = []
+        for r in iter_runs(p):
+            # Straight from the XML: python-docx's Run.text and Font cost an
+            # XPath query and several lookups per run
+            text = ''.join([str(child) for child in r if child.tag in RUN_TEXT_TAGS])
+            if not text:
+                continue
+            formatting = run_formatting(r)
+            if formatting:
+                spans.append(dict(start=offset, end=offset + len(text), **formatting))
+            parts.append(text)
+            offset += len(text)
+        return {'type': 'paragraph', 'style': self._styles.name(p), 'text': ''.join(parts), 'spans': spans}
+
+
+def run_formatting(r):
+    # {property: True} for the span properties a run's own w:rPr switches on
+    rpr = r.find(W_RPR)
+    if rpr is None:
+        return None
+    formatting = {}
+    for child in rpr:
+        spec = SPAN_FORMATTING.get(child.tag)
+        if spec is not None and child.get(W_VAL) not in spec[1]:
+            formatting[spec[0]] = True
+    return formatting
+
+
+def iter_runs(p):
+    # The runs making up a paragraph's text, those in hyperlinks included
+    for child in p:
+        if child.tag == W_R:
+            yield child
+        elif child.tag == W_HYPERLINK:
+            yield from child.iterchildren(W_R)
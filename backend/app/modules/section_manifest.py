@@ -0,0 +1,204 @@
+import os
+import json
+import uuid
+import hashlib
+import logging
+import zipfile
+import threading
+from contextlib import contextmanager
+from lxml import etree
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from .keyword_matcher import compile_keywords
+from .output_sink import read_location
+from .section_writer import R_NS, find_rel_refs
+from .template_cache import template_path
+
+try:
+    import fcntl
+except ImportError:
+    # Without it saves are only serialized between the threads of a process
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+_save_lock = threading.Lock()
+
+# Bump when a change to section rendering changes the output for the same input
+SECTION_FORMAT_VERSION = 1
+
+
+def sha256_hex(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+@contextmanager
+def locked(path):
+    # Serializes the saves of one manifest across threads and processes
+    with _save_lock, open(path, 'a') as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        yield
+
+
+def location_exists(location):
+    return os.path.exists(location['file'] if 'file' in location else location['archive'])
+
+
+# Digests of the parts of one source document that section outputs depend on,
+# computed at most once per document.
+class SourceDigests:
+    def __init__(self, source):
+        self.source = source
+        self._parts = {}
+        self._document = None
+
+    def document(self):
+        # Styles (including docDefaults) and numbering definitions are copied
+        # into the sections that use them
+        if self._document is None:
+            sha256 = hashlib.sha256()
+            sha256.update(etree.tostring(self.source.styles.element, method='c14n'))
+            try:
+                sha256.update(etree.tostring(self.source.part_related_by(RT.NUMBERING).element, method='c14n'))
+            except KeyError:
+                pass
+            self._document = sha256.hexdigest()
+        return self._document
+
+    def relationship(self, r_id):
+        rel = self.source.rels.get(r_id)
+        if rel is None:
+            return 'missing'
+        if rel.is_external:
+            return f"external:{rel.target_ref}"
+        return self.part(rel.target_part)
+
+    def part(self, part):
+        # A related part is copied with everything it relates to in turn
+        key = id(part)
+        if key in self._parts:
+            return self._parts[key]
+        self._parts[key] = 'cycle'
+        sha256 = hashlib.sha256(part.blob)
+        for r_id, rel in sorted(part.rels.items()):
+            target = f"external:{rel.target_ref}" if rel.is_external else self.part(rel.target_part)
+            sha256.update(f"{r_id}:{rel.reltype}:{target}".encode('utf-8'))
+        self._parts[key] = sha256.hexdigest()
+        return self._parts[key]
+
+
+# Fingerprints of the sections written for one document and where their
+# output went, kept from one upload of a document to the next. A fingerprint
+# covers everything the rendered section depends on, so any earlier output
+# with the same fingerprint can be copied instead of rendering it again.
+# Different documents can share a name, and with it the manifest, so each
+# save merges its sections into those already there.
+class SectionManifest:
+    def __init__(self, folder, doc_name, parse_level, keywords):
+        self.path = os.path.join(folder, f"{sha256_hex(doc_name.encode('utf-8'))}.json")
+        self.settings = sha256_hex(json.dumps({
+            'version': SECTION_FORMAT_VERSION,
+            'parse_level': parse_level,
+            'keywords': compile_keywords(keywords).digest if keywords else None,
+            'template': template_path(),
+        }, sort_keys=True).encode('utf-8'))
+        self.previous = self._load()
+        self.entries = {}
+        self.reused = 0
+        self._digests = {}
+        self._bodies = {}
+        self._archives = {}
+
+    def _load(self):
+        return {entry['fingerprint']: entry['location'] for entry in self._read().values()}
+
+    def _read(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f).get('sections', {})
+        except (OSError, ValueError, AttributeError):
+            return {}
+
+    def fingerprint(self, h1, h2, h3, content, level):
+        sha256 = hashlib.sha256(self.settings.encode('utf-8'))
+        sha256.update(json.dumps([level, h1, h2, h3]).encode('utf-8'))
+        self._hash_content(sha256, content)
+        return sha256.hexdigest()
+
+    def _hash_content(self, sha256, content):
+        if isinstance(content, dict):
+            for heading, nested in content.items():
+                sha256.update(b'heading:' + json.dumps(heading).encode('utf-8'))
+                self._hash_content(sha256, nested)
+            sha256.update(b'end')
+            return
+        sha256.update(self._body_digest(content).encode('utf-8'))
+
+    def _body_digest(self, blocks):
+        # A section body is part of the sections of every requested parse
+        # level above it, and is only hashed for the first of them
+        cached = self._bodies.get(id(blocks))
+        if cached is not None and cached[0] is blocks:
+            return cached[1]
+        sha256 = hashlib.sha256()
+        for block in blocks:
+            element = block._element
+            sha256.update(etree.tostring(element, method='c14n', exclusive=True))
+            digests = self._source_digests(block.part)
+            sha256.update(digests.document().encode('utf-8'))
+            for r_id in find_rel_refs(element, ns=R_NS):
+                sha256.update(f"{r_id}={digests.relationship(str(r_id))}".encode('utf-8'))
+        digest = sha256.hexdigest()
+        self._bodies[id(blocks)] = (blocks, digest)
+        return digest
+
+    def release_bodies(self):
+        # Called once the sections holding the cached bodies are written
+        self._bodies.clear()
+
+    def _source_digests(self, source):
+        digests = self._digests.get(id(source))
+        if digests is None:
+            digests = self._digests[id(source)] = SourceDigests(source)
+        return digests
+
+    def reuse(self, path, fingerprint, sink):
+        location = self.previous.get(fingerprint)
+        if location is None:
+            return False
+        try:
+            data = read_location(location, self._archives)
+        except (OSError, KeyError, zipfile.BadZipFile):
+            # The earlier batch is gone or never finished its archive
+            return False
+        sink.write(path, data)
+        self.record(path, fingerprint, sink)
+        self.reused += 1
+        return True
+
+    def record(self, path, fingerprint, sink):
+        location = sink.location(path)
+        if location is not None:
+            self.entries[path] = {'fingerprint': fingerprint, 'location': location}
+
+    def save(self):
+        for archive in self._archives.values():
+            archive.close()
+        self._archives.clear()
+        if not self.entries:
+            return
+        staging = f"{self.path}.{uuid.uuid4().hex}"
+        try:
+            with locked(f"{self.path}.lock"):
+                # Sections by fingerprint; those whose batch is gone are dropped
+                sections = {entry['fingerprint']: entry for entry in self._read().values()
+                            if location_exists(entry['location'])}
+                for path, entry in self.entries.items():
+                    sections[entry['fingerprint']] = dict(entry, path=path)
+                with open(staging, 'w') as f:
+                    json.dump({'sections': sections}, f)
+                os.replace(staging, self.path)
+        except OSError as e:
+            logger.warning(f"Could not save section manifest {self.path}: {str(e)}")
+            if os.path.exists(staging):
+                os.remove(staging)
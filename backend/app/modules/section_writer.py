@@ -0,0 +1,163 @@
+import copy
+import logging
+from lxml import etree
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from docx.oxml.ns import nsmap, qn
+
+logger = logging.getLogger(__name__)
+
+R_NS = nsmap['r']
+W_VAL = qn('w:val')
+W_DOC_DEFAULTS = qn('w:docDefaults')
+W_NUM_ID = qn('w:numId')
+W_ABSTRACT_NUM_ID = qn('w:abstractNumId')
+
+find_style_refs = etree.XPath(
+    'descendant-or-self::w:pStyle/@w:val | descendant-or-self::w:rStyle/@w:val | descendant-or-self::w:tblStyle/@w:val',
+    namespaces=nsmap)
+find_style_links = etree.XPath('w:basedOn/@w:val | w:link/@w:val | w:next/@w:val', namespaces=nsmap)
+find_num_refs = etree.XPath('descendant-or-self::w:numPr/w:numId/@w:val', namespaces=nsmap)
+find_rel_refs = etree.XPath('descendant-or-self::*/@*[namespace-uri()=$ns]')
+
+
+# Appends body elements from a source document to a target Document by deep
+# copying the raw <w:p>/<w:tbl> XML, instead of rebuilding paragraphs and runs
+# through the python-docx API. Styles, numbering definitions and related parts
+# (images, hyperlinks, charts, ...) referenced by the copied XML are brought
+# along, so one writer should be used per target document.
+class SectionWriter:
+    def __init__(self, doc):
+        self.doc = doc
+        self.body = doc.element.body
+        self._source = None
+        self._copied_styles = set()
+        self._num_ids = {}
+        self._abstract_num_ids = {}
+        self._rel_ids = {}
+        self._numbering = None
+
+    def append(self, blocks):
+        for block in blocks:
+            if self._source is None:
+                self._source = block.part
+                self._copy_doc_defaults()
+            element = copy.deepcopy(block._element)
+            self._copy_styles(find_style_refs(element))
+            self._remap_numbering(element)
+            self._remap_relationships(element)
+            sect_pr = self.body.sectPr
+            if sect_pr is not None:
+                sect_pr.addprevious(element)
+            else:
+                self.body.append(element)
+
+    def _copy_doc_defaults(self):
+        source_defaults = self._source.styles.element.find(W_DOC_DEFAULTS)
+        if source_defaults is None:
+            return
+        target_styles = self.doc.styles.element
+        existing = target_styles.find(W_DOC_DEFAULTS)
+        if existing is not None:
+            target_styles.remove(existing)
+        target_styles.insert(0, copy.deepcopy(source_defaults))
+
+    def _copy_styles(self, style_ids):
+        pending = [style_id for style_id in style_ids if style_id not in self._copied_styles]
+        if not pending:
+            # Looking up the styles parts costs more than the check, and most
+            # blocks only use styles copied for earlier ones
+            return
+        source_styles = self._source.styles.element
+        target_styles = self.doc.styles.element
+        while pending:
+            style_id = pending.pop()
+            if style_id in self._copied_styles:
+                continue
+            self._copied_styles.add(style_id)
+            source_style = source_styles.get_by_id(style_id)
+            if source_style is None:
+                continue
+            style = copy.deepcopy(source_style)
+            self._remap_numbering(style)
+            existing = target_styles.get_by_id(style_id)
+            if existing is not None:
+                existing.addprevious(style)
+                target_styles.remove(existing)
+            else:
+                target_styles.append(style)
+            pending.extend(link for link in find_style_links(style) if link not in self._copied_styles)
+
+    def _remap_numbering(self, element):
+        for num_id in find_num_refs(element):
+            if num_id == '0':
+                continue
+            if num_id not in self._num_ids:
+                self._num_ids[num_id] = self._copy_num(num_id)
+            new_num_id = self._num_ids[num_id]
+            if new_num_id is not None:
+                num_id.getparent().set(W_VAL, new_num_id)
+
+    def _copy_num(self, num_id):
+        source_numbering = self._source_numbering()
+        if source_numbering is None:
+            return None
+        source_num = source_numbering.find(f"w:num[@w:numId='{num_id}']", nsmap)
+        if source_num is None:
+            return None
+
+        numbering = self._target_numbering()
+        abstract_id = source_num.find('w:abstractNumId', nsmap).get(W_VAL)
+        new_abstract_id = self._abstract_num_ids.get(abstract_id)
+        if new_abstract_id is None:
+            source_abstract = source_numbering.find(f"w:abstractNum[@w:abstractNumId='{abstract_id}']", nsmap)
+            if source_abstract is None:
+                return None
+            new_abstract_id = self._abstract_num_ids[abstract_id] = next_id(numbering, 'w:abstractNum', W_ABSTRACT_NUM_ID)
+            abstract = copy.deepcopy(source_abstract)
+            abstract.set(W_ABSTRACT_NUM_ID, new_abstract_id)
+            # Every w:abstractNum has to come before the first w:num
+            first_num = numbering.find('w:num', nsmap)
+            if first_num is not None:
+                first_num.addprevious(abstract)
+            else:
+                numbering.append(abstract)
+
+        new_num_id = next_id(numbering, 'w:num', W_NUM_ID)
+        num = copy.deepcopy(source_num)
+        num.set(W_NUM_ID, new_num_id)
+        num.find('w:abstractNumId', nsmap).set(W_VAL, new_abstract_id)
+        numbering.append(num)
+        return new_num_id
+
+    def _source_numbering(self):
+        try:
+            return self._source.part_related_by(RT.NUMBERING).element
+        except KeyError:
+            return None
+
+    def _target_numbering(self):
+        if self._numbering is None:
+            self._numbering = self.doc.part.numbering_part.element
+        return self._numbering
+
+    def _remap_relationships(self, element):
+        for r_id in find_rel_refs(element, ns=R_NS):
+            if r_id not in self._rel_ids:
+                self._rel_ids[r_id] = self._copy_relationship(r_id)
+            new_r_id = self._rel_ids[r_id]
+            if new_r_id is not None and new_r_id != r_id:
+                r_id.getparent().set(r_id.attrname, new_r_id)
+
+    def _copy_relationship(self, r_id):
+        rel = self._source.rels.get(r_id)
+        if rel is None:
+            logger.warning(f"Dropping reference to unknown relationship {r_id}")
+            return None
+        if rel.is_external:
+            return self.doc.part.relate_to(rel.target_ref, rel.reltype, is_external=True)
+        return self.doc.part.relate_to(rel.target_part, rel.reltype)
+
+
+def next_id(numbering, tag, id_attr):
+    ids = [int(el.get(id_attr)) for el in numbering.findall(tag, nsmap) if el.get(id_attr, '').isdigit()]
+    return str(max(ids, default=0) + 1)
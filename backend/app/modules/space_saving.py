@@ -0,0 +1,90 @@
+import math
+import heapq
+
+
+# Space-Saving heavy hitters (Metwally et al.): the most frequent items of a
+# stream in memory for `capacity` items, however many distinct items pass.
+# A kept item's count overestimates its true count by at most its error, and
+# every error is at most total / capacity; any item occurring more often than
+# that is guaranteed to be kept. for_error(epsilon) sizes the sketch for an
+# error of at most epsilon * total.
+class SpaceSaving:
+    def __init__(self, capacity):
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.capacity = capacity
+        self.total = 0
+        self.counts = {}
+        self.errors = {}
+        # (count, item) per kept item; entries of items counted since they
+        # were pushed lag behind and are fixed up when they reach the top
+        self._heap = []
+
+    @classmethod
+    def for_error(cls, epsilon):
+        return cls(math.ceil(1 / epsilon))
+
+    def __len__(self):
+        return len(self.counts)
+
+    def add(self, item, count=1):
+        self.total += count
+        if item in self.counts:
+            self.counts[item] += count
+            return
+        if len(self.counts) < self.capacity:
+            self.counts[item] = count
+            self.errors[item] = 0
+            heapq.heappush(self._heap, (count, item))
+            return
+        # The new item takes over the least counted one, whose count it may have had
+        floor, evicted = self._pop_minimum()
+        del self.counts[evicted]
+        del self.errors[evicted]
+        self.counts[item] = floor + count
+        self.errors[item] = floor
+        heapq.heappush(self._heap, (floor + count, item))
+
+    def update(self, counts):
+        for item, count in counts.items():
+            self.add(item, count)
+
+    def _pop_minimum(self):
+        while True:
+            count, item = heapq.heappop(self._heap)
+            current = self.counts[item]
+            if current == count:
+                return count, item
+            heapq.heappush(self._heap, (current, item))
+
+    def minimum(self):
+        # The most an item not kept can have occurred
+        if len(self.counts) < self.capacity:
+            return 0
+        return min(self.counts.values())
+
+    def merge(self, other):
+        # Folds in the sketch of another stream (mergeable summaries, Agarwal
+        # et al.): an item kept by only one sketch may have occurred up to the
+        # other's minimum times there, which both its count and error absorb
+        floor, other_floor = self.minimum(), other.minimum()
+        counts = {}
+        errors = {}
+        for item in self.counts.keys() | other.counts.keys():
+            counts[item] = self.counts.get(item, floor) + other.counts.get(item, other_floor)
+            errors[item] = self.errors.get(item, floor) + other.errors.get(item, other_floor)
+        kept = heapq.nlargest(self.capacity, counts.items(), key=lambda entry: entry[1])
+        self.counts = dict(kept)
+        self.errors = {item: errors[item] for item in self.counts}
+        self._heap = [(count, item) for item, count in kept]
+        heapq.heapify(self._heap)
+        self.total += other.total
+        return self
+
+    def top(self, k=None):
+        # (item, count, error), most counted first and ties in item order
+        entries = ((item, count, self.errors[item]) for item, count in self.counts.items())
+        key = lambda entry: (-entry[1], entry[0])
+        if k is None:
+            return sorted(entries, key=key)
+        return heapq.nsmallest(k, entries, key=key)
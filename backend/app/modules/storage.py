@@ -0,0 +1,260 @@
+import os
+import time
+import shutil
+import logging
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+def folder_size(folder):
+    total = 0
+    try:
+        entries = list(os.scandir(folder))
+    except OSError:
+        return 0
+    for entry in entries:
+        try:
+            if entry.is_dir(follow_symlinks=False):
+                total += folder_size(entry.path)
+            else:
+                total += entry.stat(follow_symlinks=False).st_size
+        except OSError:
+            continue
+    return total
+
+
+def last_used(folder):
+    # Newest mtime of the folder and what is directly in it: new files bump
+    # the folder, growing ones (a spool file, an archive being written) their own
+    try:
+        newest = os.path.getmtime(folder)
+        for entry in os.scandir(folder):
+            try:
+                newest = max(newest, entry.stat(follow_symlinks=False).st_mtime)
+            except OSError:
+                continue
+        return newest
+    except OSError:
+        return None
+
+
+# Retention for batch workspaces: RESULTS_FOLDER/<batch_id> and
+# UPLOAD_FOLDER/<batch_id> are one unit that is kept, aged and removed
+# together. Batches expire after BATCH_TTL_SECONDS unused; beyond that the
+# least recently used go first while the batches take more than
+# STORAGE_QUOTA_BYTES or the disk has less than STORAGE_MIN_FREE_BYTES free.
+# Batches held by a request, with a queued or running job, or used within
+# STORAGE_GRACE_SECONDS are never removed. Every process may sweep; removing
+# a batch twice is harmless.
+class StorageManager:
+    def __init__(self):
+        self.folders = ()
+        self.manifest_folder = None
+        self.ttl = 0
+        self.quota = 0
+        self.min_free = 0
+        self.grace = 0
+        self.interval = 0
+        self.retry_after = 0
+        self._job_store = None
+        self._term_index = None
+        self._holds = Counter()
+        self._lock = threading.Lock()
+        self._sweep_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._stats = Counter()
+
+    def init_app(self, app, job_store=None, term_index=None):
+        self.folders = (app.config['RESULTS_FOLDER'], app.config['UPLOAD_FOLDER'])
+        self.manifest_folder = app.config['SECTION_MANIFEST_FOLDER'] or None
+        self.ttl = app.config['BATCH_TTL_SECONDS']
+        self.quota = app.config['STORAGE_QUOTA_BYTES']
+        self.min_free = app.config['STORAGE_MIN_FREE_BYTES']
+        self.grace = app.config['STORAGE_GRACE_SECONDS']
+        self.interval = app.config['STORAGE_SWEEP_INTERVAL']
+        self.retry_after = app.config['STORAGE_RETRY_AFTER']
+        self._job_store = job_store
+        self._term_index = term_index
+        if self.interval > 0 and self._thread is None:
+            self._thread = threading.Thread(target=self._sweep_forever, name='storage-sweeper', daemon=True)
+            self._thread.start()
+        logger.info(f"Storage: ttl {self.ttl}s, quota {self.quota} bytes, min free {self.min_free} bytes, "
+                    f"sweep every {self.interval}s")
+
+    @contextmanager
+    def hold(self, batch_id):
+        # Keeps the batch from being swept while a request works on it
+        with self._lock:
+            self._holds[batch_id] += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._holds[batch_id] -= 1
+                if not self._holds[batch_id]:
+                    del self._holds[batch_id]
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def touch(self, batch_id):
+        # A download counts as use for the LRU order
+        try:
+            os.utime(os.path.join(self.folders[0], batch_id))
+        except OSError:
+            pass
+
+    def in_use(self, batch_id, active_jobs=None):
+        with self._lock:
+            if batch_id in self._holds:
+                return True
+        if active_jobs is None:
+            active_jobs = self._active_jobs()
+        return batch_id in active_jobs
+
+    def protected(self, batch_id, used, now=None, active_jobs=None):
+        # Whether a batch last used at `used` is off limits to removal: in use,
+        # or used within the grace period
+        now = time.time() if now is None else now
+        return used >= now - self.grace or self.in_use(batch_id, active_jobs)
+
+    def _active_jobs(self):
+        if self._job_store is None:
+            return set()
+        return self._job_store.active_jobs()
+
+    def free_bytes(self):
+        free = []
+        for folder in self.folders:
+            try:
+                free.append(shutil.disk_usage(folder).free)
+            except OSError:
+                continue
+        return min(free) if free else None
+
+    def admit(self, required_bytes=0):
+        # Returns None when a batch needing required_bytes may start, or the
+        # seconds the client should wait before retrying. Rejecting up front
+        # beats running out of space halfway through writing sections.
+        free = self.free_bytes()
+        if free is None or free - required_bytes >= self.min_free:
+            return None
+        self._count('rejected')
+        logger.warning(f"Rejecting upload of {required_bytes} bytes: {free} bytes free, "
+                       f"{self.min_free} required")
+        if self._thread is not None:
+            self._wake.set()
+        else:
+            self.sweep()
+        return self.retry_after
+
+    def batches(self):
+        batches = {}
+        for folder in self.folders:
+            try:
+                entries = list(os.scandir(folder))
+            except OSError:
+                continue
+            for entry in entries:
+                # Skips the job database and anything else that is not a batch
+                if not entry.is_dir(follow_symlinks=False) or entry.name.startswith('.'):
+                    continue
+                used = last_used(entry.path)
+                if used is None:
+                    continue
+                batch = batches.setdefault(entry.name, {'folders': [], 'last_used': used, 'bytes': 0})
+                batch['folders'].append(entry.path)
+                batch['last_used'] = max(batch['last_used'], used)
+                batch['bytes'] += folder_size(entry.path)
+        return batches
+
+    def sweep(self):
+        with self._sweep_lock:
+            now = time.time()
+            active_jobs = self._active_jobs()
+            batches = self.batches()
+            candidates = sorted(
+                (batch['last_used'], batch_id) for batch_id, batch in batches.items()
+                if not self.protected(batch_id, batch['last_used'], now, active_jobs)
+            )
+            total = sum(batch['bytes'] for batch in batches.values())
+            removed = Counter()
+
+            for used, batch_id in candidates:
+                if self.ttl and used < now - self.ttl:
+                    reason = 'expired'
+                elif self.quota and total > self.quota:
+                    reason = 'quota'
+                elif self.min_free and (self.free_bytes() or 0) < self.min_free:
+                    reason = 'space'
+                else:
+                    # Oldest first, so nothing later qualifies either
+                    break
+                self._remove(batch_id, batches[batch_id])
+                total -= batches[batch_id]['bytes']
+                removed[reason] += 1
+
+            self._expire_manifests(now)
+            self._count('sweeps')
+            for reason, count in removed.items():
+                self._count(f'removed_{reason}', count)
+            if removed:
+                logger.info(f"Storage sweep removed {sum(removed.values())} batches ({dict(removed)}), "
+                            f"{total} bytes in {len(batches) - sum(removed.values())} batches remain")
+            return dict(removed)
+
+    def _remove(self, batch_id, batch):
+        for folder in batch['folders']:
+            shutil.rmtree(folder, ignore_errors=True)
+        if self._job_store is not None:
+            self._job_store.delete(batch_id)
+        if self._term_index is not None and self._term_index.enabled:
+            self._term_index.forget(batch_id, self.grace)
+        self._count('bytes_freed', batch['bytes'])
+        logger.info(f"Removed batch {batch_id} ({batch['bytes']} bytes)")
+
+    def _expire_manifests(self, now):
+        # Manifests only point into batches, so they age out with them
+        if not self.ttl or not self.manifest_folder:
+            return
+        try:
+            entries = list(os.scandir(self.manifest_folder))
+        except OSError:
+            return
+        for entry in entries:
+            try:
+                if entry.is_file() and entry.stat().st_mtime < now - self.ttl:
+                    os.remove(entry.path)
+            except OSError:
+                continue
+
+    def _sweep_forever(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.sweep()
+            except Exception:
+                logger.exception("Storage sweep failed")
+
+    def stats(self):
+        batches = self.batches()
+        with self._lock:
+            stats = dict(self._stats)
+        stats.update({
+            'batches': len(batches),
+            'bytes': sum(batch['bytes'] for batch in batches.values()),
+            'free_bytes': self.free_bytes(),
+            'quota_bytes': self.quota,
+            'min_free_bytes': self.min_free,
+            'ttl_seconds': self.ttl,
+        })
+        return stats
+
+
+storage = StorageManager()
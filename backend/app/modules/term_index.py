@@ -0,0 +1,182 @@
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+from contextlib import closing
+
+logger = logging.getLogger(__name__)
+
+# Bump when tokenize() changes, so documents are counted again
+INDEX_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    digest TEXT NOT NULL UNIQUE,
+    version INTEGER NOT NULL,
+    words INTEGER NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS terms (
+    id INTEGER PRIMARY KEY,
+    term TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS document_terms (
+    document_id INTEGER NOT NULL,
+    term_id INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (document_id, term_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS batch_documents (
+    batch_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    document_id INTEGER NOT NULL,
+    PRIMARY KEY (batch_id, name)
+);
+CREATE INDEX IF NOT EXISTS batch_documents_document ON batch_documents (document_id);
+"""
+
+
+def file_digest(path, chunk_size=1024 * 1024):
+    # Same as the upload digests: sha256 of the file's bytes
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+# Word counts per document in a SQLite file, keyed by the document's sha256,
+# and which documents each batch summarised. A document is counted once,
+# however many batches upload it; ranges, top words and per-document counts
+# of a batch are then answered from the index without opening a .docx.
+# Every call opens its own connection, as the job store does, so process
+# workers can receive the index and write to it.
+class TermIndex:
+    def __init__(self):
+        self.path = None
+
+    def init_app(self, app):
+        self.path = None
+        if not app.config['TERM_INDEX']:
+            return
+        path = app.config['TERM_INDEX_DB'] or os.path.join(app.config['RESULTS_FOLDER'], 'terms.sqlite3')
+        with closing(sqlite3.connect(path, timeout=30)) as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(SCHEMA)
+        self.path = path
+        logger.info(f"Term index: {path}")
+
+    @property
+    def enabled(self):
+        return self.path is not None
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _document_id(self, conn, digest):
+        row = conn.execute('SELECT id FROM documents WHERE digest = ? AND version = ?',
+                           (digest, INDEX_VERSION)).fetchone()
+        return row[0] if row else None
+
+    def counts(self, digest):
+        # The stored word counts of a document, or None if it is not indexed
+        with closing(self._connect()) as conn:
+            document_id = self._document_id(conn, digest)
+            if document_id is None:
+                return None
+            rows = conn.execute('SELECT t.term, dt.count FROM document_terms dt JOIN terms t ON t.id = dt.term_id '
+                                'WHERE dt.document_id = ?', (document_id,)).fetchall()
+        return dict(rows)
+
+    def add(self, digest, word_count):
+        with closing(self._connect()) as conn:
+            with conn:
+                # Taking the write lock first keeps two workers from indexing
+                # the same document at once
+                conn.execute('BEGIN IMMEDIATE')
+                if self._document_id(conn, digest) is not None:
+                    return
+                # An entry from an older tokenizer is replaced
+                conn.execute('DELETE FROM document_terms WHERE document_id IN '
+                             '(SELECT id FROM documents WHERE digest = ?)', (digest,))
+                conn.execute('DELETE FROM documents WHERE digest = ?', (digest,))
+                document_id = conn.execute(
+                    'INSERT INTO documents (digest, version, words, created_at) VALUES (?, ?, ?, ?)',
+                    (digest, INDEX_VERSION, sum(word_count.values()), time.time())
+                ).lastrowid
+                conn.executemany('INSERT OR IGNORE INTO terms (term) VALUES (?)', ((term,) for term in word_count))
+                conn.executemany(
+                    'INSERT INTO document_terms (document_id, term_id, count) SELECT ?, id, ? FROM terms WHERE term = ?',
+                    ((document_id, count, term) for term, count in word_count.items())
+                )
+
+    def link(self, batch_id, documents):
+        # documents: (name, digest) of every document the batch summarised
+        with closing(self._connect()) as conn:
+            with conn:
+                for name, digest in documents:
+                    document_id = self._document_id(conn, digest)
+                    if document_id is not None:
+                        conn.execute('INSERT OR REPLACE INTO batch_documents (batch_id, name, document_id) '
+                                     'VALUES (?, ?, ?)', (batch_id, name, document_id))
+
+    def link_files(self, batch_id, doc_paths, digests=None):
+        # For batches answered from the result cache: their documents were
+        # indexed when the cached batch ran. digests holds the sha256 of the
+        # paths hashed on upload; others are hashed here.
+        digests = digests or {}
+        self.link(batch_id, [(os.path.basename(path), digests.get(path) or file_digest(path)) for path in doc_paths])
+
+    def documents(self, batch_id):
+        with closing(self._connect()) as conn:
+            rows = conn.execute('SELECT b.name, d.digest, d.words FROM batch_documents b '
+                                'JOIN documents d ON d.id = b.document_id WHERE b.batch_id = ? ORDER BY b.name',
+                                (batch_id,)).fetchall()
+        return [{'name': name, 'digest': digest, 'words': words} for name, digest, words in rows]
+
+    def band(self, batch_id, min_count=None, max_count=None, limit=-1, offset=0):
+        # (term, count) over the batch's documents with min_count <= count <=
+        # max_count, most frequent first and ties in alphabetical order, like
+        # the word count summary
+        sql = ('SELECT t.term, SUM(dt.count) AS total FROM batch_documents b '
+               'JOIN document_terms dt ON dt.document_id = b.document_id JOIN terms t ON t.id = dt.term_id '
+               'WHERE b.batch_id = ? GROUP BY dt.term_id HAVING total BETWEEN ? AND ? '
+               'ORDER BY total DESC, t.term LIMIT ? OFFSET ?')
+        params = (batch_id, min_count if min_count is not None else 0,
+                  max_count if max_count is not None else 2 ** 63 - 1, limit, offset)
+        with closing(self._connect()) as conn:
+            return conn.execute(sql, params).fetchall()
+
+    def count_range(self, batch_id):
+        # Lowest and highest count of any word in the batch
+        with closing(self._connect()) as conn:
+            row = conn.execute('SELECT MIN(total), MAX(total) FROM (SELECT SUM(dt.count) AS total '
+                               'FROM batch_documents b JOIN document_terms dt ON dt.document_id = b.document_id '
+                               'WHERE b.batch_id = ? GROUP BY dt.term_id)', (batch_id,)).fetchone()
+        return row[0] or 0, row[1] or 0
+
+    def term_documents(self, batch_id, term):
+        # Count of term in each of the batch's documents, including zeros
+        with closing(self._connect()) as conn:
+            rows = conn.execute('SELECT b.name, COALESCE(dt.count, 0) FROM batch_documents b '
+                                'LEFT JOIN terms t ON t.term = ? '
+                                'LEFT JOIN document_terms dt ON dt.document_id = b.document_id AND dt.term_id = t.id '
+                                'WHERE b.batch_id = ? ORDER BY b.name', (term, batch_id)).fetchall()
+        return [{'name': name, 'count': count} for name, count in rows]
+
+    def forget(self, batch_id, grace=0):
+        # Drops the batch and the documents no other batch refers to. Documents
+        # indexed within grace seconds may belong to a batch still counting.
+        with closing(self._connect()) as conn:
+            with conn:
+                conn.execute('DELETE FROM batch_documents WHERE batch_id = ?', (batch_id,))
+                orphans = ('SELECT id FROM documents WHERE created_at < ? '
+                           'AND id NOT IN (SELECT document_id FROM batch_documents)')
+                cutoff = (time.time() - grace,)
+                conn.execute(f'DELETE FROM document_terms WHERE document_id IN ({orphans})', cutoff)
+                conn.execute(f'DELETE FROM documents WHERE id IN ({orphans})', cutoff)
+
+
+term_index = TermIndex()
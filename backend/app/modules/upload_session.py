@@ -0,0 +1,203 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import logging
+import threading
+from werkzeug.utils import secure_filename
+
+logger = logging.getLogger(__name__)
+
+SESSION_FILE = 'upload.json'
+SPOOL_SUFFIX = '.part'
+
+
+class UploadError(Exception):
+    def __init__(self, message, status=400, offset=None):
+        super().__init__(message)
+        self.status = status
+        self.offset = offset
+
+
+# Running sha256 per spool file, so bytes are hashed once as they arrive. The
+# state lives in this process only; a chunk landing in another process (or
+# after a restart) rehashes what is already on disk and carries on from there.
+_hashers = {}
+_hashers_lock = threading.Lock()
+_file_locks = {}
+
+
+def _file_lock(spool_path):
+    with _hashers_lock:
+        return _file_locks.setdefault(spool_path, threading.Lock())
+
+
+def _hasher_at(spool_path, offset, chunk_size=1024 * 1024):
+    with _hashers_lock:
+        state = _hashers.pop(spool_path, None)
+    if state is not None and state[0] == offset:
+        return state[1]
+    sha256 = hashlib.sha256()
+    with open(spool_path, 'rb') as f:
+        remaining = offset
+        while remaining:
+            chunk = f.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            sha256.update(chunk)
+            remaining -= len(chunk)
+    return sha256
+
+
+def _forget(spool_path):
+    with _hashers_lock:
+        _hashers.pop(spool_path, None)
+        _file_locks.pop(spool_path, None)
+
+
+# A chunked upload: the files declared at init are spooled under
+# UPLOAD_FOLDER/<upload_id>/ one chunk per request, each chunk appended at
+# the offset the client says it starts at. The bytes on disk are the only
+# progress record, so a client that lost its connection asks for the offsets
+# and resumes from there.
+class UploadSession:
+    def __init__(self, folder, files, created_at, completed=False):
+        self.folder = folder
+        self.upload_id = os.path.basename(folder)
+        self.files = files
+        self.created_at = created_at
+        self.completed = completed
+
+    @classmethod
+    def create(cls, upload_folder, upload_id, files, max_bytes):
+        declared = {}
+        for file in files:
+            name = secure_filename(str(file.get('name', '')))
+            size = file.get('size')
+            if not name:
+                raise UploadError('Every file needs a name')
+            if name in declared:
+                raise UploadError(f"Duplicate file name: {name}")
+            if not isinstance(size, int) or size < 0:
+                raise UploadError(f"Invalid size for {name}")
+            declared[name] = {'size': size, 'sha256': file.get('sha256')}
+        if not declared:
+            raise UploadError('No files declared')
+        total = sum(file['size'] for file in declared.values())
+        if total > max_bytes:
+            raise UploadError(f"Upload of {total} bytes exceeds the limit of {max_bytes} bytes", status=413)
+
+        folder = os.path.join(upload_folder, upload_id)
+        os.makedirs(folder)
+        for name in declared:
+            open(os.path.join(folder, name + SPOOL_SUFFIX), 'wb').close()
+        session = cls(folder, declared, time.time())
+        session._save()
+        logger.info(f"Started chunked upload {upload_id}: {len(declared)} files, {total} bytes")
+        return session
+
+    @classmethod
+    def load(cls, upload_folder, upload_id):
+        folder = os.path.join(upload_folder, secure_filename(upload_id))
+        try:
+            with open(os.path.join(folder, SESSION_FILE)) as f:
+                session = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return cls(folder, session['files'], session['created_at'], session.get('completed', False))
+
+    def _spool_path(self, name):
+        if name not in self.files:
+            raise UploadError(f"Unknown file: {name}", status=404)
+        return os.path.join(self.folder, name + SPOOL_SUFFIX)
+
+    def received(self, name):
+        try:
+            return os.path.getsize(self._spool_path(name))
+        except FileNotFoundError:
+            # Already moved into place by complete()
+            return self.files[name]['size']
+
+    def status(self):
+        files = [{'name': name, 'size': file['size'], 'offset': self.received(name)}
+                 for name, file in self.files.items()]
+        return {
+            'uploadId': self.upload_id,
+            'files': files,
+            'received': all(file['offset'] == file['size'] for file in files),
+            'completed': self.completed,
+        }
+
+    def append(self, name, offset, stream, chunk_size=1024 * 1024):
+        # Writes the request body at offset and returns the new offset. A
+        # chunk that does not start where the spool file ends is refused with
+        # the current offset, so retries of a chunk that did land are harmless.
+        spool_path = self._spool_path(name)
+        size = self.files[name]['size']
+        with _file_lock(spool_path):
+            received = self.received(name)
+            if offset != received:
+                raise UploadError(f"Expected offset {received} for {name}", status=409, offset=received)
+            sha256 = _hasher_at(spool_path, received)
+            with open(spool_path, 'ab') as f:
+                try:
+                    while True:
+                        chunk = stream.read(chunk_size)
+                        if not chunk:
+                            break
+                        if received + len(chunk) > size:
+                            raise UploadError(f"Chunk runs past the declared size of {name}", status=413,
+                                              offset=received)
+                        f.write(chunk)
+                        sha256.update(chunk)
+                        received += len(chunk)
+                finally:
+                    # Whatever made it to disk counts; a dropped connection
+                    # resumes right after it
+                    f.flush()
+                    with _hashers_lock:
+                        _hashers[spool_path] = (received, sha256)
+        return received
+
+    def complete(self):
+        # Moves every fully received file into place and returns
+        # (path, sha256 hex digest) per file. An upload completes only once.
+        if self.completed:
+            raise UploadError('Upload already completed', status=409)
+        uploads = []
+        for name, file in self.files.items():
+            spool_path = self._spool_path(name)
+            path = os.path.join(self.folder, name)
+            with _file_lock(spool_path):
+                if os.path.exists(spool_path):
+                    received = self.received(name)
+                    if received != file['size']:
+                        raise UploadError(f"{name} has {received} of {file['size']} bytes", status=409,
+                                          offset=received)
+                    digest = _hasher_at(spool_path, received).hexdigest()
+                    if file.get('sha256') and file['sha256'].lower() != digest:
+                        # Start the file over; its bytes are not what the client sent
+                        open(spool_path, 'wb').close()
+                        _forget(spool_path)
+                        raise UploadError(f"Checksum mismatch for {name}", status=422, offset=0)
+                    os.replace(spool_path, path)
+                    _forget(spool_path)
+                    file['sha256'] = digest
+                    self._save()
+            uploads.append((path, file['sha256']))
+        self.completed = True
+        self._save()
+        return uploads
+
+    def _save(self):
+        staging = os.path.join(self.folder, SESSION_FILE + SPOOL_SUFFIX)
+        with open(staging, 'w') as f:
+            json.dump({'created_at': self.created_at, 'completed': self.completed, 'files': self.files}, f)
+        os.replace(staging, os.path.join(self.folder, SESSION_FILE))
+
+    def abort(self):
+        for name in self.files:
+            _forget(os.path.join(self.folder, name + SPOOL_SUFFIX))
+        shutil.rmtree(self.folder, ignore_errors=True)
+        logger.info(f"Aborted chunked upload {self.upload_id}")
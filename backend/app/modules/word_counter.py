@@ -1,52 +1,233 @@
+import re
+import time
+import uuid
+import heapq
 import logging
 from collections import Counter
 from docx import Document
-from openpyxl import Workbook
+from openpyxl import Workbook, load_workbook
 import os
+from .executor import map_files
+from .term_index import file_digest
+from .space_saving import SpaceSaving
+from . import metrics
 
 logger = logging.getLogger(__name__)
 
-def create_word_count_summary(doc_paths, output_folder, min_count=20, max_count=100):
+# Runs of letters and digits in any script, joined by inner apostrophes and
+# hyphens ("don't", "e-mail"); punctuation around a word is not part of it
+WORD_PATTERN = re.compile(r"[^\W_]+(?:['’\-][^\W_]+)*")
+
+# Rows an Excel sheet holds below the header
+MAX_ROWS = 1048575
+
+# Phrase sketches keep 1 / error phrases per length and document
+MIN_PHRASE_ERROR = 0.00001
+
+PHRASE_SHEET = "Phrase Frequencies"
+
+SUMMARY_PREFIX = "word_count_summary_"
+
+
+def tokenize(text):
+    return WORD_PATTERN.findall(text.lower())
+
+
+def count_words(doc_path, cache=None, index=None, phrases=None, digests=None):
+    # Map step, run in the executor's workers: (digest, word counts, phrase
+    # sketches) of one document. The digest is only needed with an index,
+    # which supplies the word counts of documents counted before, and is
+    # taken from digests when the upload was hashed already; the sketches
+    # are only counted with phrases.
+    digest = None
+    if index is not None:
+        digest = (digests or {}).get(doc_path) or file_digest(doc_path)
+    word_count = None
+    if digest is not None:
+        stored = index.counts(digest)
+        if stored is not None:
+            word_count = Counter(stored)
+    sketches = None
+    if word_count is None or phrases:
+        texts = paragraph_texts(doc_path, cache)
+        counted, sketches = count_texts(texts, word_count is None, phrases)
+        if word_count is None:
+            word_count = counted
+            if index is not None:
+                index.add(digest, word_count)
+    return digest, word_count, sketches
+
+
+def paragraph_texts(doc_path, cache=None):
+    if cache is not None:
+        return cache.get(doc_path).paragraph_texts
+    with metrics.timed('document_load'):
+        doc = Document(doc_path)
+    return [para.text for para in doc.paragraphs]
+
+
+def count_texts(texts, words=True, phrases=None):
+    # (word counts, phrase sketches) of a document's paragraphs, each None
+    # when not asked for. Every paragraph is tokenized once for both; one
+    # SpaceSaving sketch per phrase length, phrases do not span paragraphs.
+    word_count = Counter() if words else None
+    sketches = {length: SpaceSaving.for_error(phrases['error']) for length in phrases['lengths']} if phrases else None
+    phrase_seconds = 0.0
+    start = time.perf_counter()
+    for text in texts:
+        tokens = tokenize(text)
+        if word_count is not None:
+            word_count.update(tokens)
+        if sketches:
+            phrase_start = time.perf_counter()
+            for length, sketch in sketches.items():
+                if len(tokens) >= length:
+                    sketch.update(Counter(' '.join(tokens[i:i + length]) for i in range(len(tokens) - length + 1)))
+            phrase_seconds += time.perf_counter() - phrase_start
+    # Tokenizing counts towards the word count, or the phrases without one
+    metrics.record('word_count' if word_count is not None else 'phrase_count',
+                   time.perf_counter() - start - phrase_seconds)
+    if sketches is not None:
+        metrics.record('phrase_count', phrase_seconds)
+    return word_count, sketches
+
+
+def select_band(word_count, min_count, max_count, limit=MAX_ROWS):
+    # The most frequent words with min_count <= count <= max_count, ties in
+    # alphabetical order. Only a band of more than limit words goes through a
+    # heap of limit entries; nsmallest would sort a smaller one anyway.
+    band = [(word, count) for word, count in word_count.items() if min_count <= count <= max_count]
+    if len(band) <= limit:
+        return sorted(band, key=band_order)
+    return heapq.nsmallest(limit, band, key=band_order)
+
+
+def band_order(item):
+    word, count = item
+    return -count, word
+
+
+def create_word_count_summary(doc_paths, output_folder, min_count=20, max_count=100, cache=None, backend='thread',
+                              max_workers=None, index=None, batch_id=None, phrases=None, digests=None):
+    # With an index, the documents' counts are kept there under batch_id,
+    # keyed by their sha256 from digests ({doc path: sha256}) where known.
+    # phrases ({'lengths', 'error', 'top'}) adds a sheet of the most frequent
+    # phrases of each length, counted in bounded memory: a count is at most
+    # error * (phrases of that length in the batch) too high.
     try:
         word_count = Counter()
+        shared = {'index': index, 'phrases': phrases, 'digests': digests}
+        if backend != 'process':
+            shared['cache'] = cache
+        indexed = []
+        phrase_sketches = {}
 
-        for doc_path in doc_paths:
+        # Reduce step: counters and sketches are merged as documents complete
+        for doc_path, future in map_files(count_words, doc_paths, shared, backend, max_workers):
             try:
-                doc = Document(doc_path)
-                for para in doc.paragraphs:
-                    words = para.text.lower().split()
-                    word_count.update(words)
+                digest, document_words, sketches = future.result()
+                if digest is not None:
+                    indexed.append((os.path.basename(doc_path), digest))
+                word_count.update(document_words)
+                for length, sketch in (sketches or {}).items():
+                    if length in phrase_sketches:
+                        phrase_sketches[length].merge(sketch)
+                    else:
+                        phrase_sketches[length] = sketch
             except Exception as e:
                 logger.error(f"Error processing document {doc_path}: {str(e)}")
 
-        filtered_words = {word: count for word, count in word_count.items() if min_count <= count <= max_count}
+        if index is not None and batch_id is not None:
+            try:
+                index.link(batch_id, indexed)
+            except Exception as e:
+                logger.error(f"Error indexing word counts of batch {batch_id}: {str(e)}")
+
+        phrase_rows = None
+        if phrases:
+            phrase_rows = [(phrase, length, count, count - error)
+                           for length in phrases['lengths'] if length in phrase_sketches
+                           for phrase, count, error in phrase_sketches[length].top(phrases['top'])]
 
-        summary_filename = f"word_count_summary_{min_count}_to_{max_count}.xlsx"
+        count_range = (min(word_count.values()), max(word_count.values())) if word_count else (0, 0)
+        return write_word_count_summary(output_folder, min_count, max_count,
+                                        select_band(word_count, min_count, max_count), count_range, phrase_rows)
+    except Exception as e:
+        error_message = f"Error creating word count summary: {str(e)}"
+        logger.exception(error_message)
+        return None, error_message
+
+
+def write_word_count_summary(output_folder, min_count, max_count, filtered_words, count_range, phrase_rows=None):
+    # filtered_words: (word, count) rows in output order; count_range: the
+    # lowest and highest count in the documents, reported when none is in the
+    # band; phrase_rows: (phrase, words, count, guaranteed count) rows for a
+    # second sheet
+    try:
+        summary_filename = f"{SUMMARY_PREFIX}{min_count}_to_{max_count}.xlsx"
         summary_path = os.path.join(output_folder, summary_filename)
 
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Word Count Summary"
+        xlsx_start = time.perf_counter()
+        # Write-only mode streams rows to the file instead of keeping cells in memory
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet("Word Count Summary")
         ws.append(["Word", "Count"])
 
         if filtered_words:
-            for word, count in sorted(filtered_words.items(), key=lambda x: x[1], reverse=True):
+            for word, count in filtered_words:
                 ws.append([word, count])
             message = f"Word count summary created with {len(filtered_words)} words"
+            if len(filtered_words) == MAX_ROWS:
+                message += f" (limited to the {MAX_ROWS} most frequent)"
             logger.info(message)
         else:
-            min_count_found = min(word_count.values()) if word_count else 0
-            max_count_found = max(word_count.values()) if word_count else 0
+            min_count_found, max_count_found = count_range
             ws.append(["No words found in the specified range"])
             ws.append([f"Word count range in documents: {min_count_found} - {max_count_found}"])
             message = f"No words found with count between {min_count} and {max_count}. Word count range in documents: {min_count_found} - {max_count_found}"
             logger.warning(message)
 
-        wb.save(summary_path)
+        if phrase_rows is not None:
+            phrase_ws = wb.create_sheet(PHRASE_SHEET)
+            phrase_ws.append(["Phrase", "Words", "Count", "Guaranteed Count"])
+            for row in phrase_rows:
+                phrase_ws.append(list(row))
+            message += f". {len(phrase_rows)} phrases in the phrase sheet"
+
+        # Written aside and moved into place: the summary may be a hard link
+        # to a result cache entry, which must not change under it
+        staging = f"{summary_path}.{uuid.uuid4().hex}.tmp"
+        try:
+            wb.save(staging)
+            os.replace(staging, summary_path)
+        finally:
+            if os.path.exists(staging):
+                os.remove(staging)
+        metrics.record('xlsx_write', time.perf_counter() - xlsx_start)
         logger.info(f"Summary file saved: {summary_path}")
 
         return summary_path, message
     except Exception as e:
         error_message = f"Error creating word count summary: {str(e)}"
         logger.exception(error_message)
-        return None, error_message
\ No newline at end of file
+        return None, error_message
+
+
+def read_phrase_rows(output_folder):
+    # The phrase sheet of a summary already in output_folder, as rows for
+    # write_word_count_summary, or None. Phrases do not depend on the count
+    # band, so any summary of the batch has the same ones.
+    for name in sorted(os.listdir(output_folder)):
+        if not (name.startswith(SUMMARY_PREFIX) and name.endswith('.xlsx')):
+            continue
+        try:
+            wb = load_workbook(os.path.join(output_folder, name), read_only=True)
+        except Exception as e:
+            logger.warning(f"Could not read summary {name}: {str(e)}")
+            continue
+        try:
+            if PHRASE_SHEET in wb.sheetnames:
+                return [row for row in wb[PHRASE_SHEET].iter_rows(min_row=2, values_only=True)]
+        finally:
+            wb.close()
+    return None
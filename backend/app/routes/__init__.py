@@ -1,5 +1,6 @@
 from .main_routes import main
 from .upload_routes import upload
 from .download_routes import download
+from .job_routes import job
 
-__all__ = ['main', 'upload', 'download']
\ No newline at end of file
+__all__ = ['main', 'upload', 'download', 'job']
\ No newline at end of file
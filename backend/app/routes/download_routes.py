@@ -1,21 +1,23 @@
 from flask import Blueprint, send_file, current_app, abort
 import os
-from werkzeug.utils import secure_filename
+from werkzeug.security import safe_join
+from ..modules.storage import storage
 
 download = Blueprint('download', __name__)
 
-@download.route('/api/download/<batch_id>/<filename>', methods=['GET'])
+@download.route('/api/download/<batch_id>/<path:filename>', methods=['GET'])
 def download_file(batch_id, filename):
-    # Secure the filename to prevent directory traversal attacks
-    filename = secure_filename(filename)
-
-    # Construct the full path to the file
-    file_path = os.path.join(current_app.config['RESULTS_FOLDER'], batch_id, filename)
+    # Per-document outputs live in subfolders of the batch, so the filename
+    # may be a relative path; safe_join rejects anything leaving the batch
+    file_path = safe_join(current_app.config['RESULTS_FOLDER'], batch_id, filename)
+    if file_path is None:
+        abort(404)
 
     # Check if the file exists
     if os.path.exists(file_path) and os.path.isfile(file_path):
+        storage.touch(batch_id)
         try:
-            return send_file(file_path, as_attachment=True, download_name=filename)
+            return send_file(file_path, as_attachment=True, download_name=os.path.basename(file_path))
         except Exception as e:
             current_app.logger.error(f"Error sending file: {e}")
             abort(500)
@@ -0,0 +1,73 @@
+from flask import Blueprint, Response, jsonify, request, current_app
+import json
+import time
+import logging
+from ..modules.jobs import jobs
+from ..modules.job_store import FINISHED_STATES
+
+logger = logging.getLogger(__name__)
+
+job = Blueprint('job', __name__)
+
+@job.route('/api/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    status = jobs.get(job_id)
+    if status is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(status), 200
+
+@job.route('/api/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    # Streams the job's events as they are recorded: Server-Sent Events by
+    # default, newline-delimited JSON with ?format=ndjson. Every stream ends
+    # after JOB_EVENTS_MAX_SECONDS so a sync worker is never held past its
+    # timeout; EventSource reconnects with Last-Event-ID, NDJSON clients pass
+    # the last seq they saw as ?after=.
+    if jobs.store.state(job_id) is None:
+        return jsonify({'error': 'Job not found'}), 404
+
+    ndjson = request.args.get('format') == 'ndjson'
+    try:
+        after = int(request.headers.get('Last-Event-ID') or request.args.get('after', 0))
+    except ValueError:
+        return jsonify({'error': 'Invalid event id'}), 400
+    poll_interval = current_app.config['JOB_EVENTS_POLL_INTERVAL']
+    max_seconds = current_app.config['JOB_EVENTS_MAX_SECONDS']
+
+    def format_event(seq, event, data):
+        if ndjson:
+            return json.dumps(dict(data, seq=seq, event=event)) + '\n'
+        return f"id: {seq}\nevent: {event}\ndata: {json.dumps(data)}\n\n"
+
+    def stream():
+        last = after
+        deadline = time.monotonic() + max_seconds
+        if not ndjson:
+            yield f"retry: {int(poll_interval * 1000)}\n\n"
+        while True:
+            events = jobs.store.events(job_id, last)
+            for seq, event, data in events:
+                last = seq
+                yield format_event(seq, event, data)
+                if event == 'job' and data['state'] in FINISHED_STATES:
+                    return
+            if time.monotonic() >= deadline:
+                return
+            if not events:
+                if jobs.store.state(job_id) in FINISHED_STATES:
+                    return
+                time.sleep(poll_interval)
+
+    mimetype = 'application/x-ndjson' if ndjson else 'text/event-stream'
+    return Response(stream(), mimetype=mimetype,
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@job.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    status = jobs.get(job_id)
+    if status is None:
+        return jsonify({'error': 'Job not found'}), 404
+    if not jobs.cancel(job_id):
+        return jsonify({'error': f"Job is already {status['state']}"}), 409
+    logger.info(f"Cancellation requested for job {job_id}")
+    return jsonify(jobs.get(job_id)), 202
@@ -0,0 +1,66 @@
+from flask import Blueprint, jsonify, request, current_app
+import tempfile
+import logging
+from ..modules.file_handler import save_uploaded_file
+from ..modules.keyword_tagger import read_keywords
+from ..modules.keyword_sets import keyword_sets
+
+logger = logging.getLogger(__name__)
+
+keyword_set = Blueprint('keyword_set', __name__)
+
+# Keyword dictionaries uploaded once; uploads refer to them with keywordSetId
+
+def read_keyword_file():
+    # Returns (keywords, None), or (None, error response)
+    file = request.files.get('file')
+    if not file or file.filename == '':
+        return None, (jsonify({'error': 'No keyword file provided'}), 400)
+    # A dot folder is not taken for a batch by the storage sweeper
+    with tempfile.TemporaryDirectory(prefix='.keywords-', dir=current_app.config['UPLOAD_FOLDER']) as folder:
+        path = save_uploaded_file(file, folder)
+        if not path:
+            return None, (jsonify({'error': 'Keyword files must be .csv or .txt'}), 400)
+        try:
+            return read_keywords(path), None
+        except Exception as e:
+            return None, (jsonify({'error': f"Error processing keyword file: {str(e)}"}), 400)
+
+@keyword_set.route('/api/keyword-sets', methods=['POST'])
+def create_keyword_set():
+    keywords, error = read_keyword_file()
+    if error:
+        return error
+    record = keyword_sets.save(request.form.get('name'), keywords)
+    return jsonify(record), 201
+
+@keyword_set.route('/api/keyword-sets', methods=['GET'])
+def list_keyword_sets():
+    return jsonify({'keywordSets': keyword_sets.list()}), 200
+
+@keyword_set.route('/api/keyword-sets/<set_id>', methods=['GET'])
+def get_keyword_set(set_id):
+    record = keyword_sets.get(set_id)
+    if record is None:
+        return jsonify({'error': 'Keyword set not found'}), 404
+    if request.args.get('keywords') == 'true':
+        record = dict(record, keywords=keyword_sets.keywords(record))
+    return jsonify(record), 200
+
+@keyword_set.route('/api/keyword-sets/<set_id>', methods=['PUT'])
+def replace_keyword_set(set_id):
+    if keyword_sets.get(set_id) is None:
+        return jsonify({'error': 'Keyword set not found'}), 404
+    keywords, error = read_keyword_file()
+    if error:
+        return error
+    record = keyword_sets.save(request.form.get('name'), keywords, set_id=set_id)
+    if record is None:
+        return jsonify({'error': 'Keyword set not found'}), 404
+    return jsonify(record), 200
+
+@keyword_set.route('/api/keyword-sets/<set_id>', methods=['DELETE'])
+def delete_keyword_set(set_id):
+    if not keyword_sets.delete(set_id):
+        return jsonify({'error': 'Keyword set not found'}), 404
+    return '', 204
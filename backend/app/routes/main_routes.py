@@ -1,7 +1,39 @@
-from flask import Blueprint
+from flask import Blueprint, Response, jsonify
+from ..modules.result_cache import result_cache
+from ..modules.storage import storage
+from ..modules.keyword_sets import keyword_sets
+from ..modules.scheduler import scheduler
+from ..modules.template_cache import template_cache_stats
+from ..modules import metrics
 
 main = Blueprint('main', __name__)
 
+@main.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    return jsonify(result_cache.stats()), 200
+
+@main.route('/api/metrics', methods=['GET'])
+def metrics_endpoint():
+    # Prometheus text exposition format
+    return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
+
+@main.route('/api/storage/stats', methods=['GET'])
+def storage_stats():
+    return jsonify(storage.stats()), 200
+
+@main.route('/api/scheduler/stats', methods=['GET'])
+def scheduler_stats():
+    return jsonify(scheduler.stats()), 200
+
+@main.route('/api/keyword-cache/stats', methods=['GET'])
+def keyword_cache_stats():
+    return jsonify(keyword_sets.matchers.stats()), 200
+
+@main.route('/api/template-cache/stats', methods=['GET'])
+def template_cache_stats_endpoint():
+    # Section documents this process cloned from the parsed template
+    return jsonify(template_cache_stats()), 200
+
 # You can add API routes here if needed, for example:
 # @main.route('/api/some-endpoint')
 # def some_endpoint():
@@ -0,0 +1,117 @@
+from flask import Blueprint, jsonify, request, current_app
+import os
+import time
+import logging
+from ..modules.term_index import term_index
+from ..modules.word_counter import read_phrase_rows, write_word_count_summary, MAX_ROWS
+from ..modules.storage import storage
+
+logger = logging.getLogger(__name__)
+
+terms = Blueprint('terms', __name__)
+
+# Word counts of a summarised batch, answered from the term index without
+# opening its documents again
+
+def int_arg(values, name, default=None):
+    # Returns (value, None), or (None, error response)
+    value = values.get(name)
+    if value in (None, ''):
+        return default, None
+    try:
+        return int(value), None
+    except ValueError:
+        return None, (jsonify({'error': f"{name} must be an integer"}), 400)
+
+def indexed_documents(batch_id):
+    # Returns (documents, None), or (None, error response)
+    if not term_index.enabled:
+        return None, (jsonify({'error': 'The term index is disabled'}), 404)
+    documents = term_index.documents(batch_id)
+    if not documents:
+        return None, (jsonify({'error': 'No word counts for this batch; process it with Create Summary first'}), 404)
+    return documents, None
+
+@terms.route('/api/terms/<batch_id>', methods=['GET'])
+def term_range(batch_id):
+    # ?minCount=&maxCount= bound the counts; ?limit= and ?offset= page through them
+    documents, error = indexed_documents(batch_id)
+    if error:
+        return error
+    bounds = {}
+    for name, default in (('minCount', None), ('maxCount', None), ('limit', 100), ('offset', 0)):
+        bounds[name], error = int_arg(request.args, name, default)
+        if error:
+            return error
+    rows = term_index.band(batch_id, bounds['minCount'], bounds['maxCount'], bounds['limit'], bounds['offset'])
+    min_found, max_found = term_index.count_range(batch_id)
+    return jsonify({
+        'batchId': batch_id,
+        'documents': documents,
+        'countRange': {'min': min_found, 'max': max_found},
+        'terms': [{'term': term, 'count': count} for term, count in rows],
+        'limit': bounds['limit'],
+        'offset': bounds['offset'],
+    }), 200
+
+@terms.route('/api/terms/<batch_id>/top', methods=['GET'])
+def top_terms(batch_id):
+    documents, error = indexed_documents(batch_id)
+    if error:
+        return error
+    n, error = int_arg(request.args, 'n', 20)
+    if error:
+        return error
+    rows = term_index.band(batch_id, limit=n)
+    return jsonify({'batchId': batch_id, 'terms': [{'term': term, 'count': count} for term, count in rows]}), 200
+
+@terms.route('/api/terms/<batch_id>/documents', methods=['GET'])
+def term_documents(batch_id):
+    # The batch's documents; with ?term= the term's count in each of them
+    documents, error = indexed_documents(batch_id)
+    if error:
+        return error
+    term = request.args.get('term', '').strip().lower()
+    if not term:
+        return jsonify({'batchId': batch_id, 'documents': documents}), 200
+    counts = term_index.term_documents(batch_id, term)
+    return jsonify({'batchId': batch_id, 'term': term, 'count': sum(document['count'] for document in counts),
+                    'documents': counts}), 200
+
+@terms.route('/api/terms/<batch_id>/summary', methods=['POST'])
+def regenerate_summary(batch_id):
+    # Writes the word count summary for another minCount/maxCount into the
+    # batch folder, as the upload would have. The index holds no phrases; the
+    # phrase sheet is copied from a summary the batch already has.
+    documents, error = indexed_documents(batch_id)
+    if error:
+        return error
+    values = request.get_json(silent=True) or request.form
+    min_count, error = int_arg(values, 'minCount', 0)
+    if error:
+        return error
+    max_count, error = int_arg(values, 'maxCount', 300)
+    if error:
+        return error
+
+    batch_folder = os.path.join(current_app.config['RESULTS_FOLDER'], batch_id)
+    with storage.hold(batch_id):
+        if not os.path.isdir(batch_folder):
+            return jsonify({'error': 'Batch not found'}), 404
+        start = time.perf_counter()
+        rows = term_index.band(batch_id, min_count, max_count, MAX_ROWS)
+        phrase_rows = read_phrase_rows(batch_folder)
+        summary_path, message = write_word_count_summary(batch_folder, min_count, max_count, rows,
+                                                         term_index.count_range(batch_id), phrase_rows)
+        storage.touch(batch_id)
+    if summary_path is None:
+        return jsonify({'error': message}), 500
+    summary_file = os.path.basename(summary_path)
+    logger.info(f"Regenerated {summary_file} for batch {batch_id} from the term index in "
+                f"{time.perf_counter() - start:.3f}s")
+    return jsonify({
+        'batchId': batch_id,
+        'summary_file': summary_file,
+        'summary_message': message,
+        'url': f'/api/download/{batch_id}/{summary_file}',
+    }), 200
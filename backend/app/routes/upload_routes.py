@@ -1,11 +1,22 @@
 from flask import Blueprint, request, jsonify, current_app
 import os
+import uuid
 import logging
 import traceback
-from ..modules.file_handler import allowed_file, save_uploaded_file, create_batch_folder, clear_upload_folder, create_zip_file, get_file_size, check_disk_space
-from ..modules.document_parser import parse_multiple_docx
-from ..modules.keyword_tagger import read_keywords, tag_multiple_documents
-from ..modules.word_counter import create_word_count_summary
+from werkzeug.utils import secure_filename
+from ..modules.file_handler import allowed_file, save_uploaded_file, save_uploaded_file_hashed, create_batch_folder, clear_upload_folder, get_file_size
+from ..modules.keyword_tagger import read_keywords
+from ..modules.keyword_sets import keyword_sets
+from ..modules.pipeline import PipelineError, output_sink, run_pipeline
+from ..modules.jobs import jobs
+from ..modules.result_cache import result_cache, result_cache_key
+from ..modules.upload_session import UploadError, UploadSession
+from ..modules.storage import storage
+from ..modules.scheduler import scheduler
+from ..modules import metrics
+from ..modules.profiler import token_valid
+from ..modules.word_counter import MIN_PHRASE_ERROR
+from ..modules.section_export import OUTPUT_FORMATS
 
 logger = logging.getLogger(__name__)
 
@@ -26,146 +37,313 @@ def upload_file():
 
         logger.info(f"Received form data: {request.form}")
 
-        parse_doc = request.form.get('parseDoc') == 'true'
-        create_summary = request.form.get('createSummary') == 'true'
-        keyword_tag = request.form.get('keywordTag') == 'true'
+        options, error = read_options(request.form)
+        if error:
+            return error
 
-        logger.info(f"parse_doc: {parse_doc}, create_summary: {create_summary}, keyword_tag: {keyword_tag}")
+        retry_after = scheduler.admit(len(files) * operation_count(options))
+        if retry_after is not None:
+            return queue_full(retry_after)
 
-        if not parse_doc and not create_summary and not keyword_tag:
-            logger.error("No operation selected")
-            return jsonify({'error': 'Please select at least one operation (Parse Documents, Create Summary, or Keyword Tag)'}), 400
+        retry_after = storage.admit(request.content_length or 0)
+        if retry_after is not None:
+            return storage_full(retry_after)
 
         batch_id, batch_folder = create_batch_folder()
         logger.info(f"Created batch folder: {batch_folder}")
 
-        # Check available disk space
-        free_space = check_disk_space(batch_folder)
-        if free_space is not None and free_space < 1000000000:  # Less than 1GB
-            logger.warning(f"Low disk space. Only {free_space} bytes available.")
+        timings = metrics.Timings()
+        with storage.hold(batch_id), timings.activate():
+            keywords, error = read_reference_file(batch_folder, request.form)
+            if error:
+                return error
 
-        min_count = int(request.form.get('minCount', 0))
-        max_count = int(request.form.get('maxCount', 300))
-        parse_level = int(request.form.get('parseLevel', 1))
+            # Every batch keeps its uploads apart so concurrent batches with the
+            # same file names cannot overwrite each other
+            upload_folder = os.path.join(current_app.config['UPLOAD_FOLDER'], batch_id)
+            os.makedirs(upload_folder, exist_ok=True)
 
-        logger.info(
-            f"parse_doc: {parse_doc}, create_summary: {create_summary}, keyword_tag: {keyword_tag}, "
-            f"min_count: {min_count}, max_count: {max_count}, parse_level: {parse_level}"
-        )
+            doc_paths = []
+            uploads = []
 
-        keywords = []
-        reference_file = request.files.get('referenceFile')
-        if reference_file and reference_file.filename != '':
-            try:
-                reference_filename = save_uploaded_file(reference_file, batch_folder)
-                if reference_filename:
-                    keywords = read_keywords(reference_filename)
-                    logger.info(f"Read {len(keywords)} keywords from reference file")
-                else:
-                    logger.warning("Invalid reference file")
-            except Exception as e:
-                logger.error(f"Error processing reference file: {str(e)}")
-                logger.error(traceback.format_exc())
-                return jsonify({'error': f"Error processing reference file: {str(e)}"}), 400
-
-        results = []
-        doc_paths = []
-        files_to_zip = []
-
-        for file in files:
-            if file and allowed_file(file.filename):
-                try:
-                    filename = save_uploaded_file(file, current_app.config['UPLOAD_FOLDER'])
-                    if filename:
-                        doc_paths.append(filename)
-                        file_size = get_file_size(filename)
-                        logger.info(f"File saved: {filename}, Size: {file_size} bytes")
-                except Exception as e:
-                    logger.error(f"Error saving file {file.filename}: {str(e)}")
-                    logger.error(traceback.format_exc())
-                    return jsonify({'error': f"Error saving file {file.filename}: {str(e)}"}), 500
-
-        if parse_doc:
-            logger.info(f"Parsing documents: {doc_paths}")
-            try:
-                parsed_results = parse_multiple_docx(doc_paths, batch_folder, parse_level, keywords if keyword_tag else None)
-                results.extend(parsed_results)
-                for result in parsed_results:
-                    if 'output_folder' in result:
-                        for root, dirs, files in os.walk(result['output_folder']):
-                            for file in files:
-                                relative_path = os.path.relpath(os.path.join(root, file), batch_folder)
-                                files_to_zip.append(relative_path)
-                logger.info(f"Added {len(files_to_zip)} files to zip list from parsing")
-            except Exception as e:
-                logger.error(f"Error parsing documents: {str(e)}")
-                logger.error(traceback.format_exc())
-                return jsonify({'error': f"Error parsing documents: {str(e)}"}), 500
-
-        if create_summary:
-            logger.info(f"Creating word count summary for all documents")
-            try:
-                summary_file, summary_message = create_word_count_summary(doc_paths, batch_folder, min_count, max_count)
-                if summary_file:
-                    summary_filename = os.path.basename(summary_file)
-                    results.append({'summary_file': summary_filename})
-                    files_to_zip.append(summary_filename)
-                    logger.info(f"Summary file saved: {summary_file}")
-                else:
-                    logger.warning(summary_message)
-                results.append({'summary_message': summary_message})
-            except Exception as e:
-                logger.error(f"Error creating word count summary: {str(e)}")
-                logger.error(traceback.format_exc())
-                return jsonify({'error': f"Error creating word count summary: {str(e)}"}), 500
-
-        if keyword_tag:
-            logger.info(f"Tagging documents with keywords: {doc_paths}")
-            try:
-                tagged_results = tag_multiple_documents(doc_paths, batch_folder, keywords)
-                results.extend(tagged_results)
-                files_to_zip.extend([result['output_file'] for result in tagged_results if 'output_file' in result])
-                logger.info(f"Tagged {len(tagged_results)} documents")
-            except Exception as e:
-                logger.error(f"Error tagging documents with keywords: {str(e)}")
-                logger.error(traceback.format_exc())
-                return jsonify({'error': f"Error tagging documents with keywords: {str(e)}"}), 500
-
-        logger.info(f"Processing complete. Results: {results}")
-        logger.info(f"Files to zip: {files_to_zip}")
-
-        if files_to_zip:
-            try:
-                zip_filename = "processed_documents.zip"
-                logger.info(f"Creating zip file: {zip_filename}")
-                zip_path = create_zip_file(batch_folder, files_to_zip, zip_filename)
-                zip_size = get_file_size(zip_path)
-                logger.info(f"Zip file created: {zip_path}, Size: {zip_size} bytes")
-
-                processed_folders = [{
-                    'output_folder': 'All Processed Documents',
-                    'zipUrl': f'/api/download/{batch_id}/{zip_filename}'
-                }]
-            except Exception as e:
-                logger.error(f"Error in zip file creation: {str(e)}")
-                logger.error(traceback.format_exc())
-                return jsonify({'error': f"Error in zip file creation: {str(e)}"}), 500
-        else:
-            logger.warning("No files to zip")
-            processed_folders = []
+            for file in files:
+                if file and allowed_file(file.filename):
+                    try:
+                        with metrics.timed('upload_save'):
+                            filename, digest = save_uploaded_file_hashed(file, upload_folder)
+                        if filename:
+                            doc_paths.append(filename)
+                            uploads.append((os.path.basename(filename), digest))
+                            file_size = get_file_size(filename)
+                            logger.info(f"File saved: {filename}, Size: {file_size} bytes")
+                    except Exception as e:
+                        logger.error(f"Error saving file {file.filename}: {str(e)}")
+                        logger.error(traceback.format_exc())
+                        return jsonify({'error': f"Error saving file {file.filename}: {str(e)}"}), 500
+
+            return start_batch(batch_id, batch_folder, doc_paths, uploads, keywords, options,
+                               request.form.get('async') == 'true', timings)
+
+    except Exception as e:
+        logger.exception(f"An unexpected error occurred during file processing: {str(e)}")
+        logger.error(traceback.format_exc())
+        return jsonify({'error': str(e)}), 500
+
+def read_options(form):
+    # Returns (options, None), or (None, error response) when nothing is selected
+    parse_doc = form.get('parseDoc') == 'true'
+    create_summary = form.get('createSummary') == 'true'
+    keyword_tag = form.get('keywordTag') == 'true'
 
+    logger.info(f"parse_doc: {parse_doc}, create_summary: {create_summary}, keyword_tag: {keyword_tag}")
+
+    if not parse_doc and not create_summary and not keyword_tag:
+        logger.error("No operation selected")
+        return None, (jsonify({'error': 'Please select at least one operation (Parse Documents, Create Summary, or Keyword Tag)'}), 400)
+
+    parse_level, error = read_parse_level(form)
+    if error:
+        return None, error
+    output_format = form.get('outputFormat', 'docx')
+    if output_format not in OUTPUT_FORMATS:
+        return None, (jsonify({'error': f"Output format must be one of {', '.join(OUTPUT_FORMATS)}"}), 400)
+
+    options = {
+        'parse_doc': parse_doc,
+        'create_summary': create_summary,
+        'keyword_tag': keyword_tag,
+        'parse_level': parse_level,
+        'output_format': output_format,
+        'min_count': int(form.get('minCount', 0)),
+        'max_count': int(form.get('maxCount', 300)),
+    }
+    if create_summary and form.get('phraseSummary') == 'true':
+        options['phrases'], error = read_phrase_options(form)
+        if error:
+            return None, error
+    logger.info(f"Options: {options}")
+    return options, None
+
+def read_parse_level(form):
+    # Returns (parse level, None), or (None, error response). Several levels,
+    # as repeated fields or comma separated ("1,3"), are split from one parse
+    # and come back as a sorted list.
+    try:
+        levels = sorted({int(level) for value in form.getlist('parseLevel') or ['1']
+                         for level in value.split(',') if level.strip()})
+    except ValueError:
+        return None, (jsonify({'error': 'Invalid parse level'}), 400)
+    if not levels or levels[0] < 1 or levels[-1] > 3:
+        return None, (jsonify({'error': 'Parse levels must be between 1 and 3'}), 400)
+    return (levels[0] if len(levels) == 1 else levels), None
+
+def read_phrase_options(form):
+    # Returns (phrase options, None), or (None, error response)
+    try:
+        lengths = sorted({int(length) for length in form.get('phraseLengths', '2,3').split(',') if length.strip()})
+        error = float(form.get('phraseError', 0.0005))
+        top = int(form.get('phraseTop', 500))
+    except ValueError:
+        return None, (jsonify({'error': 'Invalid phrase summary options'}), 400)
+    if not lengths or lengths[0] < 2 or lengths[-1] > 5:
+        return None, (jsonify({'error': 'Phrase lengths must be between 2 and 5 words'}), 400)
+    if not MIN_PHRASE_ERROR <= error < 1:
+        return None, (jsonify({'error': f'Phrase error must be between {MIN_PHRASE_ERROR} and 1'}), 400)
+    if top < 1:
+        return None, (jsonify({'error': 'Phrase count must be positive'}), 400)
+    return {'lengths': lengths, 'error': error, 'top': top}, None
+
+def read_reference_file(batch_folder, form):
+    # Returns (keywords, None), or (None, error response). A registered
+    # keyword set (keywordSetId) takes the place of the reference file.
+    keywords = []
+    whole_words = form.get('wholeWords') == 'true'
+    set_id = form.get('keywordSetId')
+    if set_id:
+        keywords = keyword_sets.matcher(set_id, whole_words)
+        if keywords is None:
+            return None, (jsonify({'error': 'Keyword set not found'}), 404)
+        logger.info(f"Using {len(keywords)} keywords of keyword set {set_id}")
+        return keywords, None
+    reference_file = request.files.get('referenceFile')
+    if reference_file and reference_file.filename != '':
+        try:
+            reference_filename = save_uploaded_file(reference_file, batch_folder)
+            if reference_filename:
+                keywords = keyword_sets.matchers.get(read_keywords(reference_filename), whole_words)
+                logger.info(f"Read {len(keywords)} keywords from reference file")
+            else:
+                logger.warning("Invalid reference file")
+        except Exception as e:
+            logger.error(f"Error processing reference file: {str(e)}")
+            logger.error(traceback.format_exc())
+            return None, (jsonify({'error': f"Error processing reference file: {str(e)}"}), 400)
+    return keywords, None
+
+def start_batch(batch_id, batch_folder, doc_paths, uploads, keywords, options, run_async, timings=None):
+    # uploads: (filename, sha256) per document in doc_paths
+    digests = {path: digest for path, (_, digest) in zip(doc_paths, uploads)}
+    cache_key = None
+    if result_cache.enabled:
+        settings = {'streaming': current_app.config['STREAMING_PARSE'],
+                    'output_sink': output_sink(current_app.config)}
+        cache_key = result_cache_key(uploads, keywords if options['keyword_tag'] else None, options, settings)
+
+    profile = profile_requested()
+    if profile:
+        logger.info(f"Profiling batch {batch_id}")
+
+    if run_async:
+        jobs.submit(batch_id, batch_folder, doc_paths, keywords, options, cache_key=cache_key, timings=timings,
+                    profile=profile, digests=digests)
         return jsonify({
+            'jobId': batch_id,
             'batchId': batch_id,
-            'message': 'Processing completed successfully.',
-            'processedFolders': processed_folders,
-            'results': results
-        }), 200
+            'statusUrl': f'/api/jobs/{batch_id}'
+        }), 202
+
+    try:
+        response = run_pipeline(batch_id, batch_folder, doc_paths, keywords, options, cache_key=cache_key,
+                                timings=timings, profile=profile, digests=digests)
+    except PipelineError as e:
+        return jsonify({'error': str(e)}), e.status
+    return jsonify(response), 200
+
+# Chunked uploads, for batches larger than MAX_CONTENT_LENGTH: declare the
+# files, PUT each one in chunks of at most chunkSize bytes at ?offset=, then
+# complete with the same form fields as /api/upload. GET returns how much of
+# each file arrived, so an interrupted upload resumes where it stopped.
+@upload.route('/api/uploads', methods=['POST'])
+def init_chunked_upload():
+    body = request.get_json(silent=True) or {}
+    files = body.get('files')
+    if not isinstance(files, list) or not all(isinstance(file, dict) for file in files):
+        return jsonify({'error': 'Expected {"files": [{"name", "size", "sha256"?}]}'}), 400
+    rejected = [file.get('name') for file in files if not allowed_file(str(file.get('name', '')))]
+    if rejected:
+        return jsonify({'error': f"File type not allowed: {', '.join(map(str, rejected))}"}), 400
+
+    # The declared size is known up front, so a batch that would not fit is
+    # refused before any of it is sent
+    declared = sum(file['size'] for file in files if isinstance(file.get('size'), int))
+    retry_after = storage.admit(declared)
+    if retry_after is not None:
+        return storage_full(retry_after)
+
+    try:
+        session = UploadSession.create(current_app.config['UPLOAD_FOLDER'], str(uuid.uuid4()), files,
+                                       current_app.config['CHUNKED_UPLOAD_MAX_BYTES'])
+    except UploadError as e:
+        return upload_error(e)
+    response = session.status()
+    response['chunkSize'] = current_app.config['UPLOAD_CHUNK_SIZE']
+    return jsonify(response), 201
+
+@upload.route('/api/uploads/<upload_id>', methods=['GET'])
+def chunked_upload_status(upload_id):
+    session = UploadSession.load(current_app.config['UPLOAD_FOLDER'], upload_id)
+    if session is None:
+        return jsonify({'error': 'Upload not found'}), 404
+    return jsonify(session.status()), 200
+
+@upload.route('/api/uploads/<upload_id>/files/<name>', methods=['PUT'])
+def put_chunk(upload_id, name):
+    session = UploadSession.load(current_app.config['UPLOAD_FOLDER'], upload_id)
+    if session is None:
+        return jsonify({'error': 'Upload not found'}), 404
+    if session.completed:
+        return jsonify({'error': 'Upload already completed'}), 409
+    try:
+        offset = int(request.args.get('offset', 0))
+    except ValueError:
+        return jsonify({'error': 'Invalid offset'}), 400
+    if request.content_length and request.content_length > current_app.config['UPLOAD_CHUNK_SIZE']:
+        return jsonify({'error': f"Chunks are limited to {current_app.config['UPLOAD_CHUNK_SIZE']} bytes"}), 413
+
+    name = secure_filename(name)
+    try:
+        # Read the body as a stream; nothing is buffered beyond one read
+        with metrics.timed('upload_save'):
+            received = session.append(name, offset, request.stream)
+    except UploadError as e:
+        return upload_error(e)
+    return jsonify({'name': name, 'offset': received, 'size': session.files[name]['size']}), 200
+
+@upload.route('/api/uploads/<upload_id>/complete', methods=['POST'])
+def complete_chunked_upload(upload_id):
+    try:
+        session = UploadSession.load(current_app.config['UPLOAD_FOLDER'], upload_id)
+        if session is None:
+            return jsonify({'error': 'Upload not found'}), 404
+
+        options, error = read_options(request.form)
+        if error:
+            return error
+
+        retry_after = scheduler.admit(len(session.files) * operation_count(options))
+        if retry_after is not None:
+            return queue_full(retry_after)
+
+        with storage.hold(session.upload_id):
+            try:
+                completed = session.complete()
+            except UploadError as e:
+                return upload_error(e)
+
+            batch_id, batch_folder = create_batch_folder(session.upload_id)
+            logger.info(f"Chunked upload {upload_id} complete, batch folder: {batch_folder}")
+
+            keywords, error = read_reference_file(batch_folder, request.form)
+            if error:
+                return error
+
+            doc_paths = [path for path, digest in completed]
+            uploads = [(os.path.basename(path), digest) for path, digest in completed]
+            return start_batch(batch_id, batch_folder, doc_paths, uploads, keywords, options,
+                               request.form.get('async') == 'true')
 
     except Exception as e:
-        logger.exception(f"An unexpected error occurred during file processing: {str(e)}")
+        logger.exception(f"An unexpected error occurred completing upload {upload_id}: {str(e)}")
         logger.error(traceback.format_exc())
         return jsonify({'error': str(e)}), 500
 
+@upload.route('/api/uploads/<upload_id>', methods=['DELETE'])
+def abort_chunked_upload(upload_id):
+    session = UploadSession.load(current_app.config['UPLOAD_FOLDER'], upload_id)
+    if session is None:
+        return jsonify({'error': 'Upload not found'}), 404
+    session.abort()
+    return jsonify({'message': 'Upload aborted'}), 200
+
+def profile_requested():
+    # Profiling is on for every batch, or for a request that proves it knows
+    # the secret key
+    if current_app.config['PROFILE_REQUESTS']:
+        return True
+    token = request.headers.get('X-Profile-Token') or request.form.get('profileToken')
+    return token_valid(token, current_app.config['PROFILE_SECRET'])
+
+def storage_full(retry_after):
+    response = jsonify({'error': 'Not enough free disk space, please retry later', 'retryAfter': retry_after})
+    response.headers['Retry-After'] = str(retry_after)
+    return response, 503
+
+def queue_full(retry_after):
+    response = jsonify({'error': 'Too many documents are waiting to be processed, please retry later',
+                        'retryAfter': retry_after})
+    response.headers['Retry-After'] = str(retry_after)
+    return response, 429
+
+def operation_count(options):
+    # Each selected operation queues one task per document
+    return sum([options['parse_doc'], options['create_summary'], options['keyword_tag']])
+
+def upload_error(e):
+    body = {'error': str(e)}
+    if e.offset is not None:
+        body['offset'] = e.offset
+    return jsonify(body), e.status
+
 @upload.route('/api/clear', methods=['POST'])
 def clear():
     try:
@@ -0,0 +1,62 @@
+import argparse
+import logging
+import os
+import shutil
+import tempfile
+import time
+from app.modules.document_parser import parse_multiple_docx
+from .corpus import generate_docx
+
+
+def generate_batch(folder, count, seed=0):
+    paths = []
+    for index in range(count):
+        # Vary the size so largest-first scheduling has something to do
+        sections = 2 + index % 5
+        paths.append(generate_docx(os.path.join(folder, f"doc_{index}.docx"), sections=sections, paragraphs=10,
+                                   runs=3, seed=seed + index))
+    return paths
+
+
+def worker_counts(limit):
+    counts = []
+    count = 1
+    while count < limit:
+        counts.append(count)
+        count *= 2
+    counts.append(limit)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scaling of parse_multiple_docx across executor backends")
+    parser.add_argument('--documents', type=int, default=200)
+    parser.add_argument('--parse-level', type=int, default=2)
+    parser.add_argument('--backends', nargs='+', default=['thread', 'process'])
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        input_folder = os.path.join(tmp, 'input')
+        os.makedirs(input_folder)
+        paths = generate_batch(input_folder, args.documents)
+        # Warm up the template cache so the baseline doesn't pay for it
+        parse_multiple_docx(paths[:1], os.path.join(tmp, 'warmup'), args.parse_level, None, backend='inline')
+        start = time.perf_counter()
+        parse_multiple_docx(paths, os.path.join(tmp, 'inline'), args.parse_level, None, backend='inline')
+        baseline = time.perf_counter() - start
+        print(f"{args.documents} documents, inline: {baseline:.2f}s")
+        print(f"{'backend':>8} {'workers':>8} {'seconds':>8} {'speedup':>8}")
+        for backend in args.backends:
+            for workers in worker_counts(args.max_workers):
+                output = os.path.join(tmp, f"{backend}_{workers}")
+                start = time.perf_counter()
+                parse_multiple_docx(paths, output, args.parse_level, None, backend=backend, max_workers=workers)
+                elapsed = time.perf_counter() - start
+                shutil.rmtree(output)
+                print(f"{backend:>8} {workers:>8} {elapsed:>8.2f} {baseline / elapsed:>7.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+import argparse
+import os
+import tempfile
+import time
+from docx import Document
+from app.modules.heading_styles import HeadingStyles
+from .corpus import generate_docx
+
+
+def level_from_style_name(paragraph):
+    # Detection as it was: the style resolved through python-docx per paragraph
+    style_name = paragraph.style.name
+    if style_name and style_name.startswith('Heading'):
+        try:
+            return int(style_name.split()[-1])
+        except ValueError:
+            pass
+    return None
+
+
+def detect_by_style_name(doc, paragraphs):
+    return [level_from_style_name(paragraph) for paragraph in paragraphs]
+
+
+def detect_by_style_map(doc, paragraphs):
+    heading_styles = HeadingStyles.of(doc)
+    return [heading_styles.level(paragraph._p) for paragraph in paragraphs]
+
+
+def best_of(fn, doc, paragraphs, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        levels = fn(doc, paragraphs)
+        timings.append(time.perf_counter() - start)
+    return min(timings), levels
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare heading detection by style name with the precomputed "
+                                                 "style map")
+    parser.add_argument('--paragraphs', type=int, default=50000, help="body paragraphs in the document")
+    parser.add_argument('--depth', type=int, default=3, help="heading levels")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    # Ten sections on each level, body paragraphs spread over all of them
+    sections = sum(10 ** level for level in range(1, args.depth + 1))
+    with tempfile.TemporaryDirectory() as tmp:
+        path = generate_docx(os.path.join(tmp, 'headings.docx'), sections=10, depth=args.depth,
+                             paragraphs=max(1, args.paragraphs // sections), runs=1)
+        doc = Document(path)
+        paragraphs = doc.paragraphs
+        legacy, legacy_levels = best_of(detect_by_style_name, doc, paragraphs, args.repeat)
+        mapped, mapped_levels = best_of(detect_by_style_map, doc, paragraphs, args.repeat)
+
+    if legacy_levels != mapped_levels:
+        raise SystemExit("style map and style names disagree on heading levels")
+    headings = sum(1 for level in mapped_levels if level)
+    print(f"{len(paragraphs)} paragraphs, {headings} headings")
+    print(f"{'style.name':>12} {'style map':>12} {'speedup':>8}")
+    print(f"{legacy * 1000:>10.1f}ms {mapped * 1000:>10.1f}ms {legacy / mapped:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+import argparse
+import random
+import time
+from app.modules.keyword_matcher import KeywordMatcher
+from .corpus import WORDS, random_text
+
+
+def make_keywords(rng, count):
+    # Mix of real corpus words and random letter sequences, like a taxonomy file
+    keywords = list(WORDS)
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    while len(keywords) < count:
+        keywords.append(''.join(rng.choice(letters) for _ in range(rng.randint(4, 12))))
+    return keywords[:count]
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Substring scan vs Aho-Corasick keyword matching")
+    parser.add_argument('--keywords', type=int, nargs='+', default=[10, 100, 1000, 10000, 100000])
+    parser.add_argument('--words', type=int, default=20000, help="words in the scanned text")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    text = random_text(rng, args.words)
+    print(f"text: {len(text)} characters")
+    print(f"{'keywords':>9} {'substring':>11} {'build':>10} {'match':>10} {'speedup':>8}")
+    for count in args.keywords:
+        keywords = make_keywords(rng, count)
+        naive_time, naive_tags = timed(lambda: [keyword for keyword in keywords if keyword in text])
+        build_time, matcher = timed(lambda: KeywordMatcher(keywords))
+        match_time, tags = timed(lambda: matcher.find(text))
+        assert tags == naive_tags
+        print(f"{count:>9} {naive_time * 1000:>9.1f}ms {build_time * 1000:>8.1f}ms {match_time * 1000:>8.1f}ms "
+              f"{naive_time / match_time:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+import argparse
+import logging
+import os
+import tempfile
+import time
+import zipfile
+from app.modules.document_parser import parse_multiple_docx
+from app.modules.output_sink import ZipSink
+from .bench_executor import generate_batch
+
+
+def io_counters():
+    # Bytes passed to write()/read() by this process (Linux only)
+    try:
+        with open('/proc/self/io') as f:
+            counters = dict(line.split(': ') for line in f.read().splitlines())
+        return int(counters['wchar']), int(counters['rchar'])
+    except OSError:
+        return None, None
+
+
+def folder_bytes(folder):
+    total = 0
+    for root, dirs, files in os.walk(folder):
+        total += sum(os.path.getsize(os.path.join(root, file)) for file in files)
+    return total
+
+
+def tree_then_zip(paths, batch_folder, parse_level):
+    # What the upload route used to do: section files on disk, walk the tree,
+    # then read every file back and deflate it into the archive
+    results = parse_multiple_docx(paths, batch_folder, parse_level, None, backend='inline')
+    files_to_zip = []
+    for result in results:
+        for root, dirs, files in os.walk(result['output_folder']):
+            files_to_zip.extend(os.path.relpath(os.path.join(root, file), batch_folder) for file in files)
+    zip_path = os.path.join(batch_folder, 'processed_documents.zip')
+    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for file in files_to_zip:
+            zf.write(os.path.join(batch_folder, file), file)
+    return zip_path
+
+
+def straight_to_zip(paths, batch_folder, parse_level):
+    zip_path = os.path.join(batch_folder, 'processed_documents.zip')
+    with ZipSink(zip_path) as sink:
+        parse_multiple_docx(paths, batch_folder, parse_level, None, backend='inline', sink=sink)
+    return zip_path
+
+
+def measure(name, run, paths, batch_folder, parse_level):
+    os.makedirs(batch_folder)
+    wchar, rchar = io_counters()
+    start = time.perf_counter()
+    zip_path = run(paths, batch_folder, parse_level)
+    elapsed = time.perf_counter() - start
+    wchar_after, rchar_after = io_counters()
+    written = folder_bytes(batch_folder)
+    line = f"{name:>16} {elapsed:>8.2f} {written:>14,} {os.path.getsize(zip_path):>12,}"
+    if wchar is not None:
+        line += f" {wchar_after - wchar:>14,} {rchar_after - rchar:>14,}"
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Disk bytes written per batch: section tree + zip vs direct archive")
+    parser.add_argument('--documents', type=int, default=50)
+    parser.add_argument('--parse-level', type=int, default=2)
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        input_folder = os.path.join(tmp, 'input')
+        os.makedirs(input_folder)
+        paths = generate_batch(input_folder, args.documents)
+        # Warm up the template cache so neither run pays for it
+        parse_multiple_docx(paths[:1], os.path.join(tmp, 'warmup'), args.parse_level, None, backend='inline')
+
+        print(f"{args.documents} documents, parse level {args.parse_level}")
+        print(f"{'output':>16} {'seconds':>8} {'bytes on disk':>14} {'zip bytes':>12} "
+              f"{'bytes written':>14} {'bytes read':>14}")
+        measure('tree + deflate', tree_then_zip, paths, os.path.join(tmp, 'tree'), args.parse_level)
+        measure('zip sink', straight_to_zip, paths, os.path.join(tmp, 'zip'), args.parse_level)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+import argparse
+import io
+import os
+import tempfile
+import time
+from docx import Document
+from app.modules.document_parser import add_paragraphs
+from app.modules.section_writer import SectionWriter
+from .corpus import generate_docx
+
+
+def write_with_add_paragraphs(paragraphs):
+    doc = Document()
+    add_paragraphs(doc, paragraphs)
+    doc.save(io.BytesIO())
+
+
+def write_with_section_writer(paragraphs):
+    doc = Document()
+    SectionWriter(doc).append(paragraphs)
+    doc.save(io.BytesIO())
+
+
+def best_of(fn, paragraphs, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(paragraphs)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare add_paragraphs with raw-XML section cloning")
+    parser.add_argument('--paragraphs', type=int, nargs='+', default=[10, 100, 500])
+    parser.add_argument('--runs', type=int, default=4)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'paragraphs':>10} {'add_paragraphs':>15} {'SectionWriter':>15} {'speedup':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for count in args.paragraphs:
+            path = generate_docx(os.path.join(tmp, f"source_{count}.docx"), sections=1, paragraphs=count, runs=args.runs)
+            paragraphs = [p for p in Document(path).paragraphs if not p.style.name.startswith('Heading')]
+            legacy = best_of(write_with_add_paragraphs, paragraphs, args.repeat)
+            cloned = best_of(write_with_section_writer, paragraphs, args.repeat)
+            print(f"{count:>10} {legacy * 1000:>13.1f}ms {cloned * 1000:>13.1f}ms {legacy / cloned:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
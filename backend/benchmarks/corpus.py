@@ -0,0 +1,54 @@
+import os
+import random
+from docx import Document
+
+WORDS = ('contract', 'service', 'delivery', 'payment', 'invoice', 'liability', 'warranty', 'term',
+         'party', 'notice', 'agreement', 'schedule', 'annex', 'price', 'customer', 'supplier')
+
+# Drawn into the text at keyword_density, so tagging has something to find
+KEYWORDS = ('force majeure', 'indemnity', 'termination', 'confidentiality', 'arbitration', 'penalty',
+            'governing law', 'subcontractor', 'audit', 'escrow')
+
+
+def random_text(rng, words, keywords=KEYWORDS, keyword_density=0.0):
+    return ' '.join(rng.choice(keywords) if keyword_density and rng.random() < keyword_density else rng.choice(WORDS)
+                    for _ in range(words))
+
+
+def generate_docx(path, sections=5, paragraphs=20, runs=4, seed=0, depth=1, tables=0, keyword_density=0.0,
+                  keywords=KEYWORDS):
+    # `sections` headings on each of `depth` levels (H1, then H2 and H3 under
+    # every heading above), and in every section `paragraphs` paragraphs of
+    # `runs` runs followed by `tables` small tables
+    rng = random.Random(seed)
+    doc = Document()
+
+    def add_body():
+        for _ in range(paragraphs):
+            paragraph = doc.add_paragraph()
+            for run_index in range(runs):
+                run = paragraph.add_run(random_text(rng, 6, keywords, keyword_density) + ' ')
+                run.bold = run_index % 3 == 0
+                run.italic = run_index % 3 == 1
+        for _ in range(tables):
+            table = doc.add_table(rows=3, cols=3)
+            for cell in table._cells:
+                cell.text = random_text(rng, 3, keywords, keyword_density)
+
+    def add_sections(level, prefix):
+        for section in range(sections):
+            number = f"{prefix}{section}"
+            doc.add_heading(f"Section {number}", level=level)
+            add_body()
+            if level < depth:
+                add_sections(level + 1, f"{number}.")
+
+    add_sections(1, '')
+    doc.save(path)
+    return path
+
+
+def generate_corpus(folder, documents, seed=0, **shape):
+    # Documents of the same shape with different text
+    return [generate_docx(os.path.join(folder, f"doc_{index}.docx"), seed=seed + index, **shape)
+            for index in range(documents)]
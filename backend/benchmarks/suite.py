@@ -0,0 +1,248 @@
+import argparse
+import io
+import json
+import logging
+import os
+import random
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from app import create_app
+from app.config import Config
+from app.modules.document_parser import parse_docx
+from app.modules.file_handler import create_zip_file
+from app.modules.keyword_tagger import tag_document_and_save
+from app.modules.word_counter import create_word_count_summary
+from .bench_keyword_matcher import make_keywords
+from .corpus import KEYWORDS, generate_corpus
+
+
+# Every benchmark takes the suite context and returns {case name: run}. A run
+# gets a fresh, empty output folder each time and only the run is timed.
+def bench_parse(context):
+    path = context.paths[0]
+    cases = {f"parse_docx[level={level}]": (lambda output, level=level: parse_docx(path, output, level, None,
+                                                                                     streaming=True))
+             for level in (1, 2, 3)}
+    # All three splits from one pass, against the sum of the three above
+    cases['parse_docx[levels=1,2,3]'] = lambda output: parse_docx(path, output, [1, 2, 3], None, streaming=True)
+    # The section tree as NDJSON records instead of rendered documents
+    cases['parse_docx[level=3,ndjson]'] = lambda output: parse_docx(path, output, 3, None, streaming=True,
+                                                                    output_format='ndjson')
+    return cases
+
+
+def bench_tag(context):
+    path = context.paths[0]
+    cases = {}
+    for count in context.args.keyword_sets:
+        # The corpus keywords first, so every set finds something to tag
+        keywords = (list(KEYWORDS) + make_keywords(context.rng, count))[:count]
+        cases[f"tag_document[keywords={count}]"] = (
+            lambda output, keywords=keywords: tag_document_and_save(path, output, keywords))
+    return cases
+
+
+def bench_word_count(context):
+    phrases = {'lengths': [2, 3], 'error': 0.0005, 'top': 500}
+    return {
+        'create_word_count_summary': lambda output: create_word_count_summary(context.paths, output, 1, 1000),
+        'create_word_count_summary[phrases]': lambda output: create_word_count_summary(context.paths, output, 1, 1000,
+                                                                                       phrases=phrases),
+    }
+
+
+def bench_zip(context):
+    # The section tree of the whole corpus, as the directory sink leaves it
+    tree = os.path.join(context.tmp, 'zip_input')
+    for path in context.paths:
+        parse_docx(path, tree, 3, None, streaming=True)
+    files = []
+    for root, dirs, names in os.walk(tree):
+        files.extend(os.path.relpath(os.path.join(root, name), tree) for name in names)
+
+    def run(output):
+        zip_path = create_zip_file(tree, files, 'bench.zip')
+        shutil.move(zip_path, os.path.join(output, 'bench.zip'))
+    return {'create_zip_file': run}
+
+
+def bench_upload(context):
+    client = context.app.test_client()
+
+    def run(output):
+        files = [open(path, 'rb') for path in context.paths]
+        data = {
+            'files': [(file, os.path.basename(path)) for file, path in zip(files, context.paths)],
+            'parseDoc': 'true', 'createSummary': 'true', 'keywordTag': 'true',
+            'parseLevel': '2', 'minCount': '1', 'maxCount': '1000',
+            'referenceFile': (io.BytesIO('\n'.join(KEYWORDS).encode('utf-8')), 'keywords.txt'),
+        }
+        try:
+            response = client.post('/api/upload', data=data, content_type='multipart/form-data')
+        finally:
+            for file in files:
+                file.close()
+        if response.status_code != 200:
+            raise RuntimeError(f"/api/upload returned {response.status_code}: {response.get_json()}")
+    return {'api_upload': run}
+
+
+BENCHMARKS = {
+    'parse': bench_parse,
+    'tag': bench_tag,
+    'word_count': bench_word_count,
+    'zip': bench_zip,
+    'upload': bench_upload,
+}
+
+
+class SuiteContext:
+    def __init__(self, args, tmp, paths, app):
+        self.args = args
+        self.tmp = tmp
+        self.paths = paths
+        self.app = app
+        self.rng = random.Random(args.seed)
+
+
+def bench_config(tmp):
+    # Everything the app writes stays in tmp, and nothing is reused between runs
+    class BenchConfig(Config):
+        UPLOAD_FOLDER = os.path.join(tmp, 'uploads')
+        RESULTS_FOLDER = os.path.join(tmp, 'results')
+        RESULT_CACHE_MAX_BYTES = 0
+        SECTION_MANIFEST_FOLDER = ''
+        KEYWORD_SET_FOLDER = os.path.join(tmp, 'keyword_sets')
+        STORAGE_SWEEP_INTERVAL = 0
+        STORAGE_MIN_FREE_BYTES = 0
+        MAX_CONTENT_LENGTH = None
+    return BenchConfig
+
+
+def measure(run, tmp, repeat, warmup):
+    seconds = []
+    for index in range(warmup + repeat):
+        output = tempfile.mkdtemp(dir=tmp)
+        start = time.perf_counter()
+        run(output)
+        elapsed = time.perf_counter() - start
+        shutil.rmtree(output, ignore_errors=True)
+        if index >= warmup:
+            seconds.append(elapsed)
+    return {
+        'median': statistics.median(seconds),
+        'min': min(seconds),
+        'max': max(seconds),
+        'runs': seconds,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, threshold):
+    # Prints the change of every median against the baseline and returns the
+    # names that got slower by more than threshold
+    regressions = []
+    print(f"\n{'benchmark':<34} {'baseline':>10} {'current':>10} {'change':>8}")
+    for name, result in results['results'].items():
+        before = baseline['results'].get(name)
+        if before is None:
+            print(f"{name:<34} {'-':>10} {result['median'] * 1000:>8.1f}ms {'new':>8}")
+            continue
+        change = result['median'] / before['median'] - 1
+        flag = ''
+        if change > threshold:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print(f"{name:<34} {before['median'] * 1000:>8.1f}ms {result['median'] * 1000:>8.1f}ms "
+              f"{change * 100:>+7.1f}%{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark suite over a synthetic DOCX corpus, with JSON results "
+                                                 "and regression checks against a baseline")
+    parser.add_argument('--only', nargs='+', choices=sorted(BENCHMARKS), help="benchmarks to run (default: all)")
+    parser.add_argument('--documents', type=int, default=4)
+    parser.add_argument('--depth', type=int, default=3, help="heading levels")
+    parser.add_argument('--sections', type=int, default=3, help="sections per heading level")
+    parser.add_argument('--paragraphs', type=int, default=6, help="paragraphs per section")
+    parser.add_argument('--runs', type=int, default=4, help="runs per paragraph")
+    parser.add_argument('--tables', type=int, default=1, help="tables per section")
+    parser.add_argument('--keyword-density', type=float, default=0.02, help="share of words that are keywords")
+    parser.add_argument('--keyword-sets', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--warmup', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="write results as JSON to this file")
+    parser.add_argument('--compare', help="baseline JSON from an earlier --output")
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help="flag medians slower than the baseline by more than this fraction")
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+
+    shape = {
+        'sections': args.sections, 'paragraphs': args.paragraphs, 'runs': args.runs, 'depth': args.depth,
+        'tables': args.tables, 'keyword_density': args.keyword_density,
+    }
+    results = {
+        'meta': {
+            'created': datetime.now(timezone.utc).isoformat(),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'corpus': dict(shape, documents=args.documents, seed=args.seed),
+            'repeat': args.repeat,
+            'warmup': args.warmup,
+        },
+        'results': {},
+    }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus_folder = os.path.join(tmp, 'corpus')
+        os.makedirs(corpus_folder)
+        paths = generate_corpus(corpus_folder, args.documents, seed=args.seed, **shape)
+        app = create_app(bench_config(tmp))
+        context = SuiteContext(args, tmp, paths, app)
+        print(f"corpus: {args.documents} documents, {sum(os.path.getsize(path) for path in paths):,} bytes, {shape}")
+        print(f"{'benchmark':<34} {'median':>10} {'min':>10} {'max':>10}")
+        with app.app_context():
+            for name in args.only or BENCHMARKS:
+                for case, run in BENCHMARKS[name](context).items():
+                    result = measure(run, tmp, args.repeat, args.warmup)
+                    results['results'][case] = result
+                    print(f"{case:<34} {result['median'] * 1000:>8.1f}ms {result['min'] * 1000:>8.1f}ms "
+                          f"{result['max'] * 1000:>8.1f}ms")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nresults written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline['meta'].get('corpus') != results['meta']['corpus']:
+            print("warning: the baseline was measured on a different corpus")
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regressions over {args.threshold:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+        print("\nno regressions")
+
+
+if __name__ == '__main__':
+    main()
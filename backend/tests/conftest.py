@@ -0,0 +1,77 @@
+import os
+import time
+import pytest
+from docx import Document
+from app import create_app
+from app.config import Config
+
+
+# Builds a .docx from (heading level, text) pairs, level 0 for body paragraphs
+@pytest.fixture
+def make_docx(tmp_path):
+    def make(blocks, name='document.docx'):
+        doc = Document()
+        for level, text in blocks:
+            if level:
+                doc.add_heading(text, level=level)
+            else:
+                doc.add_paragraph(text)
+        path = os.path.join(tmp_path, name)
+        doc.save(path)
+        return path
+    return make
+
+
+# An app whose folders, databases and caches all live in tmp_path. The
+# storage sweeper, result cache and section reuse are off unless a test
+# turns them on.
+@pytest.fixture
+def make_app(tmp_path):
+    def make(**config):
+        settings = {
+            'UPLOAD_FOLDER': os.path.join(tmp_path, 'uploads'),
+            'RESULTS_FOLDER': os.path.join(tmp_path, 'results'),
+            'RESULT_CACHE_FOLDER': os.path.join(tmp_path, 'cache'),
+            'RESULT_CACHE_MAX_BYTES': 0,
+            'SECTION_MANIFEST_FOLDER': '',
+            'KEYWORD_SET_FOLDER': os.path.join(tmp_path, 'keyword_sets'),
+            'STORAGE_SWEEP_INTERVAL': 0,
+            'STORAGE_MIN_FREE_BYTES': 0,
+            'JOB_WORKERS': 1,
+            'TESTING': True,
+        }
+        settings.update(config)
+        return create_app(type('TestConfig', (Config,), settings))
+    return make
+
+
+@pytest.fixture
+def app(make_app):
+    return make_app()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+# Posts .docx files to /api/upload with the given form fields
+def upload(client, paths, **form):
+    data = {key: str(value).lower() if isinstance(value, bool) else str(value) for key, value in form.items()}
+    data['files'] = [(open(path, 'rb'), os.path.basename(path)) for path in paths]
+    try:
+        return client.post('/api/upload', data=data, content_type='multipart/form-data')
+    finally:
+        for file, _ in data['files']:
+            file.close()
+
+
+# Polls a job's status URL until the job is finished
+def wait_for(client, status_url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status = client.get(status_url).get_json()
+        if status['state'] in ('completed', 'failed', 'cancelled'):
+            return status
+        time.sleep(0.05)
+    raise AssertionError(f'job still {status["state"]}')
@@ -0,0 +1,131 @@
+import json
+import os
+import zipfile
+import pytest
+from docx import Document
+from app.modules.document_parser import parse_docx
+from app.modules.docx_stream import DocxStream
+from app.modules.output_sink import ZipSink
+
+REPEATED_HEADINGS = [
+    (1, 'Intro'), (0, 'first intro'),
+    (2, 'Terms'), (3, 'Notice'), (0, 'first notice'), (3, 'Notice'), (0, 'second notice'),
+    (1, 'Other'), (0, 'other text'),
+    (1, 'Intro'), (0, 'second intro'),
+]
+
+
+def texts(path):
+    return [paragraph.text for paragraph in Document(path).paragraphs]
+
+
+def section_files(folder):
+    return sorted(os.path.relpath(os.path.join(root, name), folder)
+                  for root, _, files in os.walk(folder) for name in files)
+
+
+def test_repeated_headings_get_numbered_sections(make_docx, tmp_path):
+    path = make_docx(REPEATED_HEADINGS)
+    output = tmp_path / 'output'
+    parse_docx(path, str(output), 1, None)
+    assert section_files(output) == ['document/Intro (2).docx', 'document/Intro.docx', 'document/Other.docx']
+    assert 'first intro' in texts(output / 'document' / 'Intro.docx')
+    assert 'second intro' in texts(output / 'document' / 'Intro (2).docx')
+
+
+def test_repeated_h3_gets_a_numbered_section(make_docx, tmp_path):
+    path = make_docx(REPEATED_HEADINGS)
+    output = tmp_path / 'output'
+    parse_docx(path, str(output), 3, None)
+    folder = output / 'document' / 'Intro' / 'Terms'
+    assert texts(folder / 'Notice.docx') == ['Intro', 'Terms', 'Notice', 'first notice']
+    assert texts(folder / 'Notice (2).docx') == ['Intro', 'Terms', 'Notice', 'second notice']
+
+
+@pytest.mark.parametrize('parse_level', [1, 2, 3, [1, 2, 3]])
+def test_streaming_and_full_load_write_the_same_sections(make_docx, tmp_path, parse_level):
+    path = make_docx(REPEATED_HEADINGS)
+    outputs = {}
+    for streaming in (False, True):
+        output = tmp_path / f'streaming_{streaming}'
+        doc_folder, sections = parse_docx(path, str(output), parse_level, None, streaming=streaming)
+        outputs[streaming] = (section_files(output), sections,
+                              {name: texts(output / name) for name in section_files(output)})
+    assert outputs[False] == outputs[True]
+
+
+@pytest.mark.parametrize('parse_level', [1, 2, 3, [1, 2, 3]])
+def test_streaming_to_zip_writes_each_member_once(make_docx, tmp_path, parse_level):
+    path = make_docx(REPEATED_HEADINGS)
+    archive = tmp_path / 'sections.zip'
+    sink = ZipSink(str(archive))
+    parse_docx(path, str(tmp_path), parse_level, None, streaming=True, sink=sink)
+    sink.close()
+    with zipfile.ZipFile(archive) as zf:
+        names = zf.namelist()
+    assert len(names) == len(set(names))
+
+
+def test_sanitized_name_collisions_get_numbered_paths(make_docx, tmp_path):
+    path = make_docx([(1, 'a/b'), (0, 'slash'), (1, 'a_b'), (0, 'underscore')])
+    output = tmp_path / 'output'
+    parse_docx(path, str(output), 1, None)
+    assert section_files(output) == ['document/a_b (2).docx', 'document/a_b.docx']
+
+
+def test_streaming_open_failure_falls_back_to_full_load(make_docx, tmp_path, monkeypatch):
+    path = make_docx(REPEATED_HEADINGS)
+
+    def fail(file_path):
+        raise ValueError('unreadable')
+    monkeypatch.setattr('app.modules.document_parser.DocxStream', fail)
+    output = tmp_path / 'output'
+    parse_docx(path, str(output), 1, None, streaming=True)
+    assert section_files(output) == ['document/Intro (2).docx', 'document/Intro.docx', 'document/Other.docx']
+
+
+def test_streaming_failure_after_a_write_is_raised(make_docx, tmp_path, monkeypatch):
+    path = make_docx(REPEATED_HEADINGS)
+    iter_block_items = DocxStream.iter_block_items
+
+    def fail_halfway(self):
+        for index, block in enumerate(iter_block_items(self)):
+            if index == 8:
+                raise ValueError('truncated document')
+            yield block
+    monkeypatch.setattr(DocxStream, 'iter_block_items', fail_halfway)
+    archive = tmp_path / 'sections.zip'
+    sink = ZipSink(str(archive))
+    with pytest.raises(ValueError, match='truncated document'):
+        parse_docx(path, str(tmp_path), 1, None, streaming=True, sink=sink)
+    sink.close()
+    with zipfile.ZipFile(archive) as zf:
+        names = zf.namelist()
+    assert names == ['document/Intro.docx']
+
+
+def test_streaming_ndjson_export_to_zip(make_docx, tmp_path):
+    path = make_docx(REPEATED_HEADINGS)
+    archive = tmp_path / 'sections.zip'
+    with ZipSink(str(archive)) as sink:
+        parse_docx(path, str(tmp_path), [1, 3], None, streaming=True, sink=sink, output_format='ndjson')
+    with zipfile.ZipFile(archive) as zf:
+        assert zf.namelist() == ['document/sections.ndjson']
+        records = [json.loads(line) for line in zf.read('document/sections.ndjson').splitlines()]
+    assert [(record['level'], record['headings']) for record in records] == [
+        (1, ['Intro']), (3, ['Intro', '', '']), (3, ['Intro', 'Terms', '']), (3, ['Intro', 'Terms', 'Notice']),
+        (3, ['Intro', 'Terms', 'Notice']),
+        (1, ['Other']), (3, ['Other', '', '']),
+        (1, ['Intro']), (3, ['Intro', '', '']),
+    ]
+
+
+def test_section_headings_use_the_template_heading_styles(make_docx, tmp_path):
+    path = make_docx(REPEATED_HEADINGS)
+    output = tmp_path / 'output'
+    parse_docx(path, str(output), [1, 3], None)
+    paragraphs = Document(output / 'document' / 'level_1' / 'Intro.docx').paragraphs
+    assert [(paragraph.style.name, paragraph.text) for paragraph in paragraphs[:4]] == [
+        ('Heading 1', 'Intro'), ('Normal', 'first intro'), ('Heading 2', 'Terms'), ('Heading 3', 'Notice')]
+    notice = Document(output / 'document' / 'level_3' / 'Intro' / 'Terms' / 'Notice.docx').paragraphs
+    assert [paragraph.style.name for paragraph in notice] == ['Heading 1', 'Heading 2', 'Heading 3', 'Normal']
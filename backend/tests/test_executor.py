@@ -0,0 +1,57 @@
+import os
+import pytest
+from app.modules.document_parser import parse_multiple_docx
+from app.modules.executor import largest_first, map_files
+from app.modules.keyword_tagger import tag_multiple_documents
+
+DOCUMENT = [(1, 'Intro'), (0, 'payment terms'), (1, 'Terms'), (0, 'notice period')]
+
+
+def section_files(folder):
+    return sorted(os.path.relpath(os.path.join(root, name), folder)
+                  for root, _, files in os.walk(folder) for name in files)
+
+
+def square(value, offset=0):
+    if value == 'bad':
+        raise ValueError('bad input')
+    return len(value) ** 2 + offset
+
+
+@pytest.mark.parametrize('backend', ['inline', 'thread', 'process'])
+def test_map_files_yields_every_outcome(backend):
+    outcomes = {}
+    for value, future in map_files(square, ['a', 'bbb', 'bad'], {'offset': 1}, backend, max_workers=2):
+        try:
+            outcomes[value] = future.result()
+        except ValueError as exc:
+            outcomes[value] = str(exc)
+        assert future.seconds >= 0
+    assert outcomes == {'a': 2, 'bbb': 10, 'bad': 'bad input'}
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        list(map_files(square, ['a'], backend='fibers'))
+
+
+def test_largest_first(tmp_path):
+    sizes = {'small': 1, 'large': 100, 'medium': 10}
+    for name, size in sizes.items():
+        (tmp_path / name).write_bytes(b'x' * size)
+    paths = [str(tmp_path / name) for name in sizes] + [str(tmp_path / 'missing')]
+    assert [os.path.basename(path) for path in largest_first(paths)] == ['large', 'medium', 'small', 'missing']
+
+
+def test_process_backend_writes_what_threads_write(make_docx, tmp_path):
+    paths = [make_docx(DOCUMENT, name) for name in ('one.docx', 'two.docx')]
+    outputs = {}
+    for backend in ('thread', 'process'):
+        folder = tmp_path / backend
+        parsed = parse_multiple_docx(paths, str(folder), 1, ['payment'], backend=backend, max_workers=2)
+        tagged = tag_multiple_documents(paths, str(folder), ['payment', 'notice'], backend=backend, max_workers=2)
+        assert not any('error' in result for result in parsed + tagged)
+        outputs[backend] = (section_files(folder), sorted(result['file'] for result in parsed),
+                            sorted((result['file'], result['tags']) for result in tagged))
+    assert outputs['thread'] == outputs['process']
+    assert 'one/Intro.docx' in outputs['process'][0]
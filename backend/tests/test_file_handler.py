@@ -0,0 +1,54 @@
+import io
+import os
+import time
+from app.modules.storage import storage
+from app.modules.upload_session import UploadSession
+
+
+def make_folder(app, name, age=0):
+    folder = os.path.join(app.config['UPLOAD_FOLDER'], name)
+    os.makedirs(folder)
+    with open(os.path.join(folder, 'upload.docx'), 'wb') as f:
+        f.write(b'docx')
+    used = time.time() - age
+    for path in (os.path.join(folder, 'upload.docx'), folder):
+        os.utime(path, (used, used))
+    return folder
+
+
+def test_clear_removes_only_folders_past_the_grace_period(make_app):
+    app = make_app(STORAGE_GRACE_SECONDS=600)
+    recent = make_folder(app, 'recent', age=60)
+    old = make_folder(app, 'old', age=3600)
+    response = app.test_client().post('/api/clear')
+    assert response.status_code == 200
+    assert os.path.exists(recent)
+    assert not os.path.exists(old)
+
+
+def test_clear_keeps_held_batches(make_app):
+    app = make_app(STORAGE_GRACE_SECONDS=0)
+    held = make_folder(app, 'held', age=3600)
+    with storage.hold('held'):
+        app.test_client().post('/api/clear')
+    assert os.path.exists(held)
+
+
+def test_clear_keeps_open_chunked_uploads(make_app):
+    app = make_app(STORAGE_GRACE_SECONDS=0)
+    upload_folder = app.config['UPLOAD_FOLDER']
+    session = UploadSession.create(upload_folder, 'open', [{'name': 'a.docx', 'size': 10}], 100)
+    session.append('a.docx', 0, io.BytesIO(b'12345'))
+    completed = UploadSession.create(upload_folder, 'completed', [{'name': 'b.docx', 'size': 3}], 100)
+    completed.append('b.docx', 0, io.BytesIO(b'abc'))
+    completed.complete()
+    past = time.time() - 3600
+    for folder in (session.folder, completed.folder):
+        for name in os.listdir(folder):
+            os.utime(os.path.join(folder, name), (past, past))
+        os.utime(folder, (past, past))
+
+    app.test_client().post('/api/clear')
+    assert os.path.exists(session.folder)
+    assert not os.path.exists(completed.folder)
+
@@ -0,0 +1,51 @@
+import pytest
+from docx import Document
+from docx.oxml.ns import qn
+from docx.oxml import OxmlElement
+from app.modules import heading_styles
+from app.modules.docx_stream import DocxStream
+from app.modules.heading_styles import HeadingStyles, heading_level_from_name
+
+
+@pytest.fixture(autouse=True)
+def default_patterns():
+    yield
+    heading_styles.configure(None)
+
+
+def outline(paragraph, level):
+    ppr = paragraph._p.get_or_add_pPr()
+    element = OxmlElement('w:outlineLvl')
+    element.set(qn('w:val'), str(level))
+    ppr.append(element)
+
+
+def test_levels_from_names_outline_levels_and_base_styles():
+    doc = Document()
+    localized = doc.styles.add_style('Überschrift 2', 1)
+    derived = doc.styles.add_style('Chapter', 1)
+    derived.base_style = doc.styles['Heading 1']
+    paragraphs = [doc.add_paragraph('h', style='Heading 3'), doc.add_paragraph('l', style=localized),
+                  doc.add_paragraph('d', style=derived), doc.add_paragraph('body'), doc.add_paragraph('direct')]
+    outline(paragraphs[4], 1)
+    outline(doc.add_paragraph('demoted', style='Heading 1'), 9)
+    styles = HeadingStyles.of(doc)
+    assert [styles.level(paragraph._p) for paragraph in doc.paragraphs] == [3, 2, 1, None, 2, None]
+    assert styles.name(paragraphs[1]._p) == 'Überschrift 2'
+    assert styles.name(paragraphs[3]._p) == 'Normal'
+
+
+def test_configured_patterns_replace_the_defaults():
+    assert heading_level_from_name('Heading 2') == 2
+    heading_styles.configure([r'level\s*(\d+)'])
+    assert heading_level_from_name('Heading 2') is None
+    assert heading_level_from_name('Level 4') == 4
+    assert heading_styles.patterns() == [r'level\s*(\d+)']
+
+
+def test_stream_and_document_agree(make_docx):
+    path = make_docx([(1, 'Intro'), (0, 'text'), (2, 'Scope'), (3, 'Notice'), (0, 'more')])
+    document_levels = [HeadingStyles.of(Document(path)).level(paragraph._p) for paragraph in Document(path).paragraphs]
+    with DocxStream(path) as stream:
+        stream_levels = [stream.heading_level(block) for block in stream.iter_block_items()]
+    assert stream_levels == document_levels == [1, None, 2, 3, None]
@@ -0,0 +1,98 @@
+import json
+import threading
+from app.modules import jobs as jobs_module
+from conftest import upload, wait_for
+
+
+def sse_events(text):
+    # (id, event, data) of each message of a Server-Sent Events stream
+    events = []
+    for message in text.strip().split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in message.splitlines())
+        if 'event' in fields:
+            events.append((int(fields['id']), fields['event'], json.loads(fields['data'])))
+    return events
+
+
+def finished_job(client, make_docx):
+    paths = [make_docx([(1, 'Intro'), (0, 'text')], name) for name in ('one.docx', 'two.docx')]
+    body = upload(client, paths, parseDoc=True, parseLevel=1, **{'async': True}).get_json()
+    wait_for(client, body['statusUrl'])
+    return body['statusUrl'] + '/events'
+
+
+def test_sse_stream_replays_the_job(client, make_docx):
+    url = finished_job(client, make_docx)
+    response = client.get(url)
+    assert response.mimetype == 'text/event-stream'
+    text = response.get_data(as_text=True)
+    assert text.startswith('retry: ')
+    events = sse_events(text)
+    assert [event for _, event, _ in events] == ['job', 'job', 'stage', 'file', 'file', 'stage', 'job']
+    assert sorted(data['file'] for _, event, data in events if event == 'file') == ['one.docx', 'two.docx']
+    assert events[-1][2]['state'] == 'completed'
+
+    # A reconnecting EventSource gets what it missed
+    resumed = sse_events(client.get(url, headers={'Last-Event-ID': str(events[2][0])}).get_data(as_text=True))
+    assert resumed == events[3:]
+
+
+def test_ndjson_stream_resumes_after_a_seq(client, make_docx):
+    url = finished_job(client, make_docx)
+    response = client.get(f'{url}?format=ndjson')
+    assert response.mimetype == 'application/x-ndjson'
+    events = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [event['seq'] for event in events] == sorted(event['seq'] for event in events)
+    assert events[-1]['event'] == 'job' and events[-1]['state'] == 'completed'
+    later = client.get(f"{url}?format=ndjson&after={events[-2]['seq']}").get_data(as_text=True)
+    assert [json.loads(line) for line in later.splitlines()] == events[-1:]
+
+
+def test_stream_follows_a_running_job(make_app, make_docx, monkeypatch):
+    app = make_app(JOB_EVENTS_POLL_INTERVAL=0.01)
+    release = threading.Event()
+    run_pipeline = jobs_module.run_pipeline
+
+    def held_pipeline(*args, **kwargs):
+        release.wait(10)
+        return run_pipeline(*args, **kwargs)
+    monkeypatch.setattr(jobs_module, 'run_pipeline', held_pipeline)
+    client = app.test_client()
+    path = make_docx([(1, 'Intro'), (0, 'text')])
+    body = upload(client, [path], parseDoc=True, parseLevel=1, **{'async': True}).get_json()
+
+    response = client.get(f"{body['statusUrl']}/events?format=ndjson", buffered=False)
+    lines = response.response
+    first = json.loads(next(lines))
+    assert (first['event'], first['state']) == ('job', 'queued')
+    release.set()
+    events = [first] + [json.loads(line) for line in lines]
+    assert events[-1]['state'] == 'completed'
+    response.close()
+
+
+def test_stream_ends_after_max_seconds(make_app, make_docx, monkeypatch):
+    app = make_app(JOB_EVENTS_POLL_INTERVAL=0.01, JOB_EVENTS_MAX_SECONDS=0.1)
+    release = threading.Event()
+    run_pipeline = jobs_module.run_pipeline
+
+    def held_pipeline(*args, **kwargs):
+        release.wait(10)
+        return run_pipeline(*args, **kwargs)
+    monkeypatch.setattr(jobs_module, 'run_pipeline', held_pipeline)
+    client = app.test_client()
+    path = make_docx([(1, 'Intro'), (0, 'text')])
+    body = upload(client, [path], parseDoc=True, parseLevel=1, **{'async': True}).get_json()
+    try:
+        text = client.get(f"{body['statusUrl']}/events?format=ndjson").get_data(as_text=True)
+        assert all(json.loads(line)['event'] == 'job' for line in text.splitlines())
+        assert json.loads(text.splitlines()[-1])['state'] != 'completed'
+    finally:
+        release.set()
+    wait_for(client, body['statusUrl'])
+
+
+def test_event_stream_errors(client, make_docx):
+    assert client.get('/api/jobs/missing/events').status_code == 404
+    url = finished_job(client, make_docx)
+    assert client.get(url, headers={'Last-Event-ID': 'x'}).status_code == 400
@@ -0,0 +1,25 @@
+from conftest import upload, wait_for
+
+
+def test_async_upload_runs_as_a_job(client, make_docx):
+    path = make_docx([(1, 'Intro'), (0, 'payment terms')])
+    response = upload(client, [path], parseDoc=True, parseLevel=1, **{'async': True})
+    assert response.status_code == 202
+    body = response.get_json()
+    status = wait_for(client, body['statusUrl'])
+    assert status['state'] == 'completed'
+    assert status['progress']['parse']['done'] == 1
+    assert status['result']['batchId'] == body['batchId']
+
+
+def test_finished_job_cannot_be_cancelled(client, make_docx):
+    path = make_docx([(1, 'Intro'), (0, 'text')])
+    body = upload(client, [path], parseDoc=True, parseLevel=1, **{'async': True}).get_json()
+    wait_for(client, body['statusUrl'])
+    assert client.post(f"{body['statusUrl']}/cancel").status_code == 409
+
+
+def test_unknown_job(client):
+    assert client.get('/api/jobs/missing').status_code == 404
+    assert client.post('/api/jobs/missing/cancel').status_code == 404
+
@@ -0,0 +1,63 @@
+import pytest
+from app.modules import job_store
+from app.modules.job_store import JobStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(str(tmp_path / 'jobs.sqlite3'))
+
+
+def test_job_lifecycle(store):
+    store.create('job', {'parse_doc': True}, ['a.docx', 'b.docx'], {'parse': ['a.docx', 'b.docx']})
+    assert store.active_jobs() == {'job'}
+    assert store.start('job')
+    assert not store.start('job')
+    store.set_file_state('job', 'a.docx', 'parse', job_store.COMPLETED)
+    store.set_file_state('job', 'b.docx', 'parse', job_store.FAILED, 'broken')
+    store.set_state('job', job_store.COMPLETED, result={'ok': True}, status_code=200)
+
+    job = store.get('job')
+    assert job['state'] == job_store.COMPLETED
+    assert job['result'] == {'ok': True}
+    assert job['progress']['parse'] == {
+        'total': 2, 'done': 1, 'failed': 1,
+        'files': [{'file': 'a.docx', 'state': 'completed', 'error': None},
+                  {'file': 'b.docx', 'state': 'failed', 'error': 'broken'}],
+    }
+    assert store.active_jobs() == set()
+
+
+def test_cancel(store):
+    store.create('queued', {}, [], {})
+    store.create('running', {}, [], {})
+    store.start('running')
+    assert store.request_cancel('queued') == job_store.CANCELLED
+    assert store.request_cancel('running') == job_store.RUNNING
+    assert store.cancel_requested('running')
+    store.set_state('running', job_store.CANCELLED)
+    assert store.request_cancel('running') is None
+
+
+def test_events_resume_after_a_sequence_number(store):
+    store.create('job', {}, [], {})
+    for index in range(3):
+        store.add_event('job', 'file', {'index': index})
+    events = store.events('job')
+    assert [data['index'] for _, _, data in events] == [0, 1, 2]
+    assert [data['index'] for _, _, data in store.events('job', after=events[0][0])] == [1, 2]
+
+
+def test_orphaned_jobs_are_those_of_this_or_dead_processes(store, monkeypatch):
+    store.create('job', {}, [], {})
+    assert store.orphaned_jobs() == ['job']
+    monkeypatch.setattr(job_store.os, 'getpid', lambda: -1)
+    monkeypatch.setattr(job_store, 'pid_alive', lambda pid: True)
+    assert store.orphaned_jobs() == []
+
+
+def test_delete(store):
+    store.create('job', {}, ['a.docx'], {'parse': ['a.docx']})
+    store.add_event('job', 'job', {})
+    store.delete('job')
+    assert store.get('job') is None and store.events('job') == []
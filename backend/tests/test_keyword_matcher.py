@@ -0,0 +1,39 @@
+import random
+from collections import Counter
+from app.modules.keyword_matcher import KeywordMatcher, compile_keywords, keywords_digest
+
+TEXT = "the supplier's subcontractor must keep confidentiality; contractors too"
+
+
+def test_find_matches_substring_semantics_on_both_paths(monkeypatch):
+    rng = random.Random(0)
+    keywords = ['contract', 'contractor', 'confidentiality', 'keep', 'missing', 'contract', ''] + \
+        [''.join(rng.choice('abcdefg') for _ in range(5)) for _ in range(300)]
+    expected = [keyword for keyword in keywords if keyword in TEXT]
+    assert KeywordMatcher(keywords).find(TEXT) == expected
+    # Small sets are scanned with `in`; force the automaton for the same set
+    monkeypatch.setattr(KeywordMatcher, 'SUBSTRING_SCAN_LIMIT', 0)
+    assert KeywordMatcher(keywords).find(TEXT) == expected
+
+
+def test_whole_words():
+    matcher = KeywordMatcher(['contract', 'contractors', 'keep'], whole_words=True)
+    assert matcher.find(TEXT) == ['contractors', 'keep']
+
+
+def test_count_and_positions_include_overlaps():
+    matcher = KeywordMatcher(['ana', 'nan'])
+    assert matcher.count('banana') == Counter({'ana': 2, 'nan': 1})
+    assert matcher.positions('banana') == {'ana': [1, 3], 'nan': [2]}
+
+
+def test_digest_depends_on_keywords_and_mode():
+    assert KeywordMatcher(['a', 'b']).digest == keywords_digest(['a', 'b'])
+    assert keywords_digest(['a', 'b']) != keywords_digest(['ab'])
+    assert keywords_digest(['a']) != keywords_digest(['a'], whole_words=True)
+
+
+def test_compile_keywords_passes_matchers_through():
+    matcher = KeywordMatcher(['a'])
+    assert compile_keywords(matcher) is matcher
+
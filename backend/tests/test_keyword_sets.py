@@ -0,0 +1,79 @@
+import io
+import os
+from app.modules.keyword_matcher import KeywordMatcher
+from app.modules.keyword_sets import MatcherCache, keyword_sets
+from conftest import upload
+
+
+def create_set(client, content, name='contracts', filename='keywords.txt'):
+    return client.post('/api/keyword-sets', data={'name': name, 'file': (io.BytesIO(content), filename)},
+                       content_type='multipart/form-data')
+
+
+def test_keyword_set_lifecycle(client):
+    response = create_set(client, b'Payment\nnotice\n\n')
+    assert response.status_code == 201
+    record = response.get_json()
+    assert (record['name'], record['count']) == ('contracts', 2)
+    set_id = record['id']
+
+    assert client.get('/api/keyword-sets').get_json()['keywordSets'] == [record]
+    assert client.get(f'/api/keyword-sets/{set_id}?keywords=true').get_json()['keywords'] == ['payment', 'notice']
+
+    response = client.put(f'/api/keyword-sets/{set_id}', data={'file': (io.BytesIO(b'term,x\nclause,y\n'), 'k.csv')},
+                          content_type='multipart/form-data')
+    assert response.status_code == 200
+    replaced = response.get_json()
+    assert (replaced['name'], replaced['created_at'], replaced['count']) == ('contracts', record['created_at'], 2)
+    assert replaced['hash'] != record['hash']
+    assert client.get(f'/api/keyword-sets/{set_id}?keywords=true').get_json()['keywords'] == ['term', 'clause']
+    # The replaced keywords are gone from the folder
+    assert len(os.listdir(keyword_sets.folder)) == 2
+
+    assert client.delete(f'/api/keyword-sets/{set_id}').status_code == 204
+    assert client.get(f'/api/keyword-sets/{set_id}').status_code == 404
+    assert os.listdir(keyword_sets.folder) == []
+
+
+def test_keyword_set_errors(client):
+    assert client.post('/api/keyword-sets', data={}, content_type='multipart/form-data').status_code == 400
+    assert create_set(client, b'payment', filename='keywords.docx').status_code == 400
+    for set_id in ('missing', '0' * 32):
+        assert client.get(f'/api/keyword-sets/{set_id}').status_code == 404
+        assert client.delete(f'/api/keyword-sets/{set_id}').status_code == 404
+    response = client.put('/api/keyword-sets/' + '0' * 32, data={'file': (io.BytesIO(b'a'), 'k.txt')},
+                          content_type='multipart/form-data')
+    assert response.status_code == 404
+
+
+def test_uploads_tag_with_a_keyword_set(client, make_docx):
+    set_id = create_set(client, b'payment\nnotice\nmissing\n').get_json()['id']
+    path = make_docx([(1, 'Terms'), (0, 'payment is due after notice')])
+    response = upload(client, [path], keywordTag=True, keywordSetId=set_id)
+    assert response.status_code == 200
+    [result] = [result for result in response.get_json()['results'] if 'tags' in result]
+    assert sorted(result['tags']) == ['notice', 'payment']
+    # The second upload reuses the compiled matcher
+    hits = keyword_sets.matchers.stats()['hits']
+    upload(client, [path], keywordTag=True, keywordSetId=set_id)
+    assert keyword_sets.matchers.stats()['hits'] == hits + 1
+
+    assert upload(client, [path], keywordTag=True, keywordSetId='0' * 32).status_code == 404
+
+
+def test_matcher_cache_reuses_and_evicts():
+    cache = MatcherCache(max_bytes=10 ** 9)
+    first = cache.get(['alpha', 'beta'])
+    assert cache.get(['alpha', 'beta']) is first
+    assert cache.get(['alpha', 'beta'], whole_words=True) is not first
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses']) == (1, 2)
+
+    # Room for one of two matchers: the least recently used goes
+    alpha_size = KeywordMatcher(['alpha']).approx_bytes()
+    small = MatcherCache(max_bytes=alpha_size + 10)
+    small.get(['alpha'])
+    small.get(['betx'])
+    assert small.stats()['evictions'] == 1 and small.stats()['entries'] == 1
+    # Larger than the whole cache: built but not kept
+    assert MatcherCache(max_bytes=1).get(['alpha']) is not None
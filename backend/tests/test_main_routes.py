@@ -0,0 +1,17 @@
+from app.modules.template_cache import new_document
+
+
+def test_template_cache_stats(client):
+    before = client.get('/api/template-cache/stats').get_json()
+    new_document()
+    after = client.get('/api/template-cache/stats').get_json()
+    assert after['documents'] == before['documents'] + 1
+    assert after['template'] is None
+    assert after['load_seconds'] > 0
+
+
+def test_stats_endpoints(client):
+    for name in ('cache', 'storage', 'scheduler', 'keyword-cache'):
+        response = client.get(f'/api/{name}/stats')
+        assert response.status_code == 200, name
+        assert isinstance(response.get_json(), dict)
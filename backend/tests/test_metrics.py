@@ -0,0 +1,31 @@
+from concurrent.futures import ThreadPoolExecutor
+from app.modules import metrics
+
+
+def test_propagate_records_into_the_callers_timings():
+    timings = metrics.Timings()
+    with timings.activate(), ThreadPoolExecutor(1) as executor:
+        executor.submit(metrics.propagate(metrics.record), 'zip', 0.5).result()
+    assert timings.snapshot()['observations'] == [('zip', 0.5)]
+
+
+def test_propagate_without_the_profiler_hook(monkeypatch):
+    # As before the profiler module registers its wrapper
+    monkeypatch.setattr(metrics, '_call_wrappers', [])
+    timings = metrics.Timings()
+    with timings.activate(), ThreadPoolExecutor(1) as executor:
+        assert executor.submit(metrics.propagate(lambda: metrics.record('zip', 0.25) or 'done')).result() == 'done'
+    assert timings.snapshot()['observations'] == [('zip', 0.25)]
+
+
+def test_propagate_runs_registered_call_wrappers(monkeypatch):
+    calls = []
+
+    def wrapper(fn, *args, **kwargs):
+        calls.append(args)
+        return fn(*args, **kwargs)
+    monkeypatch.setattr(metrics, '_call_wrappers', [])
+    metrics.wrap_calls(wrapper)
+    metrics.wrap_calls(wrapper)
+    assert metrics.propagate(lambda a, b: a + b)(1, 2) == 3
+    assert calls == [(1, 2)]
@@ -0,0 +1,49 @@
+import re
+from conftest import upload
+
+SAMPLE = re.compile(r'^(\w+)(?:\{(.*)\})? (\S+)$')
+
+
+def scrape(client):
+    # {(name, labels): value} of every sample, and the declared type of each family
+    response = client.get('/api/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    samples = {}
+    types = {}
+    for line in response.get_data(as_text=True).splitlines():
+        if line.startswith('# TYPE '):
+            _, _, name, kind = line.split(' ')
+            types[name] = kind
+        elif not line.startswith('#'):
+            name, labels, value = SAMPLE.match(line).groups()
+            samples[(name, labels or '')] = float(value)
+    return samples, types
+
+
+def test_metrics_count_a_batch(client, make_docx):
+    before, _ = scrape(client)
+    path = make_docx([(1, 'Intro'), (0, 'text'), (1, 'Terms'), (0, 'more text')])
+    response = upload(client, [path], parseDoc=True, parseLevel=1).get_json()
+    assert response['timings']['counts']['sections'] == 2
+    after, types = scrape(client)
+
+    def delta(name, labels=''):
+        return after.get((name, labels), 0) - before.get((name, labels), 0)
+    assert delta('parser_documents_total') == 1
+    assert delta('parser_sections_total') == 2
+    assert delta('parser_batch_seconds_count', 'outcome="completed"') == 1
+    assert delta('parser_stage_seconds_count', 'stage="save_docx"') == 2
+    assert types['parser_stage_seconds'] == 'histogram'
+    assert types['parser_documents_total'] == 'counter'
+
+
+def test_histogram_buckets_are_cumulative(client, make_docx):
+    upload(client, [make_docx([(1, 'Intro'), (0, 'text')])], parseDoc=True, parseLevel=1)
+    samples, _ = scrape(client)
+    buckets = [(labels, value) for (name, labels), value in samples.items()
+               if name == 'parser_stage_seconds_bucket' and labels.startswith('stage="save_docx"')]
+    counts = [value for _, value in buckets]
+    assert counts == sorted(counts)
+    assert buckets[-1][0].endswith('le="+Inf"')
+    assert counts[-1] == samples[('parser_stage_seconds_count', 'stage="save_docx"')]
@@ -0,0 +1,69 @@
+import os
+import threading
+import zipfile
+import pytest
+from docx import Document
+from app.modules import output_sink
+from app.modules.output_sink import DirectorySink, MemorySink, ZipSink, read_location
+
+
+def test_zip_sink_streams_members(tmp_path, monkeypatch):
+    monkeypatch.setattr(output_sink, 'SPOOL_MAX_BYTES', 16)
+    archive = str(tmp_path / 'out.zip')
+    with ZipSink(archive) as sink:
+        with sink.open('doc/sections.ndjson') as stream:
+            for index in range(1000):
+                stream.write(f'{{"section": {index}}}\n'.encode())
+            # Past the in-memory limit the stream is a file on disk
+            assert stream._rolled
+        sink.save('doc/section.docx', Document())
+    with zipfile.ZipFile(archive) as zf:
+        assert zf.namelist() == ['doc/sections.ndjson', 'doc/section.docx']
+        lines = zf.read('doc/sections.ndjson').decode().splitlines()
+        assert lines[0] == '{"section": 0}' and len(lines) == 1000
+        assert zf.getinfo('doc/sections.ndjson').compress_type == zipfile.ZIP_DEFLATED
+        assert zf.getinfo('doc/section.docx').compress_type == zipfile.ZIP_STORED
+    assert sink.paths('doc/') == ['doc/sections.ndjson', 'doc/section.docx']
+
+
+def test_zip_sink_takes_other_members_while_a_stream_is_open(tmp_path):
+    sink = ZipSink(str(tmp_path / 'out.zip'))
+    with sink.open('a.ndjson') as stream:
+        stream.write(b'{}\n')
+        writer = threading.Thread(target=sink.write, args=('b.txt', b'b'))
+        writer.start()
+        writer.join(5)
+        assert not writer.is_alive()
+    sink.close()
+    with zipfile.ZipFile(sink.zip_path) as zf:
+        assert sorted(zf.namelist()) == ['a.ndjson', 'b.txt']
+
+
+def test_zip_sink_drops_a_stream_that_fails(tmp_path):
+    sink = ZipSink(str(tmp_path / 'out.zip'))
+    with pytest.raises(ValueError):
+        with sink.open('a.ndjson') as stream:
+            stream.write(b'partial')
+            raise ValueError('export failed')
+    sink.close()
+    with zipfile.ZipFile(sink.zip_path) as zf:
+        assert zf.namelist() == []
+    assert sink.paths() == []
+
+
+def test_directory_sink_writes_the_tree(tmp_path):
+    sink = DirectorySink(str(tmp_path))
+    sink.write('a/b/c.txt', b'data')
+    with sink.open('a/d.ndjson') as stream:
+        stream.write(b'{}\n')
+    assert read_location(sink.location('a/b/c.txt')) == b'data'
+    assert os.path.getsize(tmp_path / 'a' / 'd.ndjson') == 3
+    assert sink.bytes_written == 7
+
+
+def test_memory_sink_keeps_files(tmp_path):
+    sink = MemorySink()
+    with sink.open('a.ndjson') as stream:
+        stream.write(b'{}\n')
+    assert sink.files == {'a.ndjson': b'{}\n'}
+    assert sink.location('a.ndjson') is None
@@ -0,0 +1,57 @@
+import io
+import os
+import zipfile
+import pytest
+from app.modules.jobs import result_outputs
+from conftest import upload
+
+DOCUMENT = [(1, 'Intro'), (0, 'intro text'), (2, 'Scope'), (0, 'scope text'), (1, 'Terms'), (0, 'payment term')]
+
+
+def download_urls(app, response):
+    batch_folder = os.path.join(app.config['RESULTS_FOLDER'], response['batchId'])
+    urls = [folder['zipUrl'] for folder in response['processedFolders']]
+    for result in response['results']:
+        if 'output_folder' in result:
+            urls.extend(output['url'] for output in result_outputs(response['batchId'], batch_folder, result))
+        if 'summary_file' in result:
+            urls.append(f"/api/download/{response['batchId']}/{result['summary_file']}")
+    return urls
+
+
+def test_directory_sink_cache_hit_restores_the_section_tree(make_app, make_docx):
+    app = make_app(OUTPUT_SINK='directory', RESULT_CACHE_MAX_BYTES=1024 * 1024)
+    path = make_docx(DOCUMENT)
+    client = app.test_client()
+    first = upload(client, [path], parseDoc=True, parseLevel=2, createSummary=True, minCount=0).get_json()
+    second = upload(client, [path], parseDoc=True, parseLevel=2, createSummary=True, minCount=0).get_json()
+    assert second.get('cached')
+
+    first_urls = download_urls(app, first)
+    second_urls = download_urls(app, second)
+    assert len(second_urls) == len(first_urls) > 3
+    for url in second_urls:
+        assert client.get(url).status_code == 200, url
+
+
+def test_zip_sink_batch_archive(client, make_docx):
+    path = make_docx(DOCUMENT)
+    response = upload(client, [path], parseDoc=True, parseLevel=1).get_json()
+    archive = client.get(response['processedFolders'][0]['zipUrl'])
+    assert archive.status_code == 200
+    with zipfile.ZipFile(io.BytesIO(archive.data)) as zf:
+        assert sorted(zf.namelist()) == ['document/Intro.docx', 'document/Terms.docx']
+    assert response['results'][0]['outputs'] == ['document/Intro.docx', 'document/Terms.docx']
+
+
+@pytest.mark.parametrize('settings', [{'STREAMING_PARSE': False}, {'OUTPUT_SINK': 'directory'},
+                                      {'EXECUTOR_BACKEND': 'process'}])
+def test_cache_entries_are_kept_apart_by_output_settings(make_app, make_docx, settings):
+    path = make_docx(DOCUMENT)
+    first = upload(make_app(RESULT_CACHE_MAX_BYTES=1024 * 1024).test_client(), [path], parseDoc=True, parseLevel=1)
+    client = make_app(RESULT_CACHE_MAX_BYTES=1024 * 1024, **settings).test_client()
+    second = upload(client, [path], parseDoc=True, parseLevel=1).get_json()
+    assert first.status_code == 200 and not second.get('cached')
+    third = upload(client, [path], parseDoc=True, parseLevel=1).get_json()
+    assert third.get('cached')
+    assert 'seconds' not in third['results'][0] and 'sections' not in third
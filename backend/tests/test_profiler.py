@@ -0,0 +1,32 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from app.modules import metrics
+from app.modules.profiler import BatchProfiler, run_profiled
+
+
+def test_propagated_calls_join_the_batch_profile():
+    profiler = BatchProfiler(interval=0.001)
+
+    def profiled_thread():
+        return threading.get_ident() in profiler._threads
+
+    with profiler.activate(), ThreadPoolExecutor(1) as executor:
+        assert executor.submit(metrics.propagate(profiled_thread)).result()
+        assert not executor.submit(profiled_thread).result()
+
+
+def test_profiler_hook_passes_through_without_an_active_profile():
+    assert run_profiled in metrics._call_wrappers
+    calls = []
+    with ThreadPoolExecutor(1) as executor:
+        assert executor.submit(metrics.propagate(lambda value: calls.append(value) or value), 3).result() == 3
+    assert calls == [3]
+
+
+def test_profiled_batch_writes_its_profile(tmp_path):
+    profiler = BatchProfiler(interval=0.001)
+    with profiler.activate(), ThreadPoolExecutor(1) as executor:
+        executor.submit(metrics.propagate(sum), range(100000)).result()
+    written = profiler.write(str(tmp_path))
+    assert sorted(written) == sorted(path.name for path in tmp_path.iterdir())
+    assert 'profile.collapsed' in written
@@ -0,0 +1,70 @@
+import os
+import pytest
+from app.modules.result_cache import ResultCache, result_cache_key
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ResultCache()
+    cache.init_app(type('App', (), {'config': {'RESULT_CACHE_FOLDER': str(tmp_path / 'cache'),
+                                               'RESULT_CACHE_MAX_BYTES': 1024 * 1024}})())
+    return cache
+
+
+def make_batch(folder, files):
+    for path, data in files.items():
+        full_path = os.path.join(folder, path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path, 'w') as f:
+            f.write(data)
+
+
+def test_put_and_get_rewrite_the_batch(cache, tmp_path):
+    old_folder = str(tmp_path / 'results' / 'old-batch')
+    new_folder = str(tmp_path / 'results' / 'new-batch')
+    make_batch(old_folder, {'archive.zip': 'zip', 'doc/Intro.docx': 'docx'})
+    os.makedirs(new_folder)
+    response = {'batchId': 'old-batch', 'zipUrl': '/api/download/old-batch/archive.zip'}
+    cache.put('key', 'old-batch', old_folder, ['archive.zip', 'doc/Intro.docx'], response)
+
+    cached = cache.get('key', 'new-batch', new_folder)
+    assert cached == {'batchId': 'new-batch', 'zipUrl': '/api/download/new-batch/archive.zip', 'cached': True}
+    assert os.path.samefile(os.path.join(new_folder, 'doc', 'Intro.docx'),
+                            os.path.join(old_folder, 'doc', 'Intro.docx'))
+    assert cache.get('other', 'new-batch', new_folder) is None
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['stores']) == (1, 1, 1)
+
+
+def test_least_recently_used_entries_are_evicted(cache, tmp_path):
+    # Room for one entry of about 670 bytes
+    cache.max_bytes = 1000
+    for index in range(3):
+        folder = str(tmp_path / f'batch-{index}')
+        make_batch(folder, {'nested/file.txt': 'x' * 600})
+        cache.put(f'key-{index}', f'batch-{index}', folder, ['nested/file.txt'], {})
+        os.utime(os.path.join(cache.folder, f'key-{index}'), (index, index))
+    cache.evict()
+    assert sorted(name for name in os.listdir(cache.folder) if not name.startswith('.')) == ['key-2']
+
+
+def test_key_depends_on_files_keywords_and_options():
+    options = {'parse_doc': True, 'parse_level': 1}
+    key = result_cache_key([('a.docx', 'digest')], None, options)
+    assert key == result_cache_key([('a.docx', 'digest')], None, dict(options))
+    assert key != result_cache_key([('b.docx', 'digest')], None, options)
+    assert key != result_cache_key([('a.docx', 'digest')], None, dict(options, parse_level=2))
+    assert key != result_cache_key([('a.docx', 'digest')], None, options, {'streaming': False})
+
+
+def test_stored_responses_leave_out_run_fields(cache, tmp_path):
+    folder = str(tmp_path / 'old-batch')
+    make_batch(folder, {'archive.zip': 'zip'})
+    response = {'batchId': 'old-batch', 'sections': {'reused': 1, 'rebuilt': 2},
+                'results': [{'file': 'a.docx', 'output_folder': 'a', 'seconds': 0.5,
+                             'sections_reused': 1, 'sections_rebuilt': 2}, {'summary_file': 'summary.xlsx'}]}
+    cache.put('key', 'old-batch', folder, ['archive.zip'], response)
+    cached = cache.get('key', 'new-batch', str(tmp_path / 'new-batch'))
+    assert cached == {'batchId': 'new-batch', 'cached': True,
+                      'results': [{'file': 'a.docx', 'output_folder': 'a'}, {'summary_file': 'summary.xlsx'}]}
+    assert response['results'][0]['seconds'] == 0.5
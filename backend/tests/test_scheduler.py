@@ -0,0 +1,102 @@
+import threading
+from app.modules import metrics
+from app.modules.scheduler import WorkScheduler, scheduler
+from conftest import upload
+
+
+def test_batches_take_turns():
+    scheduler = WorkScheduler()
+    scheduler.workers = 1
+    started = threading.Event()
+    gate = threading.Event()
+    order = []
+
+    def block():
+        started.set()
+        gate.wait()
+    # Occupies the only worker until every task is queued
+    blocker = scheduler.submit(block)
+    started.wait(5)
+    futures = [scheduler.submit(order.append, f'large-{index}', batch='large') for index in range(3)]
+    futures += [scheduler.submit(order.append, f'small-{index}', batch='small') for index in range(2)]
+    gate.set()
+    for future in [blocker] + futures:
+        future.result(5)
+    assert order == ['large-0', 'small-0', 'large-1', 'small-1', 'large-2']
+
+
+def test_admit_refuses_past_max_queued():
+    scheduler = WorkScheduler()
+    scheduler.workers = 1
+    scheduler.max_queued = 2
+    scheduler.retry_after = 7
+    assert scheduler.admit(100) is None
+    started = threading.Event()
+    gate = threading.Event()
+
+    def block():
+        started.set()
+        gate.wait()
+    futures = [scheduler.submit(block)]
+    started.wait(5)
+    futures += [scheduler.submit(gate.wait) for _ in range(2)]
+    try:
+        assert scheduler.admit(1) == 7
+        assert scheduler.stats()['queued'] == 2 and scheduler.stats()['running'] == 1
+    finally:
+        gate.set()
+        for future in futures:
+            future.result(5)
+
+
+def test_errors_reach_the_future():
+    scheduler = WorkScheduler()
+    scheduler.workers = 1
+    future = scheduler.submit(int, 'not a number')
+    assert isinstance(future.exception(5), ValueError)
+
+
+def test_metrics_are_registered_once(make_app):
+    for _ in range(3):
+        WorkScheduler()
+        make_app()
+    text = metrics.registry.render()
+    families = [line.split(' ')[2] for line in text.splitlines() if line.startswith('# TYPE ')]
+    assert len(families) == len(set(families))
+    assert 'parser_scheduler_queued_tasks' in families
+
+
+def rejected_total():
+    [line] = [line for line in metrics.registry.render().splitlines()
+              if line.startswith('parser_scheduler_rejected_total ')]
+    return float(line.split(' ')[1])
+
+
+def test_uploads_are_refused_while_the_queue_is_full(make_app, make_docx):
+    app = make_app(MAX_QUEUED_DOCUMENTS=1, QUEUE_RETRY_AFTER=9)
+    client = app.test_client()
+    path = make_docx([(1, 'Intro'), (0, 'text')])
+    # Every worker busy and one task waiting
+    workers = len(scheduler._threads)
+    started = threading.Semaphore(0)
+    gate = threading.Event()
+
+    def block():
+        started.release()
+        gate.wait()
+    futures = [scheduler.submit(block) for _ in range(workers)]
+    try:
+        for _ in range(workers):
+            assert started.acquire(timeout=5)
+        futures.append(scheduler.submit(gate.wait))
+        rejected = rejected_total()
+        response = upload(client, [path], parseDoc=True, parseLevel=1)
+        assert response.status_code == 429
+        assert response.headers['Retry-After'] == '9'
+        assert response.get_json()['retryAfter'] == 9
+        assert rejected_total() == rejected + 1
+    finally:
+        gate.set()
+        for future in futures:
+            future.result(5)
+    assert upload(client, [path], parseDoc=True, parseLevel=1).status_code == 200
@@ -0,0 +1,62 @@
+import io
+import json
+from docx import Document
+from app.modules.section_export import SectionExporter
+
+
+def exported(doc, level, h1, h2, h3, content, keywords=None):
+    stream = io.BytesIO()
+    SectionExporter(stream, 'document.docx', keywords).write(level, h1, h2, h3, content)
+    return json.loads(stream.getvalue())
+
+
+def test_paragraph_records_carry_style_and_spans():
+    doc = Document()
+    paragraph = doc.add_paragraph(style='List Bullet')
+    paragraph.add_run('plain ')
+    paragraph.add_run('bold').bold = True
+    paragraph.add_run(' ')
+    paragraph.add_run('both').italic = True
+    paragraph.runs[-1].bold = True
+    off = paragraph.add_run(' off')
+    off.bold = False
+    table = doc.add_table(rows=1, cols=2)
+    table.cell(0, 0).text = 'a'
+    table.cell(0, 1).text = 'b'
+
+    record = exported(doc, 3, 'Intro', 'Terms', 'Notice', [paragraph, table])
+    assert record['document'] == 'document.docx'
+    assert record['level'] == 3 and record['headings'] == ['Intro', 'Terms', 'Notice']
+    assert record['blocks'] == [
+        {'type': 'paragraph', 'style': 'List Bullet', 'text': 'plain bold both off',
+         'spans': [{'start': 6, 'end': 10, 'bold': True}, {'start': 11, 'end': 15, 'bold': True, 'italic': True}]},
+        {'type': 'table', 'rows': [['a', 'b']]},
+    ]
+
+
+def test_level_one_records_nest_lower_headings_and_tags():
+    doc = Document()
+    first = doc.add_paragraph('Force majeure applies')
+    second = doc.add_paragraph('Payment terms')
+    content = {'': {'': [first]}, 'Scope': {'': [], 'Notice': [second]}}
+    record = exported(doc, 1, 'Intro', '', '', content, ['force majeure', 'notice', 'absent'])
+    assert record['headings'] == ['Intro']
+    assert [(block['type'], block.get('level'), block['text']) for block in record['blocks']] == [
+        ('paragraph', None, 'Force majeure applies'), ('heading', 2, 'Scope'), ('heading', 3, 'Notice'),
+        ('paragraph', None, 'Payment terms'),
+    ]
+    assert record['tags'] == ['force majeure', 'notice']
+
+
+def test_bodies_are_serialized_once_per_write_pass():
+    doc = Document()
+    blocks = [doc.add_paragraph('shared')]
+    stream = io.BytesIO()
+    exporter = SectionExporter(stream, 'document.docx')
+    exporter.write(3, 'Intro', 'Scope', '', blocks)
+    exporter.write(2, 'Intro', 'Scope', '', {'': blocks})
+    assert len(exporter._bodies) == 1
+    exporter.release_bodies()
+    assert not exporter._bodies
+    records = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert records[0]['blocks'] == records[1]['blocks']
@@ -0,0 +1,113 @@
+import json
+import os
+import threading
+from docx import Document
+from app.modules.document_parser import parse_docx
+from app.modules.output_sink import ZipSink
+from app.modules.section_manifest import SectionManifest
+from conftest import upload
+
+ORIGINAL = [(1, 'Intro'), (0, 'intro text'), (1, 'Terms'), (0, 'payment term'), (1, 'Notice'), (0, 'notice text')]
+EDITED = [(1, 'Intro'), (0, 'intro text'), (1, 'Terms'), (0, 'payment terms changed'), (1, 'Notice'), (0, 'notice text')]
+OTHER = [(1, 'Summary'), (0, 'another document with the same name')]
+
+
+def texts(path):
+    return [paragraph.text for paragraph in Document(path).paragraphs]
+
+
+def test_unchanged_sections_are_reused(make_docx, tmp_path):
+    manifests = str(tmp_path / 'manifests')
+    os.makedirs(manifests)
+    first = parse_docx(make_docx(ORIGINAL, 'report.docx'), str(tmp_path / 'one'), 1, None, manifest_folder=manifests)
+    assert first[1] == {'reused': 0, 'rebuilt': 3}
+
+    second_folder, sections = parse_docx(make_docx(EDITED, 'report.docx'), str(tmp_path / 'two'), 1, None,
+                                         manifest_folder=manifests)
+    assert sections == {'reused': 2, 'rebuilt': 1}
+    assert texts(os.path.join(second_folder, 'Intro.docx')) == ['Intro', 'intro text']
+    assert texts(os.path.join(second_folder, 'Terms.docx')) == ['Terms', 'payment terms changed']
+
+
+def test_reuse_depends_on_the_parse_level_and_keywords(make_docx, tmp_path):
+    manifests = str(tmp_path / 'manifests')
+    os.makedirs(manifests)
+    path = make_docx(ORIGINAL, 'report.docx')
+    parse_docx(path, str(tmp_path / 'one'), 1, None, manifest_folder=manifests)
+    assert parse_docx(path, str(tmp_path / 'two'), 2, None, manifest_folder=manifests)[1]['reused'] == 0
+    assert parse_docx(path, str(tmp_path / 'three'), 1, ['payment'], manifest_folder=manifests)[1]['reused'] == 0
+    assert parse_docx(path, str(tmp_path / 'four'), 1, None, manifest_folder=manifests)[1]['reused'] == 3
+
+
+def test_reuse_from_an_archive(make_docx, tmp_path):
+    manifests = str(tmp_path / 'manifests')
+    os.makedirs(manifests)
+    with ZipSink(str(tmp_path / 'one.zip')) as sink:
+        parse_docx(make_docx(ORIGINAL, 'report.docx'), str(tmp_path), 1, None, sink=sink, manifest_folder=manifests)
+    with ZipSink(str(tmp_path / 'two.zip')) as sink:
+        sections = parse_docx(make_docx(EDITED, 'report.docx'), str(tmp_path), 1, None, sink=sink,
+                              manifest_folder=manifests)[1]
+        assert sorted(sink.paths()) == ['report/Intro.docx', 'report/Notice.docx', 'report/Terms.docx']
+    assert sections == {'reused': 2, 'rebuilt': 1}
+
+
+def test_documents_sharing_a_name_keep_each_others_sections(make_docx, tmp_path):
+    manifests = str(tmp_path / 'manifests')
+    os.makedirs(manifests)
+    first = make_docx(ORIGINAL, 'report.docx')
+    parse_docx(first, str(tmp_path / 'one'), 1, None, manifest_folder=manifests)
+    other = str(tmp_path / 'other' / 'report.docx')
+    os.makedirs(os.path.dirname(other))
+    os.replace(make_docx(OTHER, 'other.docx'), other)
+    parse_docx(other, str(tmp_path / 'two'), 1, None, manifest_folder=manifests)
+
+    assert parse_docx(first, str(tmp_path / 'three'), 1, None, manifest_folder=manifests)[1]['reused'] == 3
+    assert parse_docx(other, str(tmp_path / 'four'), 1, None, manifest_folder=manifests)[1]['reused'] == 1
+
+
+def test_concurrent_saves_are_merged(tmp_path):
+    folder = str(tmp_path / 'manifests')
+    os.makedirs(folder)
+    barrier = threading.Barrier(8)
+
+    def save(index):
+        manifest = SectionManifest(folder, 'report', 1, None)
+        location = str(tmp_path / f'section-{index}.docx')
+        open(location, 'w').close()
+        manifest.entries[f'report/{index}.docx'] = {'fingerprint': f'fingerprint-{index}',
+                                                   'location': {'file': location}}
+        barrier.wait()
+        manifest.save()
+    threads = [threading.Thread(target=save, args=(index,)) for index in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    manifest = SectionManifest(folder, 'report', 1, None)
+    assert sorted(manifest.previous) == [f'fingerprint-{index}' for index in range(8)]
+
+
+def test_sections_of_removed_batches_are_dropped(tmp_path):
+    folder = str(tmp_path / 'manifests')
+    os.makedirs(folder)
+    for name in ('kept', 'removed'):
+        location = str(tmp_path / f'{name}.docx')
+        open(location, 'w').close()
+        manifest = SectionManifest(folder, 'report', 1, None)
+        manifest.entries[f'report/{name}.docx'] = {'fingerprint': name, 'location': {'file': location}}
+        manifest.save()
+    os.remove(tmp_path / 'removed.docx')
+    manifest = SectionManifest(folder, 'report', 1, None)
+    manifest.entries['report/new.docx'] = {'fingerprint': 'new', 'location': {'file': str(tmp_path / 'kept.docx')}}
+    manifest.save()
+    with open(manifest.path) as f:
+        assert sorted(json.load(f)['sections']) == ['kept', 'new']
+
+
+def test_batch_response_reports_reused_sections(make_app, make_docx, tmp_path):
+    client = make_app(SECTION_MANIFEST_FOLDER=str(tmp_path / 'manifests')).test_client()
+    first = upload(client, [make_docx(ORIGINAL, 'report.docx')], parseDoc=True, parseLevel=1).get_json()
+    second = upload(client, [make_docx(EDITED, 'report.docx')], parseDoc=True, parseLevel=1).get_json()
+    assert first['sections'] == {'reused': 0, 'rebuilt': 3}
+    assert second['sections'] == {'reused': 2, 'rebuilt': 1}
+    assert (second['results'][0]['sections_reused'], second['results'][0]['sections_rebuilt']) == (2, 1)
@@ -0,0 +1,62 @@
+import io
+import struct
+import zlib
+from docx import Document
+from docx.oxml.ns import qn
+from docx.shared import Inches
+from app.modules.section_writer import SectionWriter
+from app.modules.template_cache import new_document
+
+
+def png_pixel():
+    # A 1x1 grey PNG
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', struct.pack('>IIBBBBB', 1, 1, 8, 0, 0, 0, 0)) +
+            chunk(b'IDAT', zlib.compress(b'\x00\x80')) + chunk(b'IEND', b''))
+
+
+def saved_and_reopened(doc):
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return Document(buffer)
+
+
+def test_copies_blocks_with_their_styles_numbering_and_images():
+    source = Document()
+    custom = source.styles.add_style('Clause', 1)
+    custom.base_style = source.styles['Normal']
+    clause = source.add_paragraph('clause text', style='Clause')
+    bullet = source.add_paragraph('bullet', style='List Number')
+    picture = source.add_paragraph()
+    picture.add_run().add_picture(io.BytesIO(png_pixel()), width=Inches(0.1))
+    table = source.add_table(rows=1, cols=1)
+    table.cell(0, 0).text = 'cell'
+
+    target = new_document()
+    SectionWriter(target).append([clause, bullet, picture, table])
+    result = saved_and_reopened(target)
+
+    assert [paragraph.text for paragraph in result.paragraphs[:2]] == ['clause text', 'bullet']
+    assert result.paragraphs[0].style.name == 'Clause'
+    assert result.paragraphs[1].style.name == 'List Number'
+    assert result.tables[0].cell(0, 0).text == 'cell'
+    assert len(result.inline_shapes) == 1
+    # The picture's relationship id resolves in the new document
+    blip = result.inline_shapes[0]._inline.graphic.graphicData.pic.blipFill.blip
+    assert blip.embed in result.part.rels
+
+
+def test_numbering_is_remapped_to_the_target():
+    source = Document()
+    numbered = source.add_paragraph('first', style='List Number')
+    num_pr = numbered._p.get_or_add_pPr().get_or_add_numPr()
+    num_pr.get_or_add_numId().val = 1
+    num_pr.get_or_add_ilvl().val = 0
+
+    target = new_document()
+    SectionWriter(target).append([numbered])
+    result = saved_and_reopened(target)
+    num_id = result.paragraphs[0]._p.pPr.numPr.numId.val
+    numbering = result.part.numbering_part.element
+    assert numbering.find(f"{qn('w:num')}[@{qn('w:numId')}='{num_id}']") is not None
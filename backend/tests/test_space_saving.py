@@ -0,0 +1,81 @@
+import random
+from collections import Counter
+import pytest
+from app.modules.space_saving import SpaceSaving
+
+
+def zipf_stream(seed, length, vocabulary=500):
+    rng = random.Random(seed)
+    weights = [1 / rank for rank in range(1, vocabulary + 1)]
+    return rng.choices([f'item{index}' for index in range(vocabulary)], weights, k=length)
+
+
+def sketch_of(stream, capacity):
+    sketch = SpaceSaving(capacity)
+    for item in stream:
+        sketch.add(item)
+    return sketch
+
+
+def assert_bounds(sketch, true_counts):
+    # Counts overestimate by at most their error, errors are at most
+    # total / capacity, and every item above that is kept
+    bound = sketch.total / sketch.capacity
+    assert sketch.total == sum(true_counts.values())
+    assert len(sketch) <= sketch.capacity
+    for item, count, error in sketch.top():
+        assert count - error <= true_counts[item] <= count
+        assert error <= bound
+    for item, true_count in true_counts.items():
+        if true_count > bound:
+            assert item in sketch.counts
+
+
+def test_exact_below_capacity():
+    stream = ['a', 'b', 'a', 'c', 'a', 'b']
+    sketch = sketch_of(stream, 10)
+    assert sketch.top() == [('a', 3, 0), ('b', 2, 0), ('c', 1, 0)]
+    assert sketch.minimum() == 0
+    assert sketch.top(1) == [('a', 3, 0)]
+
+
+def test_error_bounds_on_a_skewed_stream():
+    stream = zipf_stream(0, 20000)
+    sketch = sketch_of(stream, 50)
+    assert_bounds(sketch, Counter(stream))
+    assert sketch.minimum() > 0
+
+
+def test_update_takes_counts():
+    sketch = SpaceSaving(2)
+    sketch.update(Counter({'a': 5, 'b': 1}))
+    sketch.update({'c': 2})
+    assert sketch.top() == [('a', 5, 0), ('c', 3, 1)]
+    assert sketch.total == 8
+
+
+def test_merged_sketches_keep_the_bounds_of_the_whole_stream():
+    streams = [zipf_stream(seed, 8000) for seed in range(3)]
+    merged = sketch_of(streams[0], 40)
+    for stream in streams[1:]:
+        merged.merge(sketch_of(stream, 40))
+    true_counts = Counter(item for stream in streams for item in stream)
+    assert_bounds(merged, true_counts)
+
+    # The merged sketch keeps counting correctly
+    extra = zipf_stream(9, 4000)
+    for item in extra:
+        merged.add(item)
+    assert_bounds(merged, true_counts + Counter(extra))
+
+
+def test_merge_of_disjoint_small_sketches_is_exact():
+    first = sketch_of(['a', 'a', 'b'], 10)
+    second = sketch_of(['b', 'c'], 10)
+    assert first.merge(second).top() == [('a', 2, 0), ('b', 2, 0), ('c', 1, 0)]
+
+
+def test_for_error_sizes_the_sketch():
+    assert SpaceSaving.for_error(0.01).capacity == 100
+    with pytest.raises(ValueError):
+        SpaceSaving(0)
@@ -0,0 +1,85 @@
+import os
+import time
+from app.modules.jobs import jobs
+from app.modules.storage import folder_size, storage
+from conftest import upload
+
+
+def make_batch(app, batch_id, age=0, size=100):
+    used = time.time() - age
+    for root in (app.config['RESULTS_FOLDER'], app.config['UPLOAD_FOLDER']):
+        folder = os.path.join(root, batch_id)
+        os.makedirs(folder)
+        path = os.path.join(folder, 'file.bin')
+        with open(path, 'wb') as f:
+            f.write(b'x' * size)
+        for entry in (path, folder):
+            os.utime(entry, (used, used))
+
+
+def batch_ids(app):
+    root = app.config['RESULTS_FOLDER']
+    return sorted(name for name in os.listdir(root) if os.path.isdir(os.path.join(root, name)))
+
+
+def test_expired_batches_are_removed_with_their_uploads(make_app):
+    app = make_app(BATCH_TTL_SECONDS=3600, STORAGE_GRACE_SECONDS=60)
+    make_batch(app, 'expired', age=7200)
+    make_batch(app, 'fresh', age=600)
+    assert storage.sweep() == {'expired': 1}
+    assert batch_ids(app) == ['fresh']
+    assert not os.path.exists(os.path.join(app.config['UPLOAD_FOLDER'], 'expired'))
+
+
+def test_quota_removes_the_least_recently_used_first(make_app):
+    app = make_app(BATCH_TTL_SECONDS=0, STORAGE_QUOTA_BYTES=450, STORAGE_GRACE_SECONDS=60)
+    for index, age in enumerate((4000, 3000, 2000, 1000)):
+        make_batch(app, f'batch-{index}', age=age)
+    # Each batch is 200 bytes over both folders
+    assert storage.sweep() == {'quota': 2}
+    assert batch_ids(app) == ['batch-2', 'batch-3']
+    assert storage.stats()['bytes'] == 400
+
+
+def test_protected_batches_are_kept(make_app):
+    app = make_app(BATCH_TTL_SECONDS=3600, STORAGE_GRACE_SECONDS=600)
+    make_batch(app, 'recent', age=300)
+    make_batch(app, 'held', age=7200)
+    make_batch(app, 'job', age=7200)
+    jobs.store.create('job', {}, [], {})
+    with storage.hold('held'):
+        assert storage.sweep() == {}
+    assert batch_ids(app) == ['held', 'job', 'recent']
+
+
+def test_manifests_expire_with_the_batches(make_app, tmp_path):
+    manifests = tmp_path / 'manifests'
+    app = make_app(BATCH_TTL_SECONDS=3600, SECTION_MANIFEST_FOLDER=str(manifests))
+    old = manifests / 'old.json'
+    new = manifests / 'new.json'
+    old.write_text('{}')
+    new.write_text('{}')
+    os.utime(old, (time.time() - 7200,) * 2)
+    storage.sweep()
+    assert sorted(os.listdir(manifests)) == ['new.json']
+
+
+def test_folder_size(tmp_path):
+    (tmp_path / 'nested').mkdir()
+    (tmp_path / 'a').write_bytes(b'x' * 10)
+    (tmp_path / 'nested' / 'b').write_bytes(b'x' * 5)
+    assert folder_size(str(tmp_path)) == 15
+    assert folder_size(str(tmp_path / 'missing')) == 0
+
+
+def test_uploads_are_refused_when_the_disk_is_full(make_app, make_docx):
+    app = make_app(STORAGE_MIN_FREE_BYTES=1 << 62, STORAGE_RETRY_AFTER=42)
+    client = app.test_client()
+    response = upload(client, [make_docx([(1, 'Intro'), (0, 'text')])], parseDoc=True, parseLevel=1)
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '42'
+    assert response.get_json()['retryAfter'] == 42
+
+    response = client.post('/api/uploads', json={'files': [{'name': 'a.docx', 'size': 10}]})
+    assert response.status_code == 503 and response.headers['Retry-After'] == '42'
+    assert storage.stats()['rejected'] == 2
@@ -0,0 +1,28 @@
+import threading
+import time
+from app.modules import template_cache
+
+
+def test_concurrent_first_documents_load_the_template_once(monkeypatch):
+    loads = []
+    document = template_cache.Document
+
+    def slow_document(path=None):
+        loads.append(path)
+        time.sleep(0.05)
+        return document(path)
+    monkeypatch.setattr(template_cache, 'Document', slow_document)
+    monkeypatch.setattr(template_cache, '_template', None)
+    barrier = threading.Barrier(4)
+    docs = []
+
+    def section():
+        barrier.wait()
+        docs.append(template_cache.new_document())
+    threads = [threading.Thread(target=section) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(loads) == 1
+    assert len(docs) == 4 and len({id(doc) for doc in docs}) == 4
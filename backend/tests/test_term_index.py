@@ -0,0 +1,44 @@
+from collections import Counter
+import pytest
+from app.modules.term_index import TermIndex
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = TermIndex()
+    index.init_app(type('App', (), {'config': {'TERM_INDEX': True,
+                                               'TERM_INDEX_DB': str(tmp_path / 'terms.sqlite3')}})())
+    index.add('doc-a', Counter({'payment': 3, 'term': 1}))
+    index.add('doc-b', Counter({'payment': 1, 'notice': 2}))
+    index.link('batch', [('a.docx', 'doc-a'), ('b.docx', 'doc-b')])
+    return index
+
+
+def test_counts_are_stored_per_digest(index):
+    assert index.counts('doc-a') == {'payment': 3, 'term': 1}
+    assert index.counts('unknown') is None
+
+
+def test_batch_queries(index):
+    assert index.documents('batch') == [{'name': 'a.docx', 'digest': 'doc-a', 'words': 4},
+                                        {'name': 'b.docx', 'digest': 'doc-b', 'words': 3}]
+    assert index.band('batch') == [('payment', 4), ('notice', 2), ('term', 1)]
+    assert index.band('batch', min_count=2, max_count=3) == [('notice', 2)]
+    assert index.band('batch', limit=1, offset=1) == [('notice', 2)]
+    assert index.count_range('batch') == (1, 4)
+    assert index.term_documents('batch', 'notice') == [{'name': 'a.docx', 'count': 0},
+                                                       {'name': 'b.docx', 'count': 2}]
+
+
+def test_forget_keeps_documents_other_batches_use(index):
+    index.link('other', [('a.docx', 'doc-a')])
+    index.forget('batch')
+    assert index.documents('batch') == []
+    assert index.counts('doc-a') is not None
+    assert index.counts('doc-b') is None
+
+
+def test_disabled_without_the_setting(tmp_path):
+    index = TermIndex()
+    index.init_app(type('App', (), {'config': {'TERM_INDEX': False}})())
+    assert not index.enabled
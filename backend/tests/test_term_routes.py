@@ -0,0 +1,57 @@
+import os
+from openpyxl import load_workbook
+from app.modules.word_counter import PHRASE_SHEET
+from conftest import upload
+
+
+def test_regenerated_summary_leaves_the_cached_one_alone(make_app, make_docx):
+    app = make_app(RESULT_CACHE_MAX_BYTES=1024 * 1024)
+    path = make_docx([(1, 'Terms'), (0, 'payment term payment')])
+    client = app.test_client()
+    batch_id = upload(client, [path], createSummary=True, minCount=0, maxCount=300).get_json()['batchId']
+    summary = os.path.join(app.config['RESULTS_FOLDER'], batch_id, 'word_count_summary_0_to_300.xlsx')
+    cache_folder = app.config['RESULT_CACHE_FOLDER']
+    [entry] = [name for name in os.listdir(cache_folder) if not name.startswith('.')]
+    cached = os.path.join(cache_folder, entry, 'word_count_summary_0_to_300.xlsx')
+    assert os.path.samefile(summary, cached)
+    with open(cached, 'rb') as f:
+        cached_bytes = f.read()
+
+    response = client.post(f'/api/terms/{batch_id}/summary', json={'minCount': 0, 'maxCount': 300})
+    assert response.status_code == 200
+    assert not os.path.samefile(summary, cached)
+    with open(cached, 'rb') as f:
+        assert f.read() == cached_bytes
+    assert not [name for name in os.listdir(os.path.dirname(summary)) if name.endswith('.tmp')]
+
+
+def sheet_rows(path, sheet):
+    wb = load_workbook(path, read_only=True)
+    try:
+        return [row for row in wb[sheet].iter_rows(values_only=True)] if sheet in wb.sheetnames else None
+    finally:
+        wb.close()
+
+
+def test_regenerated_summary_keeps_the_phrase_sheet(client, make_docx, app):
+    path = make_docx([(1, 'Terms'), (0, 'payment term payment term payment')])
+    batch_id = upload(client, [path], createSummary=True, minCount=0, maxCount=300,
+                      phraseSummary=True, phraseLengths='2').get_json()['batchId']
+    folder = os.path.join(app.config['RESULTS_FOLDER'], batch_id)
+    original = sheet_rows(os.path.join(folder, 'word_count_summary_0_to_300.xlsx'), PHRASE_SHEET)
+    assert ('payment term', 2, 2, 2) in original
+
+    response = client.post(f'/api/terms/{batch_id}/summary', json={'minCount': 2, 'maxCount': 5})
+    assert response.status_code == 200
+    assert 'phrases in the phrase sheet' in response.get_json()['summary_message']
+    regenerated = os.path.join(folder, response.get_json()['summary_file'])
+    assert sheet_rows(regenerated, PHRASE_SHEET) == original
+    assert sheet_rows(regenerated, 'Word Count Summary')[1:] == [('payment', 3), ('term', 2)]
+
+
+def test_regenerated_summary_without_phrases(client, make_docx, app):
+    path = make_docx([(1, 'Terms'), (0, 'payment term payment')])
+    batch_id = upload(client, [path], createSummary=True, minCount=0, maxCount=300).get_json()['batchId']
+    response = client.post(f'/api/terms/{batch_id}/summary', json={'minCount': 1, 'maxCount': 5}).get_json()
+    folder = os.path.join(app.config['RESULTS_FOLDER'], batch_id)
+    assert sheet_rows(os.path.join(folder, response['summary_file']), PHRASE_SHEET) is None
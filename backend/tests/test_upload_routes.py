@@ -0,0 +1,20 @@
+from app.modules import term_index as term_index_module
+from app.modules import word_counter
+from app.modules.term_index import term_index
+from conftest import upload
+
+
+def test_summary_reuses_the_upload_digests(make_app, make_docx, monkeypatch):
+    app = make_app(RESULT_CACHE_MAX_BYTES=1024 * 1024)
+    path = make_docx([(1, 'Terms'), (0, 'payment term payment')])
+
+    def no_rehash(path):
+        raise AssertionError('upload hashed again')
+    monkeypatch.setattr(word_counter, 'file_digest', no_rehash)
+    monkeypatch.setattr(term_index_module, 'file_digest', no_rehash)
+    client = app.test_client()
+    first = upload(client, [path], createSummary=True, minCount=1).get_json()
+    second = upload(client, [path], createSummary=True, minCount=1).get_json()
+    assert second.get('cached')
+    for response in (first, second):
+        assert [document['name'] for document in term_index.documents(response['batchId'])] == ['document.docx']
@@ -0,0 +1,81 @@
+import hashlib
+import io
+import os
+import pytest
+from app.modules.upload_session import UploadError, UploadSession
+
+DATA = b'0123456789'
+
+
+@pytest.fixture
+def session(tmp_path):
+    return UploadSession.create(str(tmp_path), 'upload', [{'name': 'a.docx', 'size': len(DATA)}], 100)
+
+
+def test_chunks_resume_at_the_received_offset(session, tmp_path):
+    assert session.append('a.docx', 0, io.BytesIO(DATA[:4])) == 4
+    with pytest.raises(UploadError) as error:
+        session.append('a.docx', 0, io.BytesIO(DATA[:4]))
+    assert (error.value.status, error.value.offset) == (409, 4)
+
+    loaded = UploadSession.load(str(tmp_path), 'upload')
+    assert loaded.status()['files'] == [{'name': 'a.docx', 'size': 10, 'offset': 4}]
+    loaded.append('a.docx', 4, io.BytesIO(DATA[4:]))
+    [(path, digest)] = loaded.complete()
+    assert digest == hashlib.sha256(DATA).hexdigest()
+    with open(path, 'rb') as f:
+        assert f.read() == DATA
+    with pytest.raises(UploadError):
+        loaded.complete()
+
+
+def test_incomplete_and_oversized_uploads_are_refused(session):
+    session.append('a.docx', 0, io.BytesIO(DATA[:4]))
+    with pytest.raises(UploadError) as error:
+        session.complete()
+    assert error.value.status == 409
+    with pytest.raises(UploadError) as error:
+        session.append('a.docx', 4, io.BytesIO(DATA + DATA))
+    assert error.value.status == 413
+
+
+def test_checksum_mismatch_starts_the_file_over(tmp_path):
+    session = UploadSession.create(str(tmp_path), 'upload',
+                                   [{'name': 'a.docx', 'size': len(DATA), 'sha256': '0' * 64}], 100)
+    session.append('a.docx', 0, io.BytesIO(DATA))
+    with pytest.raises(UploadError) as error:
+        session.complete()
+    assert (error.value.status, error.value.offset) == (422, 0)
+    assert session.received('a.docx') == 0
+
+
+def test_declarations_are_checked(tmp_path):
+    with pytest.raises(UploadError):
+        UploadSession.create(str(tmp_path), 'empty', [], 100)
+    with pytest.raises(UploadError):
+        UploadSession.create(str(tmp_path), 'twice', [{'name': 'a.docx', 'size': 1}] * 2, 100)
+    with pytest.raises(UploadError) as error:
+        UploadSession.create(str(tmp_path), 'large', [{'name': 'a.docx', 'size': 101}], 100)
+    assert error.value.status == 413
+
+
+def test_abort_removes_the_spool(session):
+    session.abort()
+    assert not os.path.exists(session.folder)
+
+
+def test_chunked_upload_routes(client, make_docx):
+    path = make_docx([(1, 'Intro'), (0, 'text')])
+    with open(path, 'rb') as f:
+        data = f.read()
+    created = client.post('/api/uploads', json={'files': [{'name': 'document.docx', 'size': len(data)}]})
+    assert created.status_code == 201
+    upload_id = created.get_json()['uploadId']
+    middle = len(data) // 2
+    for offset, chunk in ((0, data[:middle]), (middle, data[middle:])):
+        response = client.put(f'/api/uploads/{upload_id}/files/document.docx?offset={offset}', data=chunk)
+        assert response.status_code == 200
+    assert client.get(f'/api/uploads/{upload_id}').get_json()['received']
+    response = client.post(f'/api/uploads/{upload_id}/complete', data={'parseDoc': 'true'})
+    assert response.status_code == 200
+    assert response.get_json()['results'][0]['file'] == 'document.docx'
@@ -0,0 +1,73 @@
+from collections import Counter
+from app.modules import word_counter
+from app.modules.term_index import TermIndex, file_digest
+from app.modules.word_counter import count_texts, count_words, tokenize
+
+TEXTS = ["The contract's term", "the term of the contract", "Payment: the term"]
+PHRASES = {'lengths': [2, 3], 'error': 0.001, 'top': 10}
+
+
+def test_tokenize_keeps_inner_apostrophes_and_hyphens():
+    assert tokenize("Don't e-mail the 'Supplier', please!") == ["don't", 'e-mail', 'the', 'supplier', 'please']
+
+
+def test_count_texts_tokenizes_each_paragraph_once(monkeypatch):
+    calls = []
+
+    def counting_tokenize(text):
+        calls.append(text)
+        return tokenize(text)
+    monkeypatch.setattr(word_counter, 'tokenize', counting_tokenize)
+    word_count, sketches = count_texts(TEXTS, phrases=PHRASES)
+    assert calls == TEXTS
+    assert word_count == Counter(word for text in TEXTS for word in tokenize(text))
+    # Far fewer phrases than the sketches hold, so their counts are exact
+    assert sketches[2].counts == Counter({'the term': 2, "the contract's": 1, "contract's term": 1, 'term of': 1,
+                                          'of the': 1, 'the contract': 1, 'payment the': 1})
+    assert sketches[3].counts == Counter({"the contract's term": 1, 'the term of': 1, 'term of the': 1,
+                                          'of the contract': 1, 'payment the term': 1})
+
+
+def test_count_texts_without_words_counts_only_phrases():
+    word_count, sketches = count_texts(TEXTS, words=False, phrases=PHRASES)
+    assert word_count is None
+    assert set(sketches) == {2, 3}
+    assert sketches[2].total == 8
+
+
+def test_count_words_reads_a_document(make_docx):
+    path = make_docx([(1, 'Terms'), (0, 'payment term'), (0, 'payment')])
+    digest, word_count, sketches = count_words(path)
+    assert digest is None and sketches is None
+    assert word_count == Counter({'payment': 2, 'terms': 1, 'term': 1})
+
+
+def test_count_words_uses_known_digests(make_docx, tmp_path, monkeypatch):
+    path = make_docx([(0, 'payment term')])
+    index = TermIndex()
+    index.init_app(type('App', (), {'config': {'TERM_INDEX': True,
+                                               'TERM_INDEX_DB': str(tmp_path / 'terms.sqlite3')}})())
+    digest = file_digest(path)
+
+    def no_rehash(path):
+        raise AssertionError('upload hashed again')
+    monkeypatch.setattr(word_counter, 'file_digest', no_rehash)
+    assert count_words(path, index=index, digests={path: digest})[0] == digest
+    assert index.counts(digest) == {'payment': 1, 'term': 1}
+
+
+def test_select_band_orders_by_count_then_word(monkeypatch):
+    word_count = Counter({'b': 3, 'a': 3, 'c': 5, 'd': 1, 'e': 9})
+    assert word_counter.select_band(word_count, 2, 5) == [('c', 5), ('a', 3), ('b', 3)]
+
+    def no_heap(*args, **kwargs):
+        raise AssertionError('band sorted through the heap')
+    monkeypatch.setattr(word_counter.heapq, 'nsmallest', no_heap)
+    assert word_counter.select_band(word_count, 1, 9, limit=5) == [('e', 9), ('c', 5), ('a', 3), ('b', 3), ('d', 1)]
+
+
+def test_select_band_keeps_the_most_frequent_past_the_limit():
+    word_count = Counter({f'word{index:03}': index % 7 for index in range(200)})
+    expected = sorted(((word, count) for word, count in word_count.items() if count >= 2),
+                      key=lambda item: (-item[1], item[0]))[:10]
+    assert word_counter.select_band(word_count, 2, 6, limit=10) == expected
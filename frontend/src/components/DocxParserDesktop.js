@@ -9,6 +9,7 @@ const DocxParserDesktop = () => {
   const [createSummary, setCreateSummary] = useState(false);
   const [keywordTag, setKeywordTag] = useState(false);
   const [parseLevel, setParseLevel] = useState('1');
+  const [outputFormat, setOutputFormat] = useState('docx');
   const [minCount, setMinCount] = useState('');
   const [maxCount, setMaxCount] = useState('');
   const [loading, setLoading] = useState(false);
@@ -93,6 +94,7 @@ const DocxParserDesktop = () => {
     formData.append('createSummary', createSummary.toString());
     formData.append('keywordTag', keywordTag.toString());
     formData.append('parseLevel', parseLevel);
+    formData.append('outputFormat', outputFormat);
 
     if (minCount) formData.append('minCount', minCount);
     if (maxCount) formData.append('maxCount', maxCount);
@@ -225,6 +227,17 @@ const DocxParserDesktop = () => {
                     <option value="1">Heading 1</option>
                     <option value="2">Heading 2</option>
                     <option value="3">Heading 3</option>
+                    <option value="1,2,3">Heading 1, 2 and 3</option>
+                  </select>
+                )}
+                {parseDoc && (
+                  <select
+                    className="mt-2 w-full p-2 border rounded"
+                    value={outputFormat}
+                    onChange={(e) => setOutputFormat(e.target.value)}
+                  >
+                    <option value="docx">Word document per section</option>
+                    <option value="ndjson">Structured sections (NDJSON)</option>
                   </select>
                 )}
                 <label className="flex items-center">